@@ -0,0 +1,83 @@
+# benchmarks/bench_audio_mixer.py - скорость и память сборки дорожки эпизода (AudioMixer) против сборки целиком в RAM
+import argparse
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from processors.audio_mixer import AudioMixer, soft_limit
+
+
+def build_episode(minutes, sample_rate, seed=1):
+    """Реплики эпизода и их "синтезированные" клипы (шум с огибающей) в памяти"""
+    rng = random.Random(seed)
+    cues = []
+    clips = {}
+    position = 1.0
+    while position < minutes * 60 - 5:
+        duration = rng.uniform(0.8, 4.5)
+        cues.append({'start_time': position, 'end_time': position + duration})
+        # Клип чуть длиннее реплики: соседние реплики иногда накладываются
+        frames = int(duration * rng.uniform(0.9, 1.3) * sample_rate)
+        envelope = np.hanning(frames).astype(np.float32)
+        clips[len(cues) - 1] = (np.random.default_rng(len(cues)).standard_normal(frames).astype(np.float32)
+                                * 0.25 * envelope)
+        position += duration + rng.uniform(0.0, 1.5)
+    return cues, clips
+
+
+def legacy_mix(cues, clips, sample_rate, channels):
+    """Наивная сборка: вся дорожка одним массивом в памяти"""
+    total = int(max(cue['end_time'] for cue in cues) * sample_rate) + sample_rate * 10
+    track = np.zeros((total, channels), dtype=np.float32)
+    for index, cue in enumerate(cues):
+        samples = clips[index]
+        start = int(round(cue['start_time'] * sample_rate))
+        end = min(start + len(samples), total)
+        track[start:end] += samples[:end - start, None]
+    soft_limit(track)
+    return track
+
+
+def measure(label, run, audio_seconds):
+    tracemalloc.start()
+    started = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:26} | {elapsed:6.2f} с | x{audio_seconds / elapsed:6.0f} реального времени | "
+          f"пик Python {peak / 1024 / 1024:8.1f} МБ")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк сборки дорожки дубляжа")
+    parser.add_argument("--minutes", type=float, default=24, help="Длина эпизода, минут")
+    parser.add_argument("--sample-rate", type=int, default=44100)
+    parser.add_argument("--channels", type=int, default=2)
+    parser.add_argument("--block-seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    cues, clips = build_episode(args.minutes, args.sample_rate)
+    audio_seconds = args.minutes * 60
+    print(f"=== СБОРКА ДОРОЖКИ: {args.minutes:.0f} мин, {len(cues)} реплик, "
+          f"{args.sample_rate} Гц, каналов: {args.channels} ===")
+
+    # Клипы уже в памяти: измеряется сама сборка, без ffmpeg
+    mixer = AudioMixer(args.sample_rate, args.channels, args.block_seconds, decode=clips.__getitem__)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_path = Path(temp_dir) / "episode.wav"
+        measure("целиком в RAM", lambda: legacy_mix(cues, clips, args.sample_rate, args.channels), audio_seconds)
+        measure("AudioMixer (memmap WAV)",
+                lambda: mixer.mix(cues, {index: index for index in clips}, output_path), audio_seconds)
+
+
+if __name__ == "__main__":
+    main()
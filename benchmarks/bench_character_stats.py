@@ -0,0 +1,105 @@
+# benchmarks/bench_character_stats.py - статистика персонажей за сезон: старые циклы против CharacterStatsEngine
+import argparse
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from processors.subtitle_analyzer import SubtitleAnalyzer
+from processors.character_stats import CharacterStatsEngine
+from utils.text_counter import TextCounter
+from bench_srt_parser import build_season
+
+
+def legacy_calculate_stats(texts):
+    """Прежний TextCounter.calculate_stats с генератором по каждому символу"""
+    if not texts:
+        return {'total_lines': 0, 'total_chars': 0, 'total_words': 0,
+                'avg_line_length': 0, 'elevenlabs_tokens': 0}
+    total_chars = sum(len(text) for text in texts)
+    total_words = sum(len(text.split()) for text in texts)
+    total_lines = len(texts)
+    elevenlabs_chars = 0
+    for text in texts:
+        elevenlabs_chars += len(''.join(c for c in text if c.isalnum() or c.isspace()))
+    return {
+        'total_lines': total_lines,
+        'total_chars': total_chars,
+        'total_words': total_words,
+        'avg_line_length': total_chars / total_lines if total_lines > 0 else 0,
+        'elevenlabs_tokens': elevenlabs_chars
+    }
+
+
+def legacy_clean_text(text):
+    """Прежний TextCounter.clean_text с некомпилированными шаблонами"""
+    text = re.sub(r'^[^:]+:\s*', '', text)
+    text = re.sub(r'^[^-]+-\s*', '', text)
+    text = re.sub(r'<[^>]+>', '', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def legacy_compute(analyzer, subtitles):
+    """Прежний путь: словари на реплику и подсчет по персонажам в циклах"""
+    grouped = {}
+    for sub in subtitles:
+        char = grouped.setdefault(sub['character'], {'texts': [], 'total_duration': 0})
+        analyzer._detect_gender(sub['character'])
+        char['total_duration'] += sub['duration']
+        char['texts'].append(legacy_clean_text(sub['text']))
+
+    stats = {}
+    for name, char in grouped.items():
+        char_stats = legacy_calculate_stats(char['texts'])
+        char_stats['total_duration'] = char['total_duration']
+        stats[name] = char_stats
+    return stats
+
+
+def best_of(func, repeats):
+    """Лучшее время из нескольких прогонов"""
+    best = None
+    result = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк статистики персонажей")
+    parser.add_argument("--episodes", type=int, default=24, help="Эпизодов в сезоне")
+    parser.add_argument("--repeats", type=int, default=5, help="Повторов замера")
+    args = parser.parse_args()
+
+    analyzer = SubtitleAnalyzer()
+    counter = TextCounter()
+    engine = CharacterStatsEngine(counter)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        season_path = Path(temp_dir) / "season.srt"
+        build_season(season_path, args.episodes)
+        subtitles = analyzer.parse_srt_file(season_path)
+        table = analyzer.load_cue_table(season_path)
+
+    print(f"=== СТАТИСТИКА ПЕРСОНАЖЕЙ: {args.episodes} эпизодов, {len(table)} реплик ===")
+
+    legacy_time, legacy_stats = best_of(lambda: legacy_compute(analyzer, subtitles), args.repeats)
+    engine_time, engine_stats = best_of(lambda: engine.compute(table), args.repeats)
+
+    if legacy_stats != engine_stats:
+        print("✗ Результаты не совпадают!")
+        sys.exit(1)
+
+    print(f"{'старые циклы':24} | {legacy_time * 1000:8.1f} мс")
+    print(f"{'CharacterStatsEngine':24} | {engine_time * 1000:8.1f} мс | x{legacy_time / engine_time:.1f}")
+    print("✓ Результаты совпадают")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# benchmarks/bench_cue_table.py - память загруженного проекта: словари на реплику против CueTable
+import argparse
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from processors.subtitle_analyzer import SubtitleAnalyzer
+from bench_srt_parser import build_season
+
+
+def legacy_analyze_characters(analyzer, subtitles):
+    """Прежний analyze_characters: вторая копия реплик в словарях персонажей"""
+    characters = {}
+    for sub in subtitles:
+        char = characters.setdefault(sub['character'], {
+            'name': sub['character'], 'total_lines': 0, 'total_duration': 0,
+            'gender': 'unknown', 'lines': []
+        })
+        char['total_lines'] += 1
+        char['total_duration'] += sub['duration']
+        char['gender'] = analyzer._detect_gender(sub['character'])
+        char['lines'].append({
+            'text': sub['text'],
+            'duration': sub['duration'],
+            'start_time': sub['start_time']
+        })
+    return characters
+
+
+def load_project(label, load):
+    """Память, которую держит загруженный проект, и время загрузки"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    project = load()
+    elapsed = time.perf_counter() - started
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:28} | загрузка {elapsed * 1000:8.1f} мс | держит {current / 1024 / 1024:7.2f} МБ")
+    return project
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк хранения реплик")
+    parser.add_argument("--episodes", type=int, default=24, help="Эпизодов в сезоне")
+    parser.add_argument("--rebuilds", type=int, default=200, help="Перестроений таблицы персонажей")
+    args = parser.parse_args()
+
+    analyzer = SubtitleAnalyzer()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        season_path = Path(temp_dir) / "season.srt"
+        build_season(season_path, args.episodes)
+        print(f"=== ХРАНЕНИЕ РЕПЛИК: {args.episodes} эпизодов ===")
+
+        def legacy():
+            subtitles = analyzer.parse_srt_file(season_path)
+            return subtitles, legacy_analyze_characters(analyzer, subtitles)
+
+        def cue_table():
+            table = analyzer.load_cue_table(season_path)
+            return table, analyzer.analyze_characters(table)
+
+        legacy_project = load_project("словари (parse_srt)", legacy)
+        table_project = load_project("CueTable", cue_table)
+
+        for label, (subtitles, _) in (("словари (parse_srt)", legacy_project),
+                                      ("CueTable", table_project)):
+            started = time.perf_counter()
+            for _ in range(args.rebuilds):
+                analyzer.get_character_stats(analyzer.analyze_characters(subtitles))
+            elapsed = (time.perf_counter() - started) / args.rebuilds
+            print(f"{label:28} | перестроение таблицы {elapsed * 1000:8.2f} мс")
+
+
+if __name__ == "__main__":
+    main()
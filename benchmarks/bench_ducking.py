@@ -0,0 +1,63 @@
+# benchmarks/bench_ducking.py - скорость и память потокового приглушения оригинала (Ducker)
+import argparse
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from processors.audio_io import WavWriter
+from processors.ducking import Ducker
+
+
+def build_original(path, minutes, sample_rate, channels):
+    """Оригинальная дорожка (шум) в float32 WAV, пишется блоками"""
+    rng = np.random.default_rng(1)
+    with WavWriter(path, channels, sample_rate) as writer:
+        for _ in range(int(minutes * 6)):
+            writer.write((rng.standard_normal((sample_rate * 10, channels)) * 0.1).astype(np.float32))
+
+
+def build_cues(minutes, seed=1):
+    rng = random.Random(seed)
+    cues = []
+    position = 1.0
+    while position < minutes * 60 - 5:
+        duration = rng.uniform(0.8, 4.5)
+        cues.append({'start_time': position, 'end_time': position + duration})
+        position += duration + rng.uniform(0.0, 3.0)
+    return cues
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк приглушения оригинальной дорожки")
+    parser.add_argument("--minutes", type=float, default=24, help="Длина эпизода, минут")
+    parser.add_argument("--sample-rate", type=int, default=44100)
+    parser.add_argument("--channels", type=int, default=2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        original_path = Path(temp_dir) / "original.wav"
+        build_original(original_path, args.minutes, args.sample_rate, args.channels)
+        cues = build_cues(args.minutes)
+        print(f"=== ПРИГЛУШЕНИЕ: {args.minutes:.0f} мин, {len(cues)} реплик, "
+              f"{args.sample_rate} Гц, каналов: {args.channels} ===")
+
+        ducker = Ducker(sample_rate=args.sample_rate, channels=args.channels)
+        tracemalloc.start()
+        started = time.perf_counter()
+        ducker.process(original_path, cues, Path(temp_dir) / "ducked.wav")
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"Ducker (блоки по 10 с) | {elapsed:6.2f} с | x{args.minutes * 60 / elapsed:5.0f} реального времени | "
+              f"пик Python {peak / 1024 / 1024:6.1f} МБ")
+
+
+if __name__ == "__main__":
+    main()
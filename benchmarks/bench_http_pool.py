@@ -0,0 +1,113 @@
+# benchmarks/bench_http_pool.py - задержка запросов к ElevenLabs: новое соединение на запрос против общей сессии
+import argparse
+import socket
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import requests
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from tts_engines.elevenlabs.elevenlabs_api import ElevenLabsAPI
+
+AUDIO_STUB = b"\xff\xfb" * 8192  # ~16 КБ "mp3" на реплику
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Заглушка ElevenLabs: отвечает аудио, изредка - 429 с Retry-After"""
+
+    protocol_version = "HTTP/1.1"  # keep-alive
+    handshake_delay = 0.0
+    throttle_every = 0
+    request_count = 0
+    count_lock = threading.Lock()
+
+    def setup(self):
+        # Имитация установки TCP+TLS соединения (выполняется один раз на соединение)
+        time.sleep(self.handshake_delay)
+        super().setup()
+        # Без Nagle: иначе заголовки и тело ответа ждут delayed ACK на keep-alive соединении
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+
+        with StubHandler.count_lock:
+            StubHandler.request_count += 1
+            throttled = self.throttle_every and StubHandler.request_count % self.throttle_every == 0
+
+        if throttled:
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Content-Length", str(len(AUDIO_STUB)))
+        self.end_headers()
+        self.wfile.write(AUDIO_STUB)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run(label, request_once, cues):
+    """Задержки всех запросов эпизода"""
+    latencies = []
+    started = time.perf_counter()
+    for i in range(cues):
+        request_started = time.perf_counter()
+        request_once(f"Replika numer {i}")
+        latencies.append(time.perf_counter() - request_started)
+    total = time.perf_counter() - started
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{label:30} | всего {total:6.2f} с | среднее {statistics.mean(latencies) * 1000:7.2f} мс | "
+          f"p50 {statistics.median(latencies) * 1000:7.2f} мс | p95 {p95 * 1000:7.2f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк пула HTTP соединений ElevenLabsAPI")
+    parser.add_argument("--cues", type=int, default=500, help="Реплик в эпизоде")
+    parser.add_argument("--handshake-ms", type=float, default=30.0,
+                        help="Имитация TCP+TLS рукопожатия на новое соединение, мс")
+    parser.add_argument("--throttle-every", type=int, default=50,
+                        help="Каждый N-й запрос получает 429 (0 - без ограничений)")
+    args = parser.parse_args()
+
+    StubHandler.handshake_delay = args.handshake_ms / 1000
+    StubHandler.throttle_every = args.throttle_every
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}/v1"
+
+    print(f"=== HTTP ПУЛ: {args.cues} реплик, рукопожатие {args.handshake_ms:.0f} мс, "
+          f"429 каждые {args.throttle_every} запросов ===")
+
+    def fresh_connection(text):
+        # Прежнее поведение: requests.post без сессии и без повторов
+        requests.post(f"{base_url}/text-to-speech/voice", json={"text": text},
+                      headers={"xi-api-key": "bench"}, timeout=30)
+
+    api = ElevenLabsAPI("bench", base_url=base_url, backoff_base=0.01)
+
+    def pooled_session(text):
+        api.test_voice("voice", text)
+
+    run("requests.post на запрос", fresh_connection, args.cues)
+    run("ElevenLabsAPI (сессия+повторы)", pooled_session, args.cues)
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# benchmarks/bench_srt_parser.py - сравнение памяти и скорости старого и потокового парсера SRT
+import argparse
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from processors.subtitle_analyzer import SubtitleAnalyzer
+
+SAMPLE_SRT = Path(__file__).parent.parent / "Gachiakuta - S01E01 (WEB 1080p AV1 AAC EAC3).srt"
+
+
+def legacy_parse_srt(analyzer, srt_content):
+    """Прежняя реализация parse_srt: весь текст, все блоки и все словари сразу"""
+    blocks = re.split(r'\n\s*\n', srt_content.strip())
+    subtitles = []
+    for block in blocks:
+        lines = [line.strip() for line in block.split('\n') if line.strip()]
+        if len(lines) >= 4:
+            try:
+                subtitle_id = int(lines[0])
+                time_line = lines[2]
+                if '-->' not in time_line:
+                    continue
+                time_parts = time_line.split(' --> ')
+                start_time = analyzer._parse_time(time_parts[0])
+                end_time = analyzer._parse_time(time_parts[1])
+                subtitles.append({
+                    'id': subtitle_id,
+                    'character': lines[1],
+                    'start_time': start_time,
+                    'end_time': end_time,
+                    'text': '\n'.join(lines[3:]),
+                    'duration': end_time - start_time
+                })
+            except (ValueError, IndexError):
+                continue
+    return subtitles
+
+
+def build_season(path, episodes):
+    """Склеить эпизод-образец в один файл размером с сезон"""
+    sample = SAMPLE_SRT.read_text(encoding='utf-8-sig').strip()
+    with open(path, 'w', encoding='utf-8') as f:
+        for _ in range(episodes):
+            f.write(sample)
+            f.write('\n\n')
+
+
+def measure(label, func):
+    """Время и пиковая память (память меряется отдельным прогоном под tracemalloc)"""
+    started = time.perf_counter()
+    count = func()
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:32} | {count:7} реплик | {elapsed * 1000:8.1f} мс | "
+          f"{count / elapsed:9.0f} реплик/с | пик {peak / 1024 / 1024:7.2f} МБ")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк парсера SRT")
+    parser.add_argument("--episodes", type=int, default=24, help="Эпизодов в сезоне")
+    args = parser.parse_args()
+
+    analyzer = SubtitleAnalyzer()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        season_path = Path(temp_dir) / "season.srt"
+        build_season(season_path, args.episodes)
+        size_mb = season_path.stat().st_size / 1024 / 1024
+        print(f"=== SRT ПАРСЕР: {args.episodes} эпизодов, {size_mb:.2f} МБ ===")
+
+        def legacy():
+            content = season_path.read_text(encoding='utf-8')
+            return len(legacy_parse_srt(analyzer, content))
+
+        def parse_file():
+            return len(analyzer.parse_srt_file(season_path))
+
+        def compact_records():
+            return len(list(analyzer.iter_srt(season_path)))
+
+        def streaming():
+            return sum(1 for _ in analyzer.iter_srt(season_path))
+
+        measure("старый parse_srt (строка)", legacy)
+        measure("parse_srt_file (словари)", parse_file)
+        measure("list(iter_srt) (кортежи)", compact_records)
+        measure("iter_srt потоком", streaming)
+
+
+if __name__ == "__main__":
+    main()
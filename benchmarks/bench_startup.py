@@ -0,0 +1,113 @@
+# benchmarks/bench_startup.py - время запуска приложения: импорт (python -X importtime) и время до первого окна
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+# Модули, которые не должны загружаться при старте GUI (только при первом использовании)
+LAZY_MODULES = ("pygame", "requests", "numpy", "edge_tts",
+                "tts_engines.elevenlabs.elevenlabs_engine", "processors.speech_synthesizer")
+
+FIRST_WINDOW_SCRIPT = """
+import time
+started = time.perf_counter()
+from config.settings import Settings
+from gui.main_window import MainWindow
+app = MainWindow(Settings())
+app.root.update()
+print("FIRST_WINDOW", time.perf_counter() - started)
+app.on_close()
+"""
+
+
+def run_python(args, cwd):
+    """Запуск интерпретатора с корнем проекта в PYTHONPATH (данные приложения - во временной папке)"""
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    return subprocess.run([sys.executable] + args, cwd=cwd, env=env,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+
+def measure_imports(cwd, module):
+    """Время импорта модуля и самые долгие импорты по данным -X importtime"""
+    code = f"import sys, {module}; print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    result = run_python(["-X", "importtime", "-c", code], cwd)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append((int(cumulative_us), int(self_us), name.rstrip()))
+
+    total = next((cumulative for cumulative, _, name in modules if name.strip() == module), 0)
+    loaded_lazy = [name for name in result.stdout.strip().split(",") if name]
+    return total / 1000, modules, loaded_lazy
+
+
+def measure_first_window(cwd):
+    """Время от старта интерпретатора до отрисованного главного окна, секунды (None без дисплея)"""
+    started = time.perf_counter()
+    result = run_python(["-c", FIRST_WINDOW_SCRIPT], cwd)
+    elapsed = time.perf_counter() - started
+    for line in result.stdout.splitlines():
+        if line.startswith("FIRST_WINDOW"):
+            return elapsed, float(line.split()[1])
+    return None, result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "нет вывода"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк запуска приложения")
+    parser.add_argument("--module", default="gui.main_window", help="Модуль, импорт которого измеряется")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Сколько самых долгих импортов показать")
+    parser.add_argument("--import-budget-ms", type=float, default=300.0)
+    parser.add_argument("--window-budget", type=float, default=1.0, help="Бюджет до первого окна, секунды")
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as cwd:
+        print(f"=== ИМПОРТ {args.module} ({args.runs} запусков) ===")
+        totals = []
+        for _ in range(args.runs):
+            total, modules, loaded_lazy = measure_imports(cwd, args.module)
+            totals.append(total)
+        median = statistics.median(totals)
+        print(f"Медиана: {median:.1f} мс (бюджет {args.import_budget_ms:.0f} мс)")
+        print("Самые долгие импорты (последний запуск, накопительно):")
+        for cumulative, self_us, name in sorted(modules, reverse=True)[:args.top]:
+            print(f"  {cumulative / 1000:8.1f} мс  (сам {self_us / 1000:6.1f} мс) {name}")
+        if loaded_lazy:
+            print(f"❌ При старте загружены модули, которые должны грузиться лениво: {', '.join(loaded_lazy)}")
+            failed = True
+        if median > args.import_budget_ms:
+            print("❌ Импорт превышает бюджет")
+            failed = True
+
+        print(f"\n=== ДО ПЕРВОГО ОКНА ({args.runs} запусков) ===")
+        walls = []
+        for _ in range(args.runs):
+            wall, inner = measure_first_window(cwd)
+            if wall is None:
+                print(f"Пропущено (нет дисплея?): {inner}")
+                break
+            walls.append(wall)
+        if walls:
+            median = statistics.median(walls)
+            print(f"Медиана с запуском интерпретатора: {median:.2f} с (бюджет {args.window_budget:.1f} с)")
+            if median > args.window_budget:
+                print("❌ Время до первого окна превышает бюджет")
+                failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# benchmarks/bench_time_stretch.py - подгонка реплик эпизода под окна субтитров (ClipFitter, WSOLA)
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from processors.audio_io import create_wav_memmap
+from processors.time_stretch import ClipFitter
+
+
+def build_clips(directory, cues_count, sample_rate, seed=1):
+    """Реплики эпизода: float32 WAV "речи" (гармоники с огибающей), часть длиннее окна"""
+    rng = random.Random(seed)
+    cues = []
+    clips = {}
+    position = 1.0
+    for index in range(cues_count):
+        duration = rng.uniform(0.8, 4.5)
+        cues.append({'start_time': position, 'end_time': position + duration})
+        length = duration * rng.uniform(0.7, 1.6)
+        t = np.arange(int(length * sample_rate)) / sample_rate
+        pitch = rng.uniform(110, 260)
+        voice = sum(np.sin(2 * np.pi * pitch * h * t) / h for h in range(1, 6))
+        samples = (0.2 * voice * np.hanning(len(t))).astype(np.float32)
+
+        path = Path(directory) / f"{index:05d}.wav"
+        track = create_wav_memmap(path, len(samples), 1, sample_rate)
+        track[:, 0] = samples
+        track.flush()
+        del track
+        clips[index] = path
+        position += duration + rng.uniform(0.0, 1.5)
+    return cues, clips
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк подгонки реплик под длительность субтитров")
+    parser.add_argument("--cues", type=int, default=400, help="Реплик в эпизоде")
+    parser.add_argument("--sample-rate", type=int, default=44100)
+    parser.add_argument("--max-ratio", type=float, default=1.35)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cues, clips = build_clips(temp_dir, args.cues, args.sample_rate)
+        audio_seconds = sum(cue['end_time'] - cue['start_time'] for cue in cues)
+        print(f"=== ПОДГОНКА РЕПЛИК: {len(cues)} реплик, {audio_seconds:.0f}с речи ===")
+
+        for workers in (1, None):
+            fitter = ClipFitter(Path(temp_dir) / f"fit_{workers}", max_ratio=args.max_ratio,
+                                workers=workers, sample_rate=args.sample_rate)
+            started = time.perf_counter()
+            _, report = fitter.fit(cues, clips)
+            elapsed = time.perf_counter() - started
+            print(f"процессов: {fitter.workers:3} | {elapsed:6.2f} с | ускорено {report['stretched']}, "
+                  f"не помещаются {len(report['unfit'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+# cli.py - консольный режим дубляжа без GUI: пакетная обработка .srt файлов и папок
+import argparse
+import contextlib
+import json
+import signal
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Добавляем пути для импортов
+sys.path.append(str(Path(__file__).parent))
+
+# Коды завершения
+EXIT_OK = 0
+EXIT_FAILED = 1          # Хотя бы один эпизод не озвучен полностью
+EXIT_USAGE = 2           # Неверные аргументы (argparse)
+EXIT_NO_PROFILE = 3      # Профиль не найден
+EXIT_NO_INPUT = 4        # Нет ни одного .srt
+EXIT_INTERRUPTED = 130
+
+VIDEO_EXTENSIONS = (".mkv", ".mp4", ".avi", ".mov", ".webm")
+
+
+def collect_inputs(paths):
+    """Файлы .srt из аргументов (папки обходятся без рекурсии, по имени)"""
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(path.glob("*.srt")))
+        elif path.suffix.lower() == ".srt" and path.exists():
+            files.append(path)
+        else:
+            print(f"⚠️ Пропущено (не .srt): {path}", file=sys.stderr)
+    return files
+
+
+def find_video(srt_path, video_dir=None):
+    """Видео с тем же именем, что и субтитры (рядом или в video_dir)"""
+    directory = Path(video_dir) if video_dir else srt_path.parent
+    for extension in VIDEO_EXTENSIONS:
+        candidate = directory / f"{srt_path.stem}{extension}"
+        if candidate.exists():
+            return candidate
+    return None
+
+
+class ProgressPrinter:
+    """Прогресс конвейера: JSON строки в stdout или краткий текст в stderr"""
+
+    def __init__(self, json_mode, stream):
+        self.json_mode = json_mode
+        self.stream = stream
+        self._lock = threading.Lock()
+        self._last = {}
+
+    def emit(self, event, **data):
+        if not self.json_mode:
+            return
+        data = dict(event=event, time=round(time.time(), 3), **data)
+        with self._lock:
+            self.stream.write(json.dumps(data, ensure_ascii=False) + "\n")
+            self.stream.flush()
+
+    def progress(self, update):
+        if self.json_mode:
+            self.emit("progress", **update)
+            return
+
+        # Текст - не чаще раза в секунду на этап, чтобы не засорять лог
+        key = (update['episode'], update['stage'])
+        now = time.monotonic()
+        finished = update['total'] and update['done'] >= update['total']
+        if not finished and now - self._last.get(key, 0) < 1.0:
+            return
+        self._last[key] = now
+        if not update['done'] and not update['total']:
+            print(f"[{update['episode']}] {update['stage']}...", file=sys.stderr)
+            return
+        total = f"/{update['total']}" if update['total'] else ""
+        done = update['done'] if isinstance(update['done'], int) else f"{update['done']:.0f}с"
+        print(f"[{update['episode']}] {update['stage']}: {done}{total}", file=sys.stderr)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Дубляж аниме без GUI: .srt -> синтез реплик -> дорожка дубляжа (-> видео)")
+    parser.add_argument("inputs", nargs="+", help=".srt файлы или папки с ними")
+    parser.add_argument("-p", "--profile", required=True, help="Название профиля персонажей (аниме)")
+    parser.add_argument("-o", "--output", required=True, help="Папка результатов (подпапка на каждый эпизод)")
+    parser.add_argument("--video", help="Видео эпизода (только для одного .srt)")
+    parser.add_argument("--video-dir", help="Папка с видео: ищется файл с тем же именем, что и .srt")
+    parser.add_argument("--no-video", action="store_true", help="Не искать видео, только дорожка дубляжа")
+    parser.add_argument("--no-fit", action="store_true", help="Не подгонять длину реплик")
+    parser.add_argument("--no-mix", action="store_true", help="Только синтез реплик")
+    parser.add_argument("--drop-original", action="store_true", help="Не оставлять оригинальную дорожку в видео")
+    parser.add_argument("--config", help="Путь к config.json (по умолчанию src/data/config.json)")
+    parser.add_argument("--json", action="store_true",
+                        help="Прогресс и итог JSON строками в stdout (диагностика - в stderr)")
+    parser.add_argument("--fail-fast", action="store_true", help="Остановиться на первом неудачном эпизоде")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Эпизодов параллельно в пуле процессов (0 - season.workers или число ядер; "
+                             "синтез идет через общую очередь с лимитами движков; --fail-fast не действует)")
+    parser.add_argument("--report", help="Путь отчета прогона без расширения (.json и .txt; "
+                                         "по умолчанию <output>/run_report)")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Пик Python памяти по этапам через tracemalloc (замедляет прогон)")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    stdout = sys.stdout
+    printer = ProgressPrinter(args.json, stdout)
+    # В режиме JSON stdout принадлежит только событиям, диагностика модулей уходит в stderr
+    redirect = contextlib.redirect_stdout(sys.stderr) if args.json else contextlib.nullcontext()
+
+    with redirect:
+        return run(args, parser, printer)
+
+
+def run(args, parser, printer):
+    from config.settings import Settings
+    from profiles.character_profile import ProfileManager
+    from processors.pipeline import DubbingPipeline
+    from tts_engines.tts_manager import TTSManager
+    from utils.instrumentation import format_summary, get_instrumentation
+
+    inputs = collect_inputs(args.inputs)
+    if not inputs:
+        print("❌ Не найдено ни одного .srt файла", file=sys.stderr)
+        return EXIT_NO_INPUT
+    if args.video and len(inputs) > 1:
+        parser.error("--video можно указать только для одного .srt")
+
+    settings = Settings()
+    if args.config:
+        settings.config_file = Path(args.config)
+        settings.config = settings.load_config()
+
+    profile = ProfileManager().load_profile(args.profile)
+    if profile is None:
+        print(f"❌ Профиль не найден: {args.profile}", file=sys.stderr)
+        printer.emit("error", error=f"профиль не найден: {args.profile}")
+        return EXIT_NO_PROFILE
+
+    stop_event = threading.Event()
+
+    def on_signal(signum, frame):
+        # Первый сигнал - мягкая остановка (начатые реплики дописываются), второй - сразу
+        if stop_event.is_set():
+            raise KeyboardInterrupt
+        print("Остановка после текущих реплик... (повторно - прервать сразу)", file=sys.stderr)
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, on_signal)
+
+    pipeline = DubbingPipeline(settings, TTSManager(settings), profile,
+                               fit=not args.no_fit, mix=not args.no_mix,
+                               keep_original=not args.drop_original,
+                               progress_callback=printer.progress, stop_event=stop_event)
+
+    output_root = Path(args.output)
+    episodes = []
+    for srt_path in inputs:
+        video = None
+        if not args.no_video and not args.no_mix:
+            video = Path(args.video) if args.video else find_video(srt_path, args.video_dir)
+        episodes.append((srt_path, video))
+
+    instrumentation = get_instrumentation()
+    if args.trace_memory or settings.get("instrumentation.tracemalloc", False):
+        instrumentation.start_tracemalloc()
+
+    reports = []
+    started = time.perf_counter()
+    printer.emit("start", episodes=len(inputs), profile=args.profile)
+
+    def on_episode_done(report):
+        reports.append(report)
+        printer.emit("episode_done", **report)
+
+        status = "✅" if report['success'] else "❌"
+        timings = ", ".join(f"{stage} {seconds:.1f}с" for stage, seconds in report['timings'].items())
+        print(f"{status} {report['episode']}: {report['elapsed']:.1f}с ({timings})"
+              + (f" - {report['error']}" if report['error'] else ""), file=sys.stderr)
+
+    try:
+        if args.jobs != 1 and len(episodes) > 1:
+            from processors.season_runner import SeasonRunner
+
+            runner = SeasonRunner(settings, pipeline.tts_manager, profile, workers=args.jobs or None,
+                                  fit=not args.no_fit, mix=not args.no_mix, keep_original=not args.drop_original,
+                                  progress_callback=printer.progress, episode_callback=on_episode_done,
+                                  stop_event=stop_event)
+            for srt_path, video in episodes:
+                printer.emit("episode_start", episode=srt_path.stem, srt=str(srt_path),
+                             video=str(video) if video else None)
+            runner.run(episodes, output_root)
+        else:
+            for srt_path, video in episodes:
+                printer.emit("episode_start", episode=srt_path.stem, srt=str(srt_path),
+                             video=str(video) if video else None)
+                on_episode_done(pipeline.run(srt_path, output_root / srt_path.stem, video))
+
+                if stop_event.is_set() or (args.fail_fast and not reports[-1]['success']):
+                    break
+    except KeyboardInterrupt:
+        stop_event.set()
+    finally:
+        pipeline.tts_manager.close()
+
+    elapsed = time.perf_counter() - started
+    failed = [report['episode'] for report in reports if not report['success']]
+    stage_totals = {}
+    for report in reports:
+        for stage, seconds in report['timings'].items():
+            stage_totals[stage] = stage_totals.get(stage, 0.0) + seconds
+
+    printer.emit("summary", episodes=len(reports), failed=failed, elapsed=elapsed,
+                 timings=stage_totals, interrupted=stop_event.is_set())
+    print(f"Итого: {len(reports) - len(failed)}/{len(inputs)} эпизодов за {elapsed:.1f}с", file=sys.stderr)
+    for stage, seconds in stage_totals.items():
+        print(f"  {stage:10} {seconds:8.1f}с", file=sys.stderr)
+
+    # Отчет прогона: куда ушло время и память, по этапам и запросам TTS
+    report_path = Path(args.report) if args.report else \
+        output_root / settings.get("instrumentation.report_name", "run_report")
+    episodes_summary = [{key: report.get(key) for key in ('episode', 'success', 'error', 'elapsed', 'timings')}
+                        for report in reports]
+    try:
+        run_report = instrumentation.write_report(report_path, profile=args.profile, episodes=episodes_summary,
+                                                  interrupted=stop_event.is_set())
+    except OSError as e:
+        print(f"⚠️ Отчет прогона не записан: {e}", file=sys.stderr)
+    else:
+        printer.emit("report", path=str(report_path.with_suffix(".json")))
+        if not args.json:
+            print(format_summary(run_report), file=sys.stderr, end="")
+
+    if stop_event.is_set():
+        return EXIT_INTERRUPTED
+    return EXIT_FAILED if failed or len(reports) < len(inputs) else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
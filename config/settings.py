@@ -23,23 +23,92 @@ class Settings:
                 "elevenlabs_keys": []
             },
             "tts_limits": {
-                "google_tts": {"daily_limit": 1000000, "used_today": 0},
-                "edge_tts": {"daily_limit": -1, "used_today": 0},
-                "gtts": {"daily_limit": 100, "used_today": 0},
-                "coqui_tts": {"daily_limit": -1, "used_today": 0},
-                "elevenlabs": {"daily_limit": 10000, "used_today": 0}
+                "google_tts": {"daily_limit": 1000000},
+                "edge_tts": {"daily_limit": -1},
+                "gtts": {"daily_limit": 100},
+                "coqui_tts": {"daily_limit": -1},
+                "elevenlabs": {"daily_limit": 10000}
+            },
+            "usage": {
+                "dir": "",
+                "flush_records": 50,
+                "flush_interval": 5.0,
+                "compact_after": 2000,
+                "keep_days": 31
             },
             "ffmpeg": {
+                "binary": "ffmpeg",
                 "use_nvenc": True,
-                "fallback_x264": True
+                "fallback_x264": True,
+                "audio_codec": "aac",
+                "audio_bitrate": "192k"
             },
             "audio": {
                 "temp_format": "wav",
                 "output_format": "mp3",
                 "original_volume_reduction": -6
+            },
+            "elevenlabs": {
+                "pool_size": 8,
+                "max_retries": 4,
+                "backoff_base": 0.5,
+                "backoff_max": 30.0,
+                "credits_ttl": 60,
+                "credit_reserve": 0,
+                "spread_across_keys": True,
+                "max_chunk_chars": 2500
+            },
+            "cache": {
+                "dir": "",
+                "max_size_mb": 2048
+            },
+            "mixer": {
+                "sample_rate": 44100,
+                "channels": 2,
+                "block_seconds": 10.0,
+                "limiter_threshold": 0.89,
+                "decode_workers": 4
+            },
+            "ducking": {
+                "attack_ms": 150,
+                "release_ms": 300,
+                "merge_gap": 0.5
+            },
+            "time_stretch": {
+                "max_ratio": 1.35,
+                "tolerance": 0.05,
+                "use_gap": False,
+                "workers": 0
+            },
+            "voice_catalog": {
+                "dir": "",
+                "ttl_hours": 24,
+                "locales": ["pl", "en"]
+            },
+            "synthesis": {
+                "default_concurrency": 2,
+                "crossfade_ms": 10,
+                "chunk_workers": 4,
+                "concurrency": {
+                    "elevenlabs": 4,
+                    "edge_tts": 8
+                }
+            },
+            "season": {
+                "workers": 0,
+                "synthesis_episodes": 0,
+                "requests_per_second": {
+                    "elevenlabs": 0,
+                    "edge_tts": 0
+                }
+            },
+            "instrumentation": {
+                "tracemalloc": False,
+                "report_name": "run_report"
             }
         }
         self.config = self.load_config()
+        self._usage_ledger = None
     
     def load_config(self):
         if self.config_file.exists():
@@ -69,6 +138,17 @@ class Settings:
         config[keys[-1]] = value
         self.save_config()
     
-    def update_tts_usage(self, engine, amount):
-        current = self.get(f"tts_limits.{engine}.used_today", 0)
-        self.set(f"tts_limits.{engine}.used_today", current + amount)
\ No newline at end of file
+    @property
+    def usage_ledger(self):
+        """Журнал использования TTS (создается при первом обращении)"""
+        if self._usage_ledger is None:
+            from .usage_ledger import UsageLedger
+            self._usage_ledger = UsageLedger.from_settings(self)
+        return self._usage_ledger
+    
+    def update_tts_usage(self, engine, amount, api_key=None):
+        # Использование пишется в журнал пачками, config.json не перезаписывается
+        self.usage_ledger.record(engine, amount, api_key)
+    
+    def get_tts_usage(self, engine, api_key=None):
+        return self.usage_ledger.get_usage(engine, api_key)
\ No newline at end of file
@@ -0,0 +1,232 @@
+# config/usage_ledger.py - журнал использования TTS: дописываемый JSONL по дням, агрегаты в памяти, пакетная запись
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def key_fingerprint(api_key):
+    """Короткий отпечаток API ключа - сам ключ в журнал не пишется"""
+    if not api_key:
+        return ""
+    return hashlib.sha1(api_key.encode('utf-8')).hexdigest()[:10]
+
+
+@contextmanager
+def _locked(lock_path):
+    """Межпроцессная блокировка файла журнала на время записи или сжатия"""
+    with open(lock_path, 'a+b') as handle:
+        if fcntl:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class UsageLedger:
+    """Учет использования TTS за день
+
+    Каждая запись (движок, отпечаток ключа, символы, время) копится в
+    памяти и дописывается в файл дня usage-ГГГГ-ММ-ДД.jsonl пачками -
+    по flush_records записей или раз в flush_interval секунд. Итоги дня
+    хранятся в памяти, поэтому get_usage и проверки лимитов - O(1).
+    Записи других процессов подхватываются при каждой записи пачки
+    (файл дочитывается с последнего смещения). Когда в файле дня больше
+    compact_after строк, он сжимается до итогов по движкам и ключам.
+    С новым днем итоги обнуляются, старые файлы удаляются через keep_days.
+    """
+
+    FILE_PREFIX = "usage-"
+
+    def __init__(self, directory, flush_records=50, flush_interval=5.0, compact_after=2000, keep_days=31):
+        self.directory = Path(directory)
+        self.flush_records = max(flush_records, 1)
+        self.flush_interval = flush_interval
+        self.compact_after = compact_after
+        self.keep_days = keep_days
+
+        self._lock = threading.RLock()
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self._day = None
+        self._open_day(date.today())
+        self._remove_old_files()
+        atexit.register(self.flush)
+
+    @classmethod
+    def from_settings(cls, settings, **kwargs):
+        """Журнал рядом с config.json (или в usage.dir)"""
+        directory = settings.get("usage.dir", "") or Path(settings.config_file).parent / "usage"
+        options = {
+            'flush_records': settings.get("usage.flush_records", 50),
+            'flush_interval': settings.get("usage.flush_interval", 5.0),
+            'compact_after': settings.get("usage.compact_after", 2000),
+            'keep_days': settings.get("usage.keep_days", 31)
+        }
+        options.update(kwargs)
+        return cls(directory, **options)
+
+    def _path(self, day):
+        return self.directory / f"{self.FILE_PREFIX}{day.isoformat()}.jsonl"
+
+    def _open_day(self, day):
+        """Начать новый день: итоги файла дня с нуля"""
+        self._day = day
+        self._file_path = self._path(day)
+        self._lock_path = self.directory / ".usage.lock"
+        self._offset = 0
+        self._inode = None
+        self._totals = {}      # движок -> символы (записанные в файл, включая другие процессы)
+        self._key_totals = {}  # (движок, отпечаток) -> символы
+        self._pending_totals = {}
+        self._pending_key_totals = {}
+        self._lines = 0
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._read_new_records()
+
+    def _check_day(self):
+        """Смена дня: хвост старого дня дописывается в его файл"""
+        today = date.today()
+        if today != self._day:
+            self._write_pending()
+            self._open_day(today)
+
+    def _read_new_records(self):
+        """Дочитать файл дня с последнего смещения (после сжатия - заново)"""
+        if not self._file_path.exists():
+            return
+        stat = self._file_path.stat()
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            # Файл сжат другим процессом - итоги пересчитываются целиком
+            self._inode = stat.st_ino
+            self._offset = 0
+            self._totals = {}
+            self._key_totals = {}
+            self._lines = 0
+
+        with open(self._file_path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        # Незаконченная строка (запись другого процесса в процессе) читается в следующий раз
+        end = data.rfind(b'\n') + 1
+        self._offset += end
+
+        for line in data[:end].splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            engine, key, chars = record.get('engine', ''), record.get('key', ''), record.get('chars', 0)
+            self._totals[engine] = self._totals.get(engine, 0) + chars
+            self._key_totals[(engine, key)] = self._key_totals.get((engine, key), 0) + chars
+            self._lines += 1
+
+    def record(self, engine, chars, api_key=None):
+        """Учесть использование (потокобезопасно, без записи на диск на каждую реплику)"""
+        key = key_fingerprint(api_key)
+        with self._lock:
+            self._check_day()
+            self._pending.append({'ts': round(time.time(), 3), 'engine': engine, 'key': key, 'chars': chars})
+            self._pending_totals[engine] = self._pending_totals.get(engine, 0) + chars
+            self._pending_key_totals[(engine, key)] = self._pending_key_totals.get((engine, key), 0) + chars
+
+            if (len(self._pending) >= self.flush_records
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self.flush()
+
+    def get_usage(self, engine, api_key=None):
+        """Использовано символов сегодня движком (или его ключом)"""
+        with self._lock:
+            self._check_day()
+            if api_key is None:
+                return self._totals.get(engine, 0) + self._pending_totals.get(engine, 0)
+            key = (engine, key_fingerprint(api_key))
+            return self._key_totals.get(key, 0) + self._pending_key_totals.get(key, 0)
+
+    def summary(self):
+        """Итоги дня по движкам: {движок: символы}"""
+        with self._lock:
+            self._check_day()
+            engines = set(self._totals) | set(self._pending_totals)
+            return {engine: self.get_usage(engine) for engine in sorted(engines)}
+
+    def flush(self):
+        """Дописать накопленные записи одной пачкой и подхватить записи других процессов"""
+        with self._lock:
+            self._write_pending()
+            if self.compact_after and self._lines > self.compact_after:
+                try:
+                    self.compact()
+                except OSError as e:
+                    print(f"⚠️ Не удалось сжать журнал использования: {e}")
+
+    def _write_pending(self):
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in self._pending)
+        try:
+            with _locked(self._lock_path):
+                with open(self._file_path, 'a', encoding='utf-8') as f:
+                    f.write(data)
+                self._read_new_records()
+        except OSError as e:
+            # Записи остаются в памяти и будут дописаны со следующей пачкой
+            print(f"⚠️ Не удалось записать журнал использования: {e}")
+            return
+
+        self._pending = []
+        self._pending_totals = {}
+        self._pending_key_totals = {}
+
+    def compact(self):
+        """Сжать файл дня до итогов по движкам и ключам (атомарная замена файла)"""
+        with self._lock, _locked(self._lock_path):
+            self._read_new_records()
+            temp_path = self._file_path.with_suffix(".tmp")
+            timestamp = round(time.time(), 3)
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                for (engine, key), chars in sorted(self._key_totals.items()):
+                    f.write(json.dumps({'ts': timestamp, 'engine': engine, 'key': key, 'chars': chars,
+                                        'compacted': True}, ensure_ascii=False) + "\n")
+            os.replace(temp_path, self._file_path)
+
+            lines = self._lines
+            self._inode = None
+            self._read_new_records()
+        print(f"Журнал использования сжат: {lines} -> {self._lines} строк")
+
+    def _remove_old_files(self):
+        """Удалить файлы дней старше keep_days"""
+        if not self.keep_days:
+            return
+        oldest = self._day - timedelta(days=self.keep_days)
+        for path in self.directory.glob(f"{self.FILE_PREFIX}*.jsonl"):
+            try:
+                day = datetime.strptime(path.stem[len(self.FILE_PREFIX):], "%Y-%m-%d").date()
+            except ValueError:
+                continue
+            if day < oldest:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
@@ -7,9 +7,13 @@ sys.path.append(str(Path(__file__).parent.parent))
 
 # Импортируем TTS менеджер
 from tts_engines.tts_manager import TTSManager
+from processors.character_stats import CharacterStatsEngine
+from gui.task_executor import TaskExecutor
+from utils.instrumentation import count
 
 class CharacterSetupWindow:
-    def __init__(self, parent, characters, profile, settings, subtitles=None):
+    def __init__(self, parent, characters, profile, settings, subtitles=None, task_executor=None,
+                 tts_manager=None):
         self.parent = parent
         self.characters = characters
         self.profile = profile
@@ -17,8 +21,10 @@ class CharacterSetupWindow:
         self.subtitles = subtitles  # Данные субтитров для расчета токенов
         self.character_tokens = {}  # Кеш рассчитанных токенов
         
-        # Инициализируем TTS менеджер
-        self.tts_manager = TTSManager(settings)
+        # TTS менеджер главного окна: общий кеш кредитов и синтеза
+        self.tts_manager = tts_manager or TTSManager(settings)
+        self._credit_cache = None
+        self.stats_engine = CharacterStatsEngine()
         
         self.window = tk.Toplevel(parent)
         self.window.title("Настройка голосов персонажей")
@@ -27,6 +33,9 @@ class CharacterSetupWindow:
         self.window.transient(parent)
         self.window.grab_set()
         
+        # Сеть и воспроизведение выполняются в фоне, окно не зависает
+        self.task_executor = task_executor or TaskExecutor(self.window)
+        
         self.tts_engines = ["google_tts", "edge_tts", "gtts", "coqui_tts", "elevenlabs"]
         self.voices_data = self.load_voices_data()
         
@@ -161,10 +170,12 @@ class CharacterSetupWindow:
         
         # Кнопки
         button_frame = ttk.Frame(main_frame)
-        button_frame.pack(row=3, column=0, columnspan=7, pady=15)
+        button_frame.grid(row=3, column=0, columnspan=7, pady=15)
         
         ttk.Button(button_frame, text="Автонастройка", 
                   command=self.auto_setup, width=18).pack(side=tk.LEFT, padx=10)
+        ttk.Button(button_frame, text="Проверить все ключи", 
+                  command=self.check_all_api_limits, width=20).pack(side=tk.LEFT, padx=10)
         ttk.Button(button_frame, text="Сохранить", 
                   command=self.save_settings, width=15).pack(side=tk.LEFT, padx=10)
         ttk.Button(button_frame, text="Отмена", 
@@ -298,15 +309,66 @@ class CharacterSetupWindow:
             # Нет voice_id - показываем стандартный выбор голоса
             self.toggle_voice_selection(character_name, True)
         
+    # Голоса по умолчанию, пока каталог движка еще не загружен
+    DEFAULT_VOICES = {
+        "google_tts": ["pl-PL-Standard-A", "pl-PL-Standard-B", "pl-PL-Standard-C", "pl-PL-Standard-D"],
+        "edge_tts": ["pl-PL-MarekNeural", "pl-PL-ZofiaNeural"],
+        "gtts": ["pl"],
+        "coqui_tts": ["tts_models/pl/mai_female/glow-tts"],
+        "elevenlabs": ["Rachel", "Domi", "Bella", "Antoni", "Elli", "Josh", "Arnold", "Adam", "Sam"]
+    }
+    
     def load_voices_data(self):
-        """Загрузка данных о голосах для TTS движков"""
-        return {
-            "google_tts": ["pl-PL-Standard-A", "pl-PL-Standard-B", "pl-PL-Standard-C", "pl-PL-Standard-D"],
-            "edge_tts": ["pl-PL-MarekNeural", "pl-PL-ZofiaNeural"],
-            "gtts": ["pl"],
-            "coqui_tts": ["tts_models/pl/mai_female/glow-tts"],
-            "elevenlabs": ["Rachel", "Domi", "Bella", "Antoni", "Elli", "Josh", "Arnold", "Adam", "Sam"]
-        }
+        """Загрузка данных о голосах для TTS движков
+        
+        Списки берутся из каталога голосов (диск/память) без сетевых
+        запросов; устаревшие каталоги обновляются в фоне, после чего
+        выпадающие списки перестраиваются.
+        """
+        voices_data = {engine: list(voices) for engine, voices in self.DEFAULT_VOICES.items()}
+        catalog = self.tts_manager.voice_catalog
+        locales = self.settings.get("voice_catalog.locales", ["pl", "en"])
+        
+        for engine in ("edge_tts", "elevenlabs"):
+            scope = self.get_elevenlabs_key() if engine == "elevenlabs" else None
+            if engine == "elevenlabs" and not scope:
+                continue
+            
+            catalog.get_voices(engine, scope, on_refresh=self.on_voice_catalog_refresh)
+            if engine == "elevenlabs":
+                voices = catalog.find(engine, scope)
+            else:
+                voices = [voice for locale in locales for voice in catalog.find(engine, scope, locale=locale)]
+            
+            names = list(dict.fromkeys(voice['name'] for voice in voices))
+            if names:
+                voices_data[engine] = names
+        
+        return voices_data
+    
+    def get_elevenlabs_key(self):
+        """API ключ для списка голосов ElevenLabs: общий из настроек или первый из профиля"""
+        for entry in self.settings.get("api_keys.elevenlabs_keys", []) or []:
+            key = entry.get('key', '') if isinstance(entry, dict) else entry
+            if key:
+                return key
+        for char_settings in self.profile.get_all_characters().values():
+            key = (char_settings.get('api_key') or '').strip()
+            if key:
+                return key
+        return None
+    
+    def on_voice_catalog_refresh(self, engine, scope):
+        """Каталог обновлен в фоне - перестроить списки в главном потоке"""
+        self.task_executor.post(self.update_voice_lists)
+    
+    def update_voice_lists(self):
+        """Обновить выпадающие списки голосов из каталога"""
+        self.voices_data = self.load_voices_data()
+        for widgets in self.character_widgets.values():
+            engine = widgets['engine'].get()
+            if engine in self.voices_data:
+                widgets['voice_combo']['values'] = self.voices_data[engine]
     
     def on_engine_change(self, character_name):
         """Обработка изменения TTS движка"""
@@ -334,7 +396,7 @@ class CharacterSetupWindow:
             widgets['voice_id'].set('')  # Очищаем voice_id для других движков
     
     def check_api_limits(self, character_name):
-        """Проверка лимитов API и расчет токенов для персонажа"""
+        """Проверка лимитов API и расчет токенов для персонажа (в фоне)"""
         widgets = self.character_widgets[character_name]
         api_key = widgets['api_key'].get().strip()
         
@@ -343,20 +405,17 @@ class CharacterSetupWindow:
             return
         
         widgets['status'].set("⏳ Расчет токенов...")
-        self.window.update()
-        
-        # 1. Рассчитываем токены персонажа
-        character_tokens = self.calculate_character_tokens(character_name)
-        
-        # 2. Проверяем API лимиты
-        widgets['status'].set("⏳ Проверка API...")
-        self.window.update()
         
-        try:
-            from tts_engines.elevenlabs.elevenlabs_api import ElevenLabsAPI
+        def work(task):
+            # 1. Рассчитываем токены персонажа
+            character_tokens = self.calculate_character_tokens(character_name)
             
-            api = ElevenLabsAPI(api_key)
-            credits_info = api.get_credits_info()
+            # 2. Проверяем API лимиты (кеш кредитов: повторная проверка ключа не идет в сеть)
+            task.report_progress("⏳ Проверка API...")
+            return character_tokens, self.get_credit_cache().get(api_key)
+        
+        def on_success(result):
+            character_tokens, credits_info = result
             
             if credits_info and 'error' not in credits_info:
                 available = credits_info['credits_available']
@@ -376,44 +435,97 @@ class CharacterSetupWindow:
                     widgets['status'].set("❌ Неверный ключ")
                 else:
                     widgets['status'].set(f"❌ {error_msg[:15]}...")
-                    
-        except ImportError:
-            widgets['status'].set("❌ API модуль не найден")
-        except Exception as e:
-            widgets['status'].set(f"❌ {str(e)[:15]}...")
+        
+        def on_error(e):
+            if isinstance(e, ImportError):
+                widgets['status'].set("❌ API модуль не найден")
+            else:
+                widgets['status'].set(f"❌ {str(e)[:15]}...")
+        
+        self.task_executor.submit(work, pass_task=True, on_success=on_success, on_error=on_error,
+                                  on_progress=widgets['status'].set)
+    
+    def get_credit_cache(self):
+        """Кеш кредитов ElevenLabs (общий с движком, если он доступен)"""
+        engine = self.tts_manager.get_engine('elevenlabs')
+        if engine is not None:
+            return engine.credit_cache
+        
+        if self._credit_cache is None:
+            from tts_engines.elevenlabs.elevenlabs_api import ElevenLabsAPI
+            from tts_engines.elevenlabs.credit_scheduler import CreditCache
+            
+            self._credit_cache = CreditCache(lambda key: ElevenLabsAPI(key).get_credits_info(),
+                                             self.settings.get("elevenlabs.credits_ttl", 60))
+        return self._credit_cache
+    
+    def check_all_api_limits(self):
+        """Проверка лимитов всех персонажей ElevenLabs: один запрос на уникальный ключ, параллельно"""
+        characters_by_key = {}
+        for name, widgets in self.character_widgets.items():
+            if widgets['engine'].get() != 'elevenlabs':
+                continue
+            api_key = widgets['api_key'].get().strip()
+            if not api_key:
+                widgets['status'].set("⚠ Нет API ключа")
+                continue
+            characters_by_key.setdefault(api_key, []).append(name)
+            widgets['status'].set("⏳ Проверка API...")
+        
+        if not characters_by_key:
+            messagebox.showinfo("Информация", "Нет персонажей ElevenLabs с API ключами")
+            return
+        
+        def work():
+            tokens = {name: self.calculate_character_tokens(name)
+                      for names in characters_by_key.values() for name in names}
+            return tokens, self.get_credit_cache().get_many(characters_by_key)
+        
+        def on_success(result):
+            tokens, credits_by_key = result
+            
+            for api_key, names in characters_by_key.items():
+                credits_info = credits_by_key.get(api_key)
+                # Ключ общий для нескольких персонажей - сравниваем с их суммой
+                needed = sum(tokens[name] for name in names)
+                
+                for name in names:
+                    widgets = self.character_widgets[name]
+                    if credits_info and 'error' not in credits_info:
+                        self.save_character_tokens(name, tokens[name])
+                        available = credits_info['credits_available']
+                        if available >= needed:
+                            widgets['status'].set(f"✓ {available} ({tokens[name]} ток.)")
+                        else:
+                            widgets['status'].set(f"⚠ {available} нужно {needed}")
+                    else:
+                        error_msg = credits_info.get('error', 'Неизвестная ошибка') if credits_info else 'Нет ответа'
+                        widgets['status'].set(f"❌ {error_msg[:15]}...")
+            
+            print(f"Проверено ключей: {len(characters_by_key)}, персонажей: {len(tokens)}")
+        
+        def on_error(e):
+            for names in characters_by_key.values():
+                for name in names:
+                    self.character_widgets[name]['status'].set(f"❌ {str(e)[:15]}...")
+        
+        self.task_executor.submit(work, on_success=on_success, on_error=on_error)
     
     def calculate_character_tokens(self, character_name):
         """Подсчет токенов для персонажа из правильно распарсенных субтитров"""
         if not self.subtitles:
             return 1
         
-        character_tokens = 0
-        character_lines = 0
-        found_texts = []
-        
-        # Теперь субтитры правильно распарсены, поэтому просто ищем по character
-        for subtitle in self.subtitles:
-            if subtitle.get('character') == character_name:
-                text = subtitle.get('text', '').strip()
-                if text:
-                    found_texts.append(text)
-                    character_lines += 1
-                    
-                    # Считаем символы в реплике
-                    tokens = len(text)
-                    character_tokens += tokens
-        
-        print(f"\n=== ТОКЕНЫ ДЛЯ {character_name.upper()} ===")
-        print(f"Найдено реплик: {character_lines}")
+        # Один проход по всей CueTable считает токены сразу для всех персонажей
+        if not self.character_tokens:
+            stats = self.stats_engine.compute(self.subtitles, clean=str.strip)
+            self.character_tokens = {name: char_stats['total_chars'] for name, char_stats in stats.items()}
         
-        # Показываем первые 3 реплики
-        for i, text in enumerate(found_texts[:3]):
-            print(f"{i+1}: '{text[:40]}{'...' if len(text) > 40 else ''}'")
+        character_tokens = self.character_tokens.get(character_name, 0)
         
-        if len(found_texts) > 3:
-            print("   ...")
-            
-        print(f"Итого: {character_tokens} символов")
+        # Итоги подсчета - в счетчики отчета прогона
+        count("tokens.characters")
+        count("tokens.chars", character_tokens)
         
         return max(character_tokens, 1)
     
@@ -443,7 +555,6 @@ class CharacterSetupWindow:
                 
             # Обновляем статус
             widgets['status'].set("⏳ Тестируем...")
-            self.window.update()
             
             # Подготавливаем данные персонажа
             character_data = {
@@ -453,16 +564,18 @@ class CharacterSetupWindow:
             
             test_text = f"Hello, I am {character_name}. This is a voice test."
             
-            try:
-                result = self.tts_manager.test_voice('ElevenLabs', character_data, test_text)
-                
+            def on_success(result):
                 if result['success']:
                     widgets['status'].set("✅ Тест ок")
                 else:
                     widgets['status'].set(f"❌ {result.get('error', 'Ошибка')[:10]}")
-                    
-            except Exception as e:
+            
+            def on_error(e):
                 widgets['status'].set(f"❌ Ошибка: {str(e)[:10]}")
+            
+            # Запрос и воспроизведение - в фоне
+            self.task_executor.submit(self.tts_manager.test_voice, 'ElevenLabs', character_data, test_text,
+                                      on_success=on_success, on_error=on_error)
         else:
             widgets['status'].set(f"⚠ {engine_name} не поддерживается")
 
@@ -553,7 +666,12 @@ class CharacterSetupWindow:
                     char_settings = self.profile.get_character(name)
                     estimated_tokens = char_settings.get('estimated_tokens', 0) if char_settings else 0
                     
-                    self.profile.add_character(name, engine, voice, gender, api_key, voice_id, estimated_tokens)
+                    if char_settings:
+                        # Поля, которых нет в окне (model_id, voice_settings), сохраняются
+                        self.profile.update_character(name, tts_engine=engine, voice=voice, gender=gender,
+                                                      api_key=api_key, voice_id=voice_id)
+                    else:
+                        self.profile.add_character(name, engine, voice, gender, api_key, voice_id, estimated_tokens)
                     
                     if estimated_tokens > 0:
                         widgets['status'].set(f"✓ Сохранен ({estimated_tokens} ток.)")
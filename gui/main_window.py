@@ -12,6 +12,8 @@ from processors.subtitle_analyzer import SubtitleAnalyzer
 from profiles.character_profile import ProfileManager
 from gui.character_setup import CharacterSetupWindow
 from tts_engines.tts_manager import TTSManager
+from gui.task_executor import TaskExecutor
+from utils.instrumentation import format_summary, get_instrumentation
 
 class MainWindow:
     def __init__(self, settings):
@@ -29,6 +31,11 @@ class MainWindow:
         self.current_characters = None
         self.current_profile = None
         
+        # Все долгие операции (сеть, синтез, разбор файлов) идут через фоновый исполнитель
+        self.task_executor = TaskExecutor(self.root)
+        self.dubbing_task = None
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
         self.setup_ui()
         
     def setup_ui(self):
@@ -231,33 +238,45 @@ class MainWindow:
         if not file_path:
             return
             
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            self.current_subtitles = self.analyzer.parse_srt(content)
-            self.current_characters = self.analyzer.analyze_characters(self.current_subtitles)
+        self.status_var.set(f"Загрузка субтитров: {os.path.basename(file_path)}...")
+        
+        def parse():
+            # Разбор в фоне: возвращаем копию ошибок, анализатор может понадобиться снова
+            subtitles = self.analyzer.load_cue_table(file_path)
+            characters = self.analyzer.analyze_characters(subtitles)
+            return subtitles, characters, list(self.analyzer.parse_errors)
+        
+        def on_success(result):
+            self.current_subtitles, self.current_characters, parse_errors = result
             
             # Автозаполнение названия аниме из имени файла, если поле пустое
             if not self.anime_name_var.get():
-                import os
                 filename = os.path.basename(file_path)
                 anime_name = filename.replace('.srt', '').replace('_', ' ')
                 self.anime_name_var.set(anime_name)
                 print(f"Название аниме установлено автоматически: {anime_name}")
             
             self.update_character_table()
-            self.status_var.set(f"Загружено {len(self.current_subtitles)} субтитров, {len(self.current_characters)} персонажей")
+            status = f"Загружено {len(self.current_subtitles)} субтитров, {len(self.current_characters)} персонажей"
+            if parse_errors:
+                status += f", пропущено блоков: {len(parse_errors)}"
+                for error in parse_errors:
+                    print(f"Строка {error.line_number}: {error.message}")
+            self.status_var.set(status)
             print(f"Субтитры загружены: {len(self.current_subtitles)} реплик, {len(self.current_characters)} персонажей")
-            
-        except Exception as e:
+        
+        def on_error(e):
             print(f"Ошибка загрузки субтитров: {e}")
+            self.status_var.set("Ошибка загрузки субтитров")
             messagebox.showerror("Ошибка", f"Не удалось загрузить субтитры: {e}")
+        
+        self.task_executor.submit(parse, on_success=on_success, on_error=on_error)
     
     def update_character_table(self):
         """Обновление таблицы персонажей"""
-        for item in self.character_tree.get_children():
-            self.character_tree.delete(item)
+        children = self.character_tree.get_children()
+        if children:
+            self.character_tree.delete(*children)
             
         if not self.current_characters:
             return
@@ -320,7 +339,8 @@ class MainWindow:
             print(f"В профиле персонажей: {len(self.current_profile.get_all_characters())}")
             
         setup_window = CharacterSetupWindow(self.root, self.current_characters, 
-                                          self.current_profile, self.settings, self.current_subtitles)
+                                          self.current_profile, self.settings, self.current_subtitles,
+                                          task_executor=self.task_executor, tts_manager=self.tts_manager)
         self.root.wait_window(setup_window.window)
         
         # Обновляем таблицу и список профилей после настройки
@@ -354,8 +374,12 @@ class MainWindow:
             messagebox.showwarning("Предупреждение", f"TTS движок не выбран для '{character_name}'")
             return
             
-        # Проверяем ElevenLabs
-        if tts_engine == 'ElevenLabs':
+        if not self.tts_manager.get_engine(tts_engine):
+            messagebox.showinfo("Информация", f"Тестирование {tts_engine} в разработке")
+            return
+        
+        # Движкам с API ключом нужны ключ и Voice ID персонажа
+        if self.tts_manager.get_capabilities(tts_engine).requires_api_key:
             api_key = char_settings.get('api_key', '').strip()
             voice_id = char_settings.get('voice_id', '').strip()
             
@@ -366,29 +390,27 @@ class MainWindow:
             if not voice_id:
                 messagebox.showwarning("Предупреждение", f"Voice ID не указан для '{character_name}'")
                 return
-                
-            # Тестовый текст
-            test_text = f"Hello, I am {character_name}. This is a voice test."
-            
-            # Запуск теста
-            self.status_var.set(f"Тестирование голоса {character_name}...")
-            self.root.update()
             
-            try:
-                result = self.tts_manager.test_voice(tts_engine, char_settings, test_text)
-                
-                if result['success']:
-                    self.status_var.set(f"Голос {character_name} протестирован успешно")
-                    messagebox.showinfo("Успех", f"Голос персонажа '{character_name}' воспроизведен")
-                else:
-                    self.status_var.set("Ошибка тестирования голоса")
-                    messagebox.showerror("Ошибка", f"Ошибка теста голоса: {result['error']}")
-                    
-            except Exception as e:
-                self.status_var.set("Ошибка тестирования")
-                messagebox.showerror("Ошибка", f"Ошибка при тестировании: {str(e)}")
-        else:
-            messagebox.showinfo("Информация", f"Тестирование {tts_engine} в разработке")
+        # Тестовый текст
+        test_text = f"Hello, I am {character_name}. This is a voice test."
+        
+        # Запуск теста в фоне: запрос и воспроизведение не блокируют окно
+        self.status_var.set(f"Тестирование голоса {character_name}...")
+        
+        def on_success(result):
+            if result['success']:
+                self.status_var.set(f"Голос {character_name} протестирован успешно")
+                messagebox.showinfo("Успех", f"Голос персонажа '{character_name}' воспроизведен")
+            else:
+                self.status_var.set("Ошибка тестирования голоса")
+                messagebox.showerror("Ошибка", f"Ошибка теста голоса: {result['error']}")
+        
+        def on_error(e):
+            self.status_var.set("Ошибка тестирования")
+            messagebox.showerror("Ошибка", f"Ошибка при тестировании: {str(e)}")
+        
+        self.task_executor.submit(self.tts_manager.test_voice, tts_engine, char_settings, test_text,
+                                  on_success=on_success, on_error=on_error)
     
     def start_dubbing(self):
         """Начать процесс дубляжа"""
@@ -400,7 +422,72 @@ class MainWindow:
             messagebox.showwarning("Предупреждение", "Сначала настройте голоса персонажей")
             return
             
-        messagebox.showinfo("Информация", "Функция дубляжа в разработке")
+        if self.dubbing_task and self.dubbing_task.running:
+            if messagebox.askyesno("Дубляж", "Дубляж уже выполняется. Остановить?"):
+                self.dubbing_task.cancel()
+                self.status_var.set("Остановка дубляжа...")
+            return
+        
+        output_dir = filedialog.askdirectory(title="Папка для озвученных реплик")
+        if not output_dir:
+            return
+        
+        from processors.speech_synthesizer import SpeechSynthesizer
+        from tts_engines.elevenlabs.credit_scheduler import CreditScheduler
+        
+        synthesizer = SpeechSynthesizer(self.tts_manager, self.current_profile, output_dir,
+                                        credit_scheduler=CreditScheduler.for_profile(self.tts_manager, self.current_profile))
+        subtitles = self.current_subtitles
+        
+        def work(task):
+            # Кнопка отмены выставляет cancel_event - синтезатор дописывает начатые реплики и выходит
+            report = None
+            try:
+                with get_instrumentation().stage("gui.synthesize"):
+                    report = synthesizer.synthesize_all(
+                        subtitles,
+                        progress_callback=lambda done, total, result: task.report_progress(done, total),
+                        stop_event=task.cancel_event
+                    )
+                return report
+            finally:
+                self.write_run_report(output_dir, report, interrupted=task.cancel_event.is_set())
+        
+        def on_progress(done, total):
+            self.status_var.set(f"Дубляж: {done}/{total} реплик")
+        
+        def on_success(report):
+            self.status_var.set(f"Дубляж завершен: {report['synthesized']} готово, {report['failed']} ошибок")
+            if report['failed']:
+                messagebox.showwarning("Дубляж", f"Не удалось озвучить реплик: {report['failed']}")
+        
+        def on_error(e):
+            self.status_var.set("Ошибка дубляжа")
+            messagebox.showerror("Ошибка", f"Ошибка дубляжа: {e}")
+        
+        def on_cancel():
+            self.status_var.set("Дубляж остановлен, готовые реплики сохранены")
+        
+        self.status_var.set("Дубляж: подготовка...")
+        self.dubbing_task = self.task_executor.submit(work, pass_task=True, on_success=on_success,
+                                                      on_error=on_error, on_progress=on_progress,
+                                                      on_cancel=on_cancel)
+    
+    def write_run_report(self, output_dir, synthesis=None, interrupted=False):
+        """Отчет прогона рядом с репликами (.json и .txt, как у cli.py)
+        
+        Замеры копятся с запуска приложения: в отчет входят и разбор
+        субтитров, и анализ персонажей перед дубляжом.
+        """
+        report_path = Path(output_dir) / self.settings.get("instrumentation.report_name", "run_report")
+        try:
+            run_report = get_instrumentation().write_report(report_path, profile=self.current_profile.anime_name,
+                                                            synthesis=synthesis, interrupted=interrupted)
+        except OSError as e:
+            print(f"⚠️ Отчет прогона не записан: {e}")
+            return None
+        print(format_summary(run_report), end="")
+        return run_report
     
     def save_profile(self):
         """Сохранение профиля"""
@@ -424,6 +511,12 @@ class MainWindow:
         # Простой диалог выбора профиля
         messagebox.showinfo("Информация", "Функция загрузки профиля в разработке")
     
+    def on_close(self):
+        """Закрытие окна: остановить фоновые задачи и закрыть соединения движков"""
+        self.task_executor.shutdown()
+        self.tts_manager.close()
+        self.root.destroy()
+    
     def run(self):
         """Запуск приложения"""
         self.root.mainloop()
\ No newline at end of file
@@ -0,0 +1,131 @@
+# gui/task_executor.py - фоновые задачи для GUI: пул потоков + очередь результатов, разбираемая через root.after
+import queue
+import threading
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Task:
+    """Фоновая задача: отмена и отчет о прогрессе из рабочего потока"""
+
+    def __init__(self, executor, on_success=None, on_error=None, on_progress=None, on_cancel=None):
+        self.executor = executor
+        self.on_success = on_success
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.on_cancel = on_cancel
+        self.cancel_event = threading.Event()  # Можно передавать в долгие операции как stop_event
+        self.future = None
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        """Запросить отмену: еще не начатая задача не запустится, начатая увидит cancel_event"""
+        self.cancel_event.set()
+        # Задача еще не начиналась - рабочий поток ее не увидит, завершаем сами
+        if self.future is not None and self.future.cancel():
+            self.executor.post(self.executor._finish, self, self.on_cancel)
+
+    def report_progress(self, *args):
+        """Передать прогресс в GUI (вызывается из рабочего потока)"""
+        if self.on_progress and not self.cancelled:
+            self.executor.post(self.on_progress, *args)
+
+    @property
+    def running(self):
+        return self.future is not None and not self.future.done()
+
+
+class TaskExecutor:
+    """Выполнение долгих операций вне главного потока Tk
+
+    Функции выполняются в пуле потоков, а их результаты, ошибки и
+    прогресс складываются в очередь. Очередь разбирается в главном
+    потоке через root.after, поэтому все колбэки могут спокойно
+    обращаться к виджетам.
+    """
+
+    POLL_INTERVAL_MS = 50
+
+    def __init__(self, root, max_workers=4):
+        self.root = root
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gui-task")
+        self._results = queue.Queue()
+        self._tasks = set()
+        self._closed = False
+        self._poll()
+
+    def submit(self, func, *args, on_success=None, on_error=None, on_progress=None,
+               on_cancel=None, pass_task=False, **kwargs):
+        """Запустить func(*args, **kwargs) в фоне
+
+        pass_task=True передает задачу первым аргументом: func(task, *args),
+        чтобы функция могла сообщать прогресс и проверять task.cancelled.
+        """
+        task = Task(self, on_success, on_error, on_progress, on_cancel)
+        call_args = (task,) + args if pass_task else args
+        task.future = self._pool.submit(self._run, task, func, call_args, kwargs)
+        self._tasks.add(task)
+        return task
+
+    def _run(self, task, func, args, kwargs):
+        """Тело задачи в рабочем потоке"""
+        if task.cancelled:
+            self.post(self._finish, task, task.on_cancel)
+            return
+
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self.post(self._finish, task, task.on_error, e)
+            return
+
+        if task.cancelled:
+            self.post(self._finish, task, task.on_cancel)
+        else:
+            self.post(self._finish, task, task.on_success, result)
+
+    def _finish(self, task, callback, *args):
+        """Завершение задачи в главном потоке"""
+        self._tasks.discard(task)
+        if callback:
+            callback(*args)
+        elif args and isinstance(args[0], Exception):
+            print(f"Ошибка фоновой задачи: {args[0]}")
+
+    def post(self, callback, *args):
+        """Поставить вызов в очередь главного потока (безопасно из любого потока)"""
+        self._results.put((callback, args))
+
+    def _poll(self):
+        """Разбор очереди результатов в главном потоке"""
+        while True:
+            try:
+                callback, args = self._results.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(*args)
+            except tk.TclError:
+                pass  # Окно уже закрыто
+            except Exception as e:
+                print(f"Ошибка обработчика фоновой задачи: {e}")
+
+        if not self._closed:
+            try:
+                self.root.after(self.POLL_INTERVAL_MS, self._poll)
+            except tk.TclError:
+                self._closed = True
+
+    def cancel_all(self):
+        """Отменить все задачи"""
+        for task in list(self._tasks):
+            task.cancel()
+
+    def shutdown(self):
+        """Остановить исполнитель (при закрытии окна)"""
+        self._closed = True
+        self.cancel_all()
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,242 @@
+# processors/audio_io.py - декодирование/кодирование аудио через ffmpeg и склейка кусков без щелчков
+import struct
+import subprocess
+
+import numpy as np
+
+DEFAULT_SAMPLE_RATE = 44100
+DEFAULT_CROSSFADE_MS = 10
+
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAV_FLOAT_HEADER_SIZE = 56  # RIFF + fmt (16) + fact + заголовок data; данные выровнены на 4 байта
+
+
+def decode_audio(path, sample_rate=DEFAULT_SAMPLE_RATE, channels=1, ffmpeg="ffmpeg"):
+    """Декодировать файл в float32 PCM (форма: [samples] или [samples, channels])"""
+    # Свои float32 WAV (промежуточные файлы) читаются напрямую, без ffmpeg
+    if str(path).lower().endswith('.wav'):
+        try:
+            samples, file_rate = open_wav_memmap(path)
+        except (OSError, ValueError):
+            pass
+        else:
+            if file_rate == sample_rate:
+                samples = np.array(samples)
+                if samples.shape[1] != channels:
+                    # Подогнанные моно реплики в стерео дорожке (и наоборот) - без ffmpeg
+                    samples = samples.mean(axis=1, keepdims=True)
+                    if channels > 1:
+                        samples = np.repeat(samples, channels, axis=1)
+                return samples[:, 0] if channels == 1 else samples
+
+    command = [ffmpeg, "-v", "error", "-i", str(path),
+               "-f", "f32le", "-acodec", "pcm_f32le", "-ac", str(channels), "-ar", str(sample_rate), "-"]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg не смог декодировать {path}: {result.stderr.decode('utf-8', 'replace').strip()}")
+
+    samples = np.frombuffer(result.stdout, dtype=np.float32)
+    if channels > 1:
+        samples = samples.reshape(-1, channels)
+    return samples
+
+
+def encode_audio(samples, path, sample_rate=DEFAULT_SAMPLE_RATE, ffmpeg="ffmpeg"):
+    """Закодировать float32 PCM в файл (формат по расширению path)"""
+    samples = np.ascontiguousarray(samples, dtype=np.float32)
+    channels = 1 if samples.ndim == 1 else samples.shape[1]
+    command = [ffmpeg, "-v", "error", "-y",
+               "-f", "f32le", "-ac", str(channels), "-ar", str(sample_rate), "-i", "-", str(path)]
+    result = subprocess.run(command, input=samples.tobytes(), stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, check=False)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg не смог записать {path}: {result.stderr.decode('utf-8', 'replace').strip()}")
+    return str(path)
+
+
+def concat_audio(parts, sample_rate=DEFAULT_SAMPLE_RATE, crossfade_ms=DEFAULT_CROSSFADE_MS):
+    """Склеить куски с коротким равномощным кроссфейдом на стыках
+
+    Длина результата считается точно по отсчетам: каждый стык короче
+    суммы кусков ровно на длину кроссфейда.
+    """
+    parts = [part for part in parts if len(part)]
+    if not parts:
+        return np.zeros(0, dtype=np.float32)
+
+    fade = int(sample_rate * crossfade_ms / 1000)
+    total = sum(len(part) for part in parts)
+    overlaps = [min(fade, len(previous), len(part)) for previous, part in zip(parts, parts[1:])]
+    output = np.zeros((total - sum(overlaps),) + parts[0].shape[1:], dtype=np.float32)
+
+    position = 0
+    for index, part in enumerate(parts):
+        overlap = overlaps[index - 1] if index else 0
+        start = position - overlap
+        if overlap:
+            ramp = np.linspace(0.0, np.pi / 2, overlap, dtype=np.float32)
+            fade_in = np.sin(ramp)
+            fade_out = np.cos(ramp)
+            if part.ndim > 1:
+                fade_in = fade_in[:, None]
+                fade_out = fade_out[:, None]
+            output[start:position] = output[start:position] * fade_out + part[:overlap] * fade_in
+            output[position:start + len(part)] = part[overlap:]
+        else:
+            output[start:start + len(part)] = part
+        position = start + len(part)
+
+    return output
+
+
+def join_audio_files(paths, output_path, sample_rate=DEFAULT_SAMPLE_RATE,
+                     crossfade_ms=DEFAULT_CROSSFADE_MS, ffmpeg="ffmpeg"):
+    """Склеить аудио файлы кусков реплики в один файл"""
+    parts = [decode_audio(path, sample_rate, ffmpeg=ffmpeg) for path in paths]
+    return encode_audio(concat_audio(parts, sample_rate, crossfade_ms), output_path, sample_rate, ffmpeg)
+
+
+def _wav_float_header(frames, channels, sample_rate):
+    """Заголовок float32 WAV (WAV_FLOAT_HEADER_SIZE байт)"""
+    data_size = frames * channels * 4
+    return b''.join([
+        b'RIFF', struct.pack('<I', WAV_FLOAT_HEADER_SIZE - 8 + data_size), b'WAVE',
+        b'fmt ', struct.pack('<IHHIIHH', 16, WAVE_FORMAT_IEEE_FLOAT, channels, sample_rate,
+                             sample_rate * channels * 4, channels * 4, 32),
+        b'fact', struct.pack('<II', 4, frames),
+        b'data', struct.pack('<I', data_size)
+    ])
+
+
+def create_wav_memmap(path, frames, channels=1, sample_rate=DEFAULT_SAMPLE_RATE):
+    """Создать float32 WAV нужной длины и отобразить его данные в память
+
+    Файл создается сразу полного размера (нули), дальше данные пишутся
+    блоками через memmap - весь трек в памяти не держится.
+    """
+    data_size = frames * channels * 4
+    with open(path, 'wb') as f:
+        f.write(_wav_float_header(frames, channels, sample_rate))
+        f.truncate(WAV_FLOAT_HEADER_SIZE + data_size)
+
+    if frames == 0:
+        return np.zeros((0, channels), dtype=np.float32)
+    return np.memmap(path, dtype=np.float32, mode='r+', offset=WAV_FLOAT_HEADER_SIZE, shape=(frames, channels))
+
+
+def open_wav_memmap(path, mode='r'):
+    """Открыть float32 WAV (созданный create_wav_memmap) как memmap; (samples, sample_rate)"""
+    with open(path, 'rb') as f:
+        header = f.read(WAV_FLOAT_HEADER_SIZE)
+
+    if len(header) < WAV_FLOAT_HEADER_SIZE or header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+        raise ValueError(f"{path}: не WAV файл")
+    audio_format, channels, sample_rate = struct.unpack('<HHI', header[20:28])
+    if audio_format != WAVE_FORMAT_IEEE_FLOAT or header[48:52] != b'data':
+        raise ValueError(f"{path}: ожидается float32 WAV")
+
+    data_size = struct.unpack('<I', header[52:56])[0]
+    frames = data_size // (channels * 4)
+    if frames == 0:
+        return np.zeros((0, channels), dtype=np.float32), sample_rate
+    samples = np.memmap(path, dtype=np.float32, mode=mode, offset=WAV_FLOAT_HEADER_SIZE, shape=(frames, channels))
+    return samples, sample_rate
+
+
+def read_wav_format(path):
+    """Частота и число каналов любого WAV (обход RIFF чанков до fmt); None, если не WAV"""
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(12)
+            if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+                return None
+            while True:
+                chunk = f.read(8)
+                if len(chunk) < 8:
+                    return None
+                chunk_id, chunk_size = chunk[:4], struct.unpack('<I', chunk[4:])[0]
+                if chunk_id == b'fmt ':
+                    fmt = f.read(8)
+                    if len(fmt) < 8:
+                        return None
+                    _, channels, sample_rate = struct.unpack('<HHI', fmt)
+                    return sample_rate, channels
+                f.seek(chunk_size + (chunk_size & 1), 1)
+    except OSError:
+        return None
+
+
+def iter_audio_blocks(path, block_frames, sample_rate=DEFAULT_SAMPLE_RATE, channels=2, ffmpeg="ffmpeg"):
+    """Потоковое декодирование: блоки float32 [frames, channels] по block_frames кадров
+
+    Весь файл в память не загружается: свои float32 WAV читаются через
+    memmap, остальное - из конвейера ffmpeg.
+    """
+    if str(path).lower().endswith('.wav'):
+        try:
+            samples, file_rate = open_wav_memmap(path)
+        except (OSError, ValueError):
+            samples = None
+        if samples is not None and file_rate == sample_rate and samples.shape[1] == channels:
+            for start in range(0, len(samples), block_frames):
+                yield np.array(samples[start:start + block_frames])
+            return
+
+    command = [ffmpeg, "-v", "error", "-i", str(path),
+               "-f", "f32le", "-acodec", "pcm_f32le", "-ac", str(channels), "-ar", str(sample_rate), "-"]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    block_bytes = block_frames * channels * 4
+    finished = False
+    try:
+        while True:
+            data = process.stdout.read(block_bytes)
+            if not data:
+                finished = True
+                break
+            yield np.frombuffer(data, dtype=np.float32).reshape(-1, channels)
+    finally:
+        # Генератор закрыт раньше конца (close() или исключение у потребителя):
+        # ffmpeg больше не нужен, его код возврата не ошибка
+        if not finished:
+            process.kill()
+        process.stdout.close()
+        stderr = process.stderr.read()
+        process.stderr.close()
+        returncode = process.wait()
+    if returncode != 0:
+        raise RuntimeError(f"ffmpeg не смог декодировать {path}: {stderr.decode('utf-8', 'replace').strip()}")
+
+
+class WavWriter:
+    """Потоковая запись float32 WAV: длина не нужна заранее, размеры дописываются при закрытии"""
+
+    def __init__(self, path, channels=2, sample_rate=DEFAULT_SAMPLE_RATE):
+        self.path = path
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.frames = 0
+        self._file = open(path, 'wb')
+        self._file.write(self._header())
+
+    def _header(self):
+        return _wav_float_header(self.frames, self.channels, self.sample_rate)
+
+    def write(self, block):
+        """Дописать блок [frames, channels]"""
+        block = np.ascontiguousarray(block, dtype=np.float32)
+        self._file.write(block.tobytes())
+        self.frames += len(block)
+
+    def close(self):
+        """Дописать заголовок с итоговыми размерами"""
+        if self._file.closed:
+            return
+        self._file.seek(0)
+        self._file.write(self._header())
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,197 @@
+# processors/audio_mixer.py - сборка дорожки дубляжа: реплики на таймлайне эпизода блоками через memmap WAV
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from .audio_io import DEFAULT_SAMPLE_RATE, create_wav_memmap, decode_audio
+
+
+def soft_limit(block, threshold=0.89):
+    """Мягкое ограничение пиков: выше порога сигнал плавно сжимается к 1.0
+
+    Без состояния, поэтому одинаково работает на любых границах блоков.
+    Возвращает количество ограниченных отсчетов.
+    """
+    magnitude = np.abs(block)
+    over = magnitude > threshold
+    count = int(np.count_nonzero(over))
+    if count:
+        knee = 1.0 - threshold
+        block[over] = np.sign(block[over]) * (threshold + knee * np.tanh((magnitude[over] - threshold) / knee))
+    return count
+
+
+def clips_from_manifest(output_dir):
+    """Готовые реплики из манифеста SpeechSynthesizer: {индекс реплики: путь к файлу}"""
+    from .speech_synthesizer import SpeechSynthesizer
+
+    output_dir = Path(output_dir)
+    with open(output_dir / SpeechSynthesizer.MANIFEST_NAME, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    return {int(index): output_dir / entry['file']
+            for index, entry in manifest.get('cues', {}).items()
+            if entry.get('status') == 'done'}
+
+
+class AudioMixer:
+    """Сборка дорожки эпизода из синтезированных реплик
+
+    Реплики ставятся на таймлайн по start_time и смешиваются блоками
+    фиксированной длины прямо в float32 WAV, отображенный в память: в RAM
+    одновременно только текущий блок и реплики, которые его пересекают.
+    Наложения реплик суммируются, пики мягко ограничиваются.
+    """
+
+    def __init__(self, sample_rate=DEFAULT_SAMPLE_RATE, channels=2, block_seconds=10.0,
+                 limiter_threshold=0.89, decode_workers=4, ffmpeg="ffmpeg", decode=None):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.block_frames = max(int(block_seconds * sample_rate), 1)
+        self.limiter_threshold = limiter_threshold
+        self.decode_workers = decode_workers
+        self.ffmpeg = ffmpeg
+        # decode(path) -> float32 [samples] или [samples, channels]; по умолчанию ffmpeg
+        self.decode = decode or self._decode_file
+
+    @classmethod
+    def from_settings(cls, settings, **kwargs):
+        """Микшер с параметрами из настроек"""
+        options = {
+            'sample_rate': settings.get("mixer.sample_rate", DEFAULT_SAMPLE_RATE),
+            'channels': settings.get("mixer.channels", 2),
+            'block_seconds': settings.get("mixer.block_seconds", 10.0),
+            'limiter_threshold': settings.get("mixer.limiter_threshold", 0.89),
+            'decode_workers': settings.get("mixer.decode_workers", 4),
+            'ffmpeg': settings.get("ffmpeg.binary", "ffmpeg")
+        }
+        options.update(kwargs)
+        return cls(**options)
+
+    def _decode_file(self, path):
+        return decode_audio(path, self.sample_rate, self.channels, self.ffmpeg)
+
+    def _load_clip(self, path):
+        """Реплика в формате дорожки: [samples, channels] float32"""
+        samples = np.asarray(self.decode(path), dtype=np.float32)
+        if samples.ndim == 1:
+            samples = samples[:, None]
+        if samples.shape[1] != self.channels:
+            # Моно реплика в стерео дорожке (и наоборот - среднее каналов)
+            samples = np.repeat(samples.mean(axis=1, keepdims=True), self.channels, axis=1)
+        return samples
+
+    def _timeline(self, cues, clips):
+        """Реплики с файлами, отсортированные по началу: [(кадр начала, индекс, путь)]"""
+        if not isinstance(clips, dict):
+            clips = {index: path for index, path in enumerate(clips) if path is not None}
+
+        events = []
+        missing = 0
+        for index, cue in enumerate(cues):
+            path = clips.get(index)
+            if path is None:
+                missing += 1
+                continue
+            events.append((int(round(cue['start_time'] * self.sample_rate)), index, path))
+        events.sort()
+        return events, missing
+
+    def mix(self, cues, clips, output_path, duration=None, progress_callback=None):
+        """Собрать дорожку эпизода в float32 WAV
+
+        cues - CueTable или список словарей parse_srt (start_time, end_time в
+        секундах); clips - {индекс реплики: путь} или список путей по порядку
+        реплик. duration - длина эпизода в секундах (по умолчанию конец
+        последней реплики + block_seconds). progress_callback(done, total)
+        вызывается после каждого блока. Возвращает отчет.
+        """
+        started = time.perf_counter()
+        events, missing = self._timeline(cues, clips)
+
+        if duration is None:
+            last_end = max((cue['end_time'] for cue in cues), default=0.0)
+            total_frames = int(round(last_end * self.sample_rate)) + self.block_frames
+        else:
+            total_frames = int(round(duration * self.sample_rate))
+
+        track = create_wav_memmap(output_path, total_frames, self.channels, self.sample_rate)
+
+        report = {
+            'output': str(output_path),
+            'duration': total_frames / self.sample_rate,
+            'clips': 0,
+            'missing': missing,
+            'truncated': 0,
+            'limited_samples': 0,
+            'peak': 0.0
+        }
+
+        total_blocks = (total_frames + self.block_frames - 1) // self.block_frames
+        pending = deque()  # (кадр начала, future) - декодирование с упреждением
+        active = []        # (кадр начала, samples) - реплики, пересекающие текущий блок
+        next_event = 0
+
+        with ThreadPoolExecutor(max_workers=self.decode_workers, thread_name_prefix="mix-decode") as executor:
+            def prefetch(until_frame):
+                # Декодируем заранее реплики, начинающиеся до until_frame (не больше 4 * workers)
+                nonlocal next_event
+                while (next_event < len(events) and events[next_event][0] < until_frame
+                       and len(pending) < self.decode_workers * 4):
+                    start_frame, _, path = events[next_event]
+                    pending.append((start_frame, executor.submit(self._load_clip, path)))
+                    next_event += 1
+
+            for block_index in range(total_blocks):
+                block_start = block_index * self.block_frames
+                block_end = min(block_start + self.block_frames, total_frames)
+                prefetch(block_end + self.block_frames)
+
+                # Реплики, начинающиеся в этом блоке, становятся активными
+                while True:
+                    prefetch(block_end + self.block_frames)
+                    if not pending or pending[0][0] >= block_end:
+                        break
+                    start_frame, future = pending.popleft()
+                    samples = future.result()
+                    if start_frame + len(samples) > total_frames:
+                        report['truncated'] += 1
+                    active.append((start_frame, samples))
+                    report['clips'] += 1
+
+                block = np.zeros((block_end - block_start, self.channels), dtype=np.float32)
+                still_active = []
+                for start_frame, samples in active:
+                    clip_end = start_frame + len(samples)
+                    lo = max(start_frame, block_start)
+                    hi = min(clip_end, block_end)
+                    if hi > lo:
+                        block[lo - block_start:hi - block_start] += samples[lo - start_frame:hi - start_frame]
+                    if clip_end > block_end:
+                        still_active.append((start_frame, samples))
+                active = still_active
+
+                if len(block):
+                    report['peak'] = max(report['peak'], float(np.abs(block).max()))
+                report['limited_samples'] += soft_limit(block, self.limiter_threshold)
+                track[block_start:block_end] = block
+
+                if progress_callback:
+                    progress_callback(block_index + 1, total_blocks)
+
+        # Реплики, которые начинаются после конца дорожки
+        report['truncated'] += len(pending) + len(events) - next_event
+        if isinstance(track, np.memmap):
+            track.flush()
+        del track
+
+        report['elapsed'] = time.perf_counter() - started
+        report['realtime_factor'] = report['duration'] / report['elapsed'] if report['elapsed'] > 0 else 0
+        print(f"Дорожка собрана: {report['clips']} реплик, {report['duration']:.0f}с аудио за "
+              f"{report['elapsed']:.1f}с (x{report['realtime_factor']:.0f}), ограничено отсчетов: "
+              f"{report['limited_samples']}")
+        return report
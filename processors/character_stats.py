@@ -0,0 +1,51 @@
+# processors/character_stats.py - статистика персонажей за один проход по CueTable
+from utils.instrumentation import timed
+from utils.text_counter import TextCounter
+
+from .cue_table import CueTable
+
+
+class CharacterStatsEngine:
+    """Подсчет статистики по всем персонажам сразу
+
+    Реплики группируются по id персонажа одним проходом по колонке
+    character_ids, после чего для каждой группы длительность суммируется по
+    колонке array('d'), а символы, слова и токены ElevenLabs считаются по
+    склеенному тексту группы (TextCounter.calculate_stats).
+    Числа совпадают с TextCounter.calculate_stats и analyze_characters.
+    """
+
+    def __init__(self, text_counter=None):
+        self.text_counter = text_counter or TextCounter()
+
+    @timed("tokens.count")
+    def compute(self, subtitles, clean=None):
+        """Статистика {имя персонажа: {...}} для CueTable или списка реплик
+
+        clean - функция очистки текста реплики перед подсчетом
+        (по умолчанию TextCounter.clean_text).
+        """
+        if not isinstance(subtitles, CueTable):
+            subtitles = CueTable.from_records(subtitles)
+        if clean is None:
+            clean = self.text_counter.clean_text
+
+        texts = subtitles.texts
+        durations = subtitles.durations
+
+        stats = {}
+        for character_id, indices in subtitles.group_by_character().items():
+            total_duration = 0
+            for index in indices:
+                total_duration += durations[index]
+
+            char_stats = self.text_counter.calculate_stats([clean(texts[index]) for index in indices])
+            char_stats['total_duration'] = total_duration
+            stats[subtitles.characters[character_id]] = char_stats
+
+        return stats
+
+    def compute_tokens(self, subtitles, clean=None):
+        """Только токены ElevenLabs по персонажам"""
+        return {name: char_stats['elevenlabs_tokens']
+                for name, char_stats in self.compute(subtitles, clean).items()}
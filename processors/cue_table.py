@@ -0,0 +1,172 @@
+# processors/cue_table.py - компактное хранение реплик: параллельные колонки вместо словаря на реплику
+from array import array
+
+
+class CueTable:
+    """Таблица реплик с колонками
+
+    Время хранится в array('d'), персонажи - в колонке целых id со
+    словарем интернированных имен, текст - в отдельном списке.
+    Строки и выборки по персонажам отдаются как представления по индексам,
+    без копирования данных.
+    """
+
+    __slots__ = ('ids', 'start_times', 'end_times', 'durations', 'character_ids',
+                 'texts', 'characters', '_character_index', '_groups')
+
+    def __init__(self):
+        self.ids = array('l')
+        self.start_times = array('d')
+        self.end_times = array('d')
+        self.durations = array('d')
+        self.character_ids = array('l')
+        self.texts = []
+        self.characters = []         # id персонажа -> имя
+        self._character_index = {}   # имя -> id персонажа
+        self._groups = None          # Кеш индексов реплик по персонажам
+
+    @classmethod
+    def from_cues(cls, cues):
+        """Собрать таблицу из SubtitleCue (например, из SubtitleAnalyzer.iter_srt)"""
+        table = cls()
+        for cue in cues:
+            table.append(cue.id, cue.character, cue.start_time, cue.end_time, cue.text)
+        return table
+
+    @classmethod
+    def from_records(cls, records):
+        """Собрать таблицу из словарей в формате parse_srt"""
+        table = cls()
+        for record in records:
+            table.append(record['id'], record['character'], record['start_time'],
+                         record['end_time'], record['text'])
+        return table
+
+    def append(self, cue_id, character, start_time, end_time, text):
+        """Добавить реплику"""
+        self.ids.append(cue_id)
+        self.start_times.append(start_time)
+        self.end_times.append(end_time)
+        self.durations.append(end_time - start_time)
+        self.character_ids.append(self.intern_character(character))
+        self.texts.append(text)
+        self._groups = None
+
+    def intern_character(self, name):
+        """Получить id персонажа, добавив его при первом появлении"""
+        character_id = self._character_index.get(name)
+        if character_id is None:
+            character_id = len(self.characters)
+            self._character_index[name] = character_id
+            self.characters.append(name)
+        return character_id
+
+    def character_id(self, name):
+        """id персонажа или None, если его нет в таблице"""
+        return self._character_index.get(name)
+
+    def group_by_character(self):
+        """Индексы реплик каждого персонажа: {id персонажа: array('l')}"""
+        if self._groups is None:
+            groups = [array('l') for _ in self.characters]
+            for index, character_id in enumerate(self.character_ids):
+                groups[character_id].append(index)
+            self._groups = groups
+        return dict(enumerate(self._groups))
+
+    def rows_for(self, character_name):
+        """Реплики персонажа в виде представления"""
+        character_id = self.character_id(character_name)
+        if character_id is None:
+            return CueRows(self, array('l'))
+        return CueRows(self, self.group_by_character()[character_id])
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.texts)
+        if not 0 <= index < len(self.texts):
+            raise IndexError("индекс реплики вне таблицы")
+        return CueRow(self, index)
+
+    def __iter__(self):
+        for index in range(len(self.texts)):
+            yield CueRow(self, index)
+
+
+class CueRow:
+    """Представление одной реплики с доступом как к словарю parse_srt"""
+
+    __slots__ = ('table', 'index')
+
+    KEYS = ('id', 'character', 'start_time', 'end_time', 'text', 'duration')
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    def __getitem__(self, key):
+        table = self.table
+        index = self.index
+        if key == 'text':
+            return table.texts[index]
+        if key == 'character':
+            return table.characters[table.character_ids[index]]
+        if key == 'duration':
+            return table.durations[index]
+        if key == 'start_time':
+            return table.start_times[index]
+        if key == 'end_time':
+            return table.end_times[index]
+        if key == 'id':
+            return table.ids[index]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return self.KEYS
+
+    def to_dict(self):
+        """Копия реплики в виде словаря"""
+        return {key: self[key] for key in self.KEYS}
+
+
+class CueRows:
+    """Представление набора реплик таблицы по индексам"""
+
+    __slots__ = ('table', 'indices')
+
+    def __init__(self, table, indices):
+        self.table = table
+        self.indices = indices
+
+    def texts(self):
+        """Тексты реплик"""
+        texts = self.table.texts
+        return [texts[index] for index in self.indices]
+
+    def total_duration(self):
+        """Суммарная длительность реплик"""
+        durations = self.table.durations
+        total = 0
+        for index in self.indices:
+            total += durations[index]
+        return total
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, position):
+        return CueRow(self.table, self.indices[position])
+
+    def __iter__(self):
+        table = self.table
+        for index in self.indices:
+            yield CueRow(table, index)
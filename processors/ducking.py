@@ -0,0 +1,137 @@
+# processors/ducking.py - приглушение оригинальной дорожки на время реплик (огибающая усиления по окнам субтитров)
+import time
+
+import numpy as np
+
+from .audio_io import DEFAULT_SAMPLE_RATE, WavWriter, iter_audio_blocks, open_wav_memmap
+from .audio_mixer import soft_limit
+
+
+def merge_intervals(cues, merge_gap=0.5):
+    """Окна реплик [(начало, конец)] с объединением пауз короче merge_gap секунд"""
+    intervals = sorted((cue['start_time'], cue['end_time']) for cue in cues)
+    merged = []
+    for start, end in intervals:
+        if merged and start - merged[-1][1] <= merge_gap:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+class Ducker:
+    """Приглушение оригинала в окнах реплик
+
+    Огибающая строится по объединенным окнам субтитров: за attack секунд
+    до начала реплики уровень плавно опускается на reduction_db и за
+    release секунд после конца возвращается. Рампы линейны в децибелах.
+    Огибающая считается аналитически для каждого блока, а оригинал
+    декодируется и пишется потоково - трек целиком в памяти не бывает.
+    """
+
+    def __init__(self, reduction_db=-6.0, attack=0.15, release=0.3, merge_gap=0.5,
+                 sample_rate=DEFAULT_SAMPLE_RATE, channels=2, block_seconds=10.0,
+                 limiter_threshold=0.89, ffmpeg="ffmpeg"):
+        self.reduction_db = reduction_db
+        self.attack = max(attack, 1e-6)
+        self.release = max(release, 1e-6)
+        self.merge_gap = merge_gap
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.block_frames = max(int(block_seconds * sample_rate), 1)
+        self.limiter_threshold = limiter_threshold
+        self.ffmpeg = ffmpeg
+
+    @classmethod
+    def from_settings(cls, settings, **kwargs):
+        """Приглушение с параметрами из настроек (audio.original_volume_reduction)"""
+        options = {
+            'reduction_db': settings.get("audio.original_volume_reduction", -6),
+            'attack': settings.get("ducking.attack_ms", 150) / 1000,
+            'release': settings.get("ducking.release_ms", 300) / 1000,
+            'merge_gap': settings.get("ducking.merge_gap", 0.5),
+            'sample_rate': settings.get("mixer.sample_rate", DEFAULT_SAMPLE_RATE),
+            'channels': settings.get("mixer.channels", 2),
+            'block_seconds': settings.get("mixer.block_seconds", 10.0),
+            'limiter_threshold': settings.get("mixer.limiter_threshold", 0.89),
+            'ffmpeg': settings.get("ffmpeg.binary", "ffmpeg")
+        }
+        options.update(kwargs)
+        return cls(**options)
+
+    def envelope(self, intervals, ends, block_start, frames):
+        """Доля приглушения 0..1 для кадров блока [block_start, block_start + frames)
+
+        intervals - объединенные окна, ends - их концы (для searchsorted).
+        """
+        duck = np.zeros(frames, dtype=np.float32)
+        if not intervals:
+            return duck
+
+        rate = self.sample_rate
+        block_begin = block_start / rate
+        block_finish = (block_start + frames) / rate
+        # Окна, чьи рампы могут задеть блок; каждое считается только на своем участке блока
+        first = int(np.searchsorted(ends, block_begin - self.release))
+        for start, end in intervals[first:]:
+            if start - self.attack >= block_finish:
+                break
+            lo = max(int(np.floor((start - self.attack) * rate)) - block_start, 0)
+            hi = min(int(np.ceil((end + self.release) * rate)) - block_start + 1, frames)
+            if hi <= lo:
+                continue
+            times = (block_start + np.arange(lo, hi)) / rate
+            ramp = np.minimum((times - (start - self.attack)) / self.attack,
+                              ((end + self.release) - times) / self.release)
+            np.maximum(duck[lo:hi], np.clip(ramp, 0.0, 1.0), out=duck[lo:hi])
+        return duck
+
+    def process(self, original_path, cues, output_path, dub_path=None, progress_callback=None):
+        """Приглушить оригинал в окнах реплик и (опционально) наложить дорожку дубляжа
+
+        dub_path - float32 WAV от AudioMixer; накладывается поблочно с
+        мягким ограничением пиков. Результат - float32 WAV. Возвращает отчет.
+        """
+        started = time.perf_counter()
+        intervals = merge_intervals(cues, self.merge_gap)
+        ends = np.array([end for _, end in intervals])
+
+        dub = None
+        if dub_path:
+            dub, dub_rate = open_wav_memmap(dub_path)
+            if dub_rate != self.sample_rate:
+                raise ValueError(f"Частота дорожки дубляжа {dub_rate} Гц, ожидается {self.sample_rate} Гц")
+
+        frames = 0
+        limited = 0
+        with WavWriter(output_path, self.channels, self.sample_rate) as writer:
+            for block in iter_audio_blocks(original_path, self.block_frames, self.sample_rate,
+                                           self.channels, self.ffmpeg):
+                duck = self.envelope(intervals, ends, frames, len(block))
+                gain = np.power(np.float32(10.0), np.float32(self.reduction_db / 20.0) * duck)
+                output = block * gain[:, None]
+
+                if dub is not None and frames < len(dub):
+                    part = dub[frames:frames + len(block)]
+                    output[:len(part)] += part if part.shape[1] == self.channels else part.mean(axis=1, keepdims=True)
+                    limited += soft_limit(output, self.limiter_threshold)
+
+                writer.write(output)
+                frames += len(block)
+                if progress_callback:
+                    progress_callback(frames / self.sample_rate)
+
+        elapsed = time.perf_counter() - started
+        duration = frames / self.sample_rate
+        report = {
+            'output': str(output_path),
+            'duration': duration,
+            'windows': len(intervals),
+            'ducked_seconds': sum(end - start for start, end in intervals),
+            'limited_samples': limited,
+            'elapsed': elapsed,
+            'realtime_factor': duration / elapsed if elapsed > 0 else 0
+        }
+        print(f"Оригинал приглушен: {len(intervals)} окон, {duration:.0f}с аудио за {elapsed:.1f}с "
+              f"(x{report['realtime_factor']:.0f})")
+        return report
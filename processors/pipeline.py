@@ -0,0 +1,215 @@
+# processors/pipeline.py - полный цикл дубляжа эпизода без GUI: субтитры -> анализ -> синтез -> подгонка -> сборка -> видео
+import threading
+import time
+from pathlib import Path
+
+from utils.instrumentation import get_instrumentation
+
+from .subtitle_analyzer import SubtitleAnalyzer
+
+
+class StageError(Exception):
+    """Ошибка этапа конвейера (этап указан в сообщении)"""
+
+    def __init__(self, stage, message):
+        super().__init__(f"{stage}: {message}")
+        self.stage = stage
+
+
+class DubbingPipeline:
+    """Дубляж эпизода целиком: разбор .srt, анализ персонажей, синтез реплик,
+    подгонка длины, сборка дорожки и (если есть видео) приглушение оригинала
+    и мультиплексирование
+
+    Модуль не импортирует tkinter и pygame - конвейер работает на
+    сервере без дисплея. Этапы сообщают прогресс через
+    progress_callback(событие), где событие - словарь
+    {'episode', 'stage', 'done', 'total'}; итог - отчет с временем этапов.
+    """
+
+    def __init__(self, settings, tts_manager, profile, fit=True, mix=True, keep_original=True,
+                 progress_callback=None, stop_event=None):
+        self.settings = settings
+        self.tts_manager = tts_manager
+        self.profile = profile
+        self.fit = fit
+        self.mix = mix
+        self.keep_original = keep_original
+        self.progress_callback = progress_callback
+        self.stop_event = stop_event or threading.Event()
+        self.fit_options = {}  # Переопределения ClipFitter (SeasonRunner: workers=1 внутри процесса пула)
+        self.analyzer = SubtitleAnalyzer()
+
+    def _progress(self, episode, stage, done, total):
+        if self.progress_callback:
+            self.progress_callback({'episode': episode, 'stage': stage, 'done': done, 'total': total})
+
+    def _check_stopped(self, stage):
+        if self.stop_event.is_set():
+            raise StageError(stage, "прервано")
+
+    def run(self, srt_path, output_dir, video_path=None, output_video=None):
+        """Дубляж одного эпизода
+
+        Реплики, клипы и дорожка пишутся в output_dir; при video_path
+        результат мультиплексируется в output_video (по умолчанию
+        output_dir/<имя видео>.dub<расширение>). Возвращает отчет.
+        """
+        srt_path = Path(srt_path)
+        output_dir = Path(output_dir)
+        report = self.new_report(srt_path)
+        started = time.perf_counter()
+
+        try:
+            cues = self.parse(report, srt_path)
+            self.synthesize(report, cues, output_dir)
+            if self.mix:
+                self.render(report, cues, output_dir, video_path, output_video)
+            self.finish(report)
+        except StageError as e:
+            report['error'] = str(e)
+            report['stage'] = e.stage
+
+        report['elapsed'] = time.perf_counter() - started
+        return report
+
+    # Этапы по отдельности: SeasonRunner выполняет разбор и сборку в пуле
+    # процессов, а синтез - в родительском процессе через общую очередь
+
+    def new_report(self, srt_path):
+        return {'episode': Path(srt_path).stem, 'srt': str(srt_path), 'success': False, 'error': '',
+                'timings': {}}
+
+    def _timed(self, report, stage, func, *args, **kwargs):
+        """Выполнить этап с прогрессом и замером времени; любая ошибка - StageError
+
+        Время и память этапа копятся и в замерах прогона (pipeline.<этап>).
+        """
+        self._check_stopped(stage)
+        self._progress(report['episode'], stage, 0, None)
+        stage_started = time.perf_counter()
+        try:
+            with get_instrumentation().stage(f"pipeline.{stage}"):
+                result = func(*args, **kwargs)
+        except StageError:
+            raise
+        except Exception as e:
+            raise StageError(stage, str(e)) from e
+        report['timings'][stage] = time.perf_counter() - stage_started
+        return result
+
+    def parse(self, report, srt_path):
+        """Разбор .srt и анализ персонажей; возвращает таблицу реплик"""
+        cues = self._timed(report, "parse", self.analyzer.load_cue_table, srt_path)
+        report['cues'] = len(cues)
+        report['parse_errors'] = len(self.analyzer.parse_errors)
+        if not len(cues):
+            raise StageError("parse", "в файле нет реплик")
+
+        characters = self._timed(report, "analyze", self.analyzer.analyze_characters, cues)
+        report['characters'] = len(characters)
+        if self.profile is not None:
+            report['unconfigured'] = sorted(name for name in characters
+                                            if not (self.profile.get_character(name) or {}).get('tts_engine'))
+        else:
+            report['character_names'] = sorted(characters)
+        return cues
+
+    def synthesize(self, report, cues, output_dir, credit_scheduler=None):
+        """Синтез реплик в output_dir/clips"""
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        synthesis = self._timed(report, "synthesize", self._synthesize, report['episode'], cues,
+                                output_dir / "clips", credit_scheduler)
+        report['synthesis'] = {key: synthesis[key] for key in
+                               ('synthesized', 'failed', 'cancelled', 'already_done', 'skipped', 'chars')}
+        self._check_stopped("synthesize")
+        return synthesis
+
+    def render(self, report, cues, output_dir, video_path=None, output_video=None):
+        """Подгонка, сборка дорожки, приглушение оригинала и мультиплексирование"""
+        from .audio_mixer import clips_from_manifest
+
+        output_dir = Path(output_dir)
+        episode = report['episode']
+        clips = clips_from_manifest(output_dir / "clips")
+
+        if self.fit and clips:
+            clips, fit_report = self._timed(report, "fit", self._fit, episode, cues, clips, output_dir / "fitted")
+            report['fit'] = {'stretched': fit_report['stretched'], 'unfit': len(fit_report['unfit'])}
+
+        video = None
+        duration = None
+        if video_path:
+            from .video_processor import VideoProcessor
+            video = VideoProcessor.from_settings(self.settings)
+            duration = self._timed(report, "probe", video.probe, video_path)['duration'] or None
+
+        dub_path = output_dir / f"{episode}.dub.wav"
+        self._timed(report, "mix", self._mix, episode, cues, clips, dub_path, duration)
+        report['dub_track'] = str(dub_path)
+
+        if video:
+            track_path = output_dir / f"{episode}.mix.wav"
+            original_path = output_dir / f"{episode}.original.wav"
+            self._timed(report, "extract", self._run_ffmpeg, episode, "extract", video.extract_audio,
+                        video_path, original_path, self.settings.get("mixer.sample_rate", 44100),
+                        duration=duration)
+            self._timed(report, "duck", self._duck, episode, original_path, cues, track_path, dub_path)
+
+            video_path = Path(video_path)
+            output_video = Path(output_video) if output_video else \
+                output_dir / f"{video_path.stem}.dub{video_path.suffix}"
+            self._timed(report, "mux", self._run_ffmpeg, episode, "mux", video.mux, video_path, track_path,
+                        output_video, keep_original=self.keep_original, duration=duration)
+            report['video'] = str(output_video)
+
+    def finish(self, report):
+        """Итог эпизода по результатам синтеза"""
+        failed = report.get('synthesis', {}).get('failed', 0)
+        report['success'] = failed == 0
+        if failed:
+            report['error'] = f"не озвучено реплик: {failed}"
+
+    def _synthesize(self, episode, cues, clips_dir, credit_scheduler=None):
+        from tts_engines.elevenlabs.credit_scheduler import CreditScheduler
+        from .speech_synthesizer import SpeechSynthesizer
+
+        synthesizer = SpeechSynthesizer(self.tts_manager, self.profile, clips_dir,
+                                        credit_scheduler=credit_scheduler or
+                                        CreditScheduler.for_profile(self.tts_manager, self.profile))
+        return synthesizer.synthesize_all(
+            cues,
+            progress_callback=lambda done, total, result: self._progress(episode, "synthesize", done, total),
+            stop_event=self.stop_event
+        )
+
+    def _fit(self, episode, cues, clips, fitted_dir):
+        from .time_stretch import ClipFitter
+
+        fitter = ClipFitter.from_settings(self.settings, fitted_dir, **self.fit_options)
+        return fitter.fit(cues, clips, progress_callback=lambda done, total: self._progress(episode, "fit", done, total))
+
+    def _mix(self, episode, cues, clips, dub_path, duration):
+        from .audio_mixer import AudioMixer
+
+        mixer = AudioMixer.from_settings(self.settings)
+        return mixer.mix(cues, clips, dub_path, duration,
+                         progress_callback=lambda done, total: self._progress(episode, "mix", done, total))
+
+    def _duck(self, episode, original_path, cues, track_path, dub_path):
+        from .ducking import Ducker
+
+        ducker = Ducker.from_settings(self.settings)
+        return ducker.process(original_path, cues, track_path, dub_path=dub_path,
+                              progress_callback=lambda seconds: self._progress(episode, "duck", seconds, None))
+
+    def _run_ffmpeg(self, episode, stage, func, *args, duration=None, **kwargs):
+        """Вызов VideoProcessor с прогрессом; неудача ffmpeg - ошибка этапа"""
+        def on_progress(fraction, seconds, speed):
+            self._progress(episode, stage, seconds, duration)
+
+        result = func(*args, duration=duration, progress_callback=on_progress, **kwargs)
+        if not result['success']:
+            raise StageError(stage, result['error'])
+        return result
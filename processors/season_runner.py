@@ -0,0 +1,364 @@
+# processors/season_runner.py - дубляж сезона: эпизоды параллельно в пуле процессов, синтез через общую очередь с лимитами
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from pathlib import Path
+
+from tts_engines.elevenlabs.credit_scheduler import CreditScheduler
+from utils.instrumentation import get_instrumentation
+
+from .pipeline import DubbingPipeline, StageError
+
+
+def _worker_settings(config_file, config):
+    """Settings в процессе пула: тот же config.json и те же значения, что у родителя"""
+    from config.settings import Settings
+
+    settings = Settings()
+    settings.config_file = Path(config_file)
+    settings.config = config
+    return settings
+
+
+def parse_episode(job):
+    """Разбор .srt и анализ персонажей в процессе пула; возвращает (реплики или None, отчет)"""
+    # Процесс пула переиспользуется - замеры каждого задания отдельно
+    get_instrumentation().reset()
+    pipeline = DubbingPipeline(_worker_settings(job['config_file'], job['config']), None, None)
+    report = pipeline.new_report(job['srt'])
+    cues = None
+    try:
+        cues = pipeline.parse(report, job['srt'])
+    except StageError as e:
+        report['error'] = str(e)
+        report['stage'] = e.stage
+    report['instrumentation'] = get_instrumentation().snapshot()
+    return cues, report
+
+
+def render_episode(job):
+    """Подгонка, сборка дорожки и видео эпизода в процессе пула; возвращает часть отчета"""
+    get_instrumentation().reset()
+    pipeline = DubbingPipeline(_worker_settings(job['config_file'], job['config']), None, None,
+                               fit=job['fit'], keep_original=job['keep_original'])
+    # Эпизоды уже распределены по процессам - подгонка внутри эпизода без вложенного пула
+    pipeline.fit_options = {'workers': 1}
+    report = {'episode': job['episode'], 'timings': {}}
+    try:
+        pipeline.render(report, job['cues'], job['output_dir'], job['video_path'], job['output_video'])
+    except StageError as e:
+        report['error'] = str(e)
+        report['stage'] = e.stage
+    report['instrumentation'] = get_instrumentation().snapshot()
+    return report
+
+
+class RateLimiter:
+    """Не больше rate запросов в секунду, равномерно, общий для всех потоков"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        """Дождаться своей очереди; возвращает время ожидания, секунды"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+
+class SynthesisQueue:
+    """Общая очередь запросов синтеза для всех эпизодов сезона
+
+    Ставится в TTSManager.request_gate, поэтому действует только на
+    реальные обращения к движкам (попадания в кеш не ждут). Каждый
+    запрос занимает слот своего пула - движка или, для движков с API
+    ключами, пары движок+ключ: synthesis.concurrency - предел на весь
+    сезон, а не на эпизод. Если задан season.requests_per_second.<движок>,
+    запросы к движку дополнительно разносятся во времени.
+    """
+
+    def __init__(self, tts_manager, settings):
+        self.tts_manager = tts_manager
+        self.settings = settings
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._limiters = {}
+        self._stats = {}
+
+    def get_concurrency(self, engine):
+        """Предел одновременных запросов пула (как у SpeechSynthesizer)"""
+        configured = self.settings.get(f"synthesis.concurrency.{engine}")
+        if configured:
+            return configured
+        capabilities = self.tts_manager.get_capabilities(engine)
+        if capabilities:
+            return capabilities.max_concurrency
+        return self.settings.get("synthesis.default_concurrency", 2)
+
+    def pool_key(self, engine, character_data):
+        capabilities = self.tts_manager.get_capabilities(engine)
+        api_key = (character_data.get('api_key') or '').strip()
+        if capabilities and capabilities.requires_api_key and api_key:
+            return (engine, api_key)
+        return engine
+
+    def _get_pool(self, engine, character_data):
+        key = self.pool_key(engine, character_data)
+        with self._lock:
+            semaphore = self._semaphores.get(key)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.get_concurrency(engine))
+                self._semaphores[key] = semaphore
+            if engine not in self._limiters:
+                rate = self.settings.get(f"season.requests_per_second.{engine}", 0)
+                self._limiters[engine] = RateLimiter(rate) if rate else None
+                self._stats[engine] = {'requests': 0, 'waited': 0.0, 'peak': 0, 'active': 0}
+        return semaphore, self._limiters[engine], self._stats[engine]
+
+    @contextmanager
+    def __call__(self, engine, character_data):
+        semaphore, limiter, stats = self._get_pool(engine, character_data)
+        started = time.perf_counter()
+        with semaphore:
+            if limiter:
+                limiter.wait()
+            with self._lock:
+                stats['requests'] += 1
+                stats['waited'] += time.perf_counter() - started
+                stats['active'] += 1
+                stats['peak'] = max(stats['peak'], stats['active'])
+            try:
+                yield
+            finally:
+                with self._lock:
+                    stats['active'] -= 1
+
+    def install(self):
+        self.tts_manager.request_gate = self
+
+    def uninstall(self):
+        if self.tts_manager.request_gate is self:
+            self.tts_manager.request_gate = None
+
+    def get_stats(self):
+        """Запросы, суммарное ожидание очереди и пик одновременных запросов по движкам"""
+        with self._lock:
+            return {engine: {key: value for key, value in stats.items() if key != 'active'}
+                    for engine, stats in self._stats.items()}
+
+
+class SeasonCreditScheduler(CreditScheduler):
+    """Планировщик ключей ElevenLabs, общий для эпизодов сезона
+
+    Обычный CreditScheduler резервирует кредиты только в пределах одного
+    вызова assign: эпизоды, начавшие синтез одновременно, увидели бы один
+    и тот же остаток. Здесь остаток ключа запрашивается один раз за
+    сезон, а резервы всех эпизодов копятся и вычитаются из него.
+    Неиспользованные резервы (попадания в кеш, ошибки) не возвращаются -
+    оценка консервативная.
+    """
+
+    def __init__(self, engine, settings, credit_cache=None):
+        super().__init__(engine, settings, credit_cache)
+        self._assign_lock = threading.RLock()
+        self._budget = {}
+        self._reserved = {}
+
+    def get_available_credits(self, keys):
+        missing = [key for key in keys if key not in self._budget]
+        if missing:
+            self._budget.update(super().get_available_credits(missing))
+        return {key: self._budget[key] - self._reserved.get(key, 0) for key in keys if key in self._budget}
+
+    def assign(self, jobs):
+        # Эпизоды планируются по очереди, чтобы видеть резервы друг друга
+        with self._assign_lock:
+            plan = super().assign(jobs)
+            for key, info in plan['keys'].items():
+                self._reserved[key] = self._reserved.get(key, 0) + info['reserved']
+            return plan
+
+
+class SeasonRunner:
+    """Дубляж нескольких эпизодов параллельно
+
+    Процессорные этапы (разбор и статистика, подгонка, сборка, ffmpeg)
+    выполняются в пуле процессов по эпизоду на процесс. Синтез - сетевой,
+    он идет в родительском процессе, по потоку на эпизод, через один
+    TTSManager с общей SynthesisQueue и общим планировщиком ключей, так
+    что параллельные эпизоды вместе не превышают лимитов провайдеров.
+    Эпизод уходит на сборку, как только закончен его синтез. Итог -
+    сводный отчет сезона с отчетами эпизодов в порядке входа.
+    """
+
+    def __init__(self, settings, tts_manager, profile, workers=None, synthesis_episodes=None, fit=True, mix=True,
+                 keep_original=True, progress_callback=None, episode_callback=None, stop_event=None):
+        self.settings = settings
+        self.tts_manager = tts_manager
+        self.profile = profile
+        self.workers = workers or settings.get("season.workers", 0) or os.cpu_count() or 1
+        # Эпизодов в синтезе одновременно (0 - все): запросы все равно ограничены очередью
+        self.synthesis_episodes = synthesis_episodes or settings.get("season.synthesis_episodes", 0) or None
+        self.fit = fit
+        self.mix = mix
+        self.keep_original = keep_original
+        self.episode_callback = episode_callback  # episode_callback(отчет) - эпизод завершен
+        self.stop_event = stop_event or threading.Event()
+        self.pipeline = DubbingPipeline(settings, tts_manager, profile, fit=fit, mix=mix,
+                                        keep_original=keep_original, progress_callback=progress_callback,
+                                        stop_event=self.stop_event)
+        self.queue = SynthesisQueue(tts_manager, settings)
+
+    def run(self, episodes, output_root):
+        """Дубляж сезона
+
+        episodes - список (путь .srt, путь видео или None); результаты
+        эпизода пишутся в output_root/<имя .srt>. Возвращает сводный отчет.
+        """
+        output_root = Path(output_root)
+        started = time.perf_counter()
+        base_job = {'config_file': str(self.settings.config_file), 'config': self.settings.config}
+        credit_scheduler = SeasonCreditScheduler.for_profile(self.tts_manager, self.profile)
+
+        states = []
+        for srt_path, video_path in episodes:
+            srt_path = Path(srt_path)
+            states.append({'srt': srt_path, 'video': video_path, 'output_dir': output_root / srt_path.stem,
+                           'report': self.pipeline.new_report(srt_path), 'cues': None})
+
+        print(f"Сезон: {len(states)} эпизодов, процессов: {self.workers}")
+        self.queue.install()
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) as processes, \
+                    ThreadPoolExecutor(max_workers=self.synthesis_episodes or max(len(states), 1),
+                                       thread_name_prefix="season-synth") as threads:
+                pending = {}
+                for state in states:
+                    self.pipeline._progress(state['report']['episode'], "parse", 0, None)
+                    future = processes.submit(parse_episode, dict(base_job, srt=str(state['srt'])))
+                    pending[future] = ("parse", state)
+
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        stage, state = pending.pop(future)
+                        next_stage = self._complete(stage, state, future)
+                        if next_stage == "synthesize":
+                            future = threads.submit(self._synthesize, state, credit_scheduler)
+                        elif next_stage == "render":
+                            self.pipeline._progress(state['report']['episode'], "render", 0, None)
+                            future = processes.submit(render_episode, dict(
+                                base_job, episode=state['report']['episode'], cues=state['cues'],
+                                output_dir=str(state['output_dir']), video_path=state['video'],
+                                output_video=None, fit=self.fit, keep_original=self.keep_original))
+                        else:
+                            self._finish(state, started)
+                            continue
+                        pending[future] = (next_stage, state)
+
+                    if self.stop_event.is_set():
+                        # Начатые этапы доделываются, не начатые снимаются
+                        for future in pending:
+                            future.cancel()
+        finally:
+            self.queue.uninstall()
+
+        return self._make_report(states, time.perf_counter() - started)
+
+    def _complete(self, stage, state, future):
+        """Результат этапа эпизода; возвращает следующий этап или None"""
+        report = state['report']
+        if future.cancelled():
+            report['error'] = f"{stage}: прервано"
+            report['stage'] = stage
+            return None
+        try:
+            result = future.result()
+        except Exception as e:
+            # Процесс пула упал (например, нехватка памяти) - эпизод не удался, сезон продолжается
+            report['error'] = f"{stage}: {e}"
+            report['stage'] = stage
+            return None
+
+        if stage in ("parse", "render"):
+            # Замеры процесса пула - в замеры прогона родителя
+            snapshot = (result[1] if stage == "parse" else result).pop('instrumentation', None)
+            if snapshot:
+                get_instrumentation().merge(snapshot)
+
+        if stage == "parse":
+            state['cues'], parsed = result
+            names = parsed.pop('character_names', [])
+            report.update(parsed)
+            if report.get('stage'):
+                return None
+            report['unconfigured'] = [name for name in names
+                                      if not (self.profile.get_character(name) or {}).get('tts_engine')]
+            return None if self.stop_event.is_set() else "synthesize"
+
+        if stage == "synthesize":
+            if report.get('stage') or not self.mix or self.stop_event.is_set():
+                return None
+            return "render"
+
+        timings = result.pop('timings')
+        report['timings'].update(timings)
+        report.update(result)
+        return None
+
+    def _synthesize(self, state, credit_scheduler):
+        """Синтез эпизода в потоке родительского процесса"""
+        report = state['report']
+        try:
+            self.pipeline.synthesize(report, state['cues'], state['output_dir'], credit_scheduler)
+        except StageError as e:
+            report['error'] = str(e)
+            report['stage'] = e.stage
+
+    def _finish(self, state, started):
+        report = state['report']
+        state['cues'] = None  # Таблица реплик больше не нужна
+        if not report.get('stage'):
+            self.pipeline.finish(report)
+        report['elapsed'] = time.perf_counter() - started
+        if self.episode_callback:
+            self.episode_callback(report)
+
+    def _make_report(self, states, elapsed):
+        reports = [state['report'] for state in states]
+        stage_totals = {}
+        for report in reports:
+            for stage, seconds in report['timings'].items():
+                stage_totals[stage] = stage_totals.get(stage, 0.0) + seconds
+
+        busy = sum(stage_totals.values())
+        season = {
+            'success': all(report['success'] for report in reports),
+            'episodes': reports,
+            'failed': [report['episode'] for report in reports if not report['success']],
+            'cues': sum(report.get('cues', 0) for report in reports),
+            'synthesized': sum(report.get('synthesis', {}).get('synthesized', 0) for report in reports),
+            'timings': stage_totals,
+            'queue': self.queue.get_stats(),
+            'workers': self.workers,
+            'elapsed': elapsed,
+            # Сумма времени этапов к реальному времени: выигрыш от параллельности
+            'parallelism': busy / elapsed if elapsed > 0 else 0.0,
+            'interrupted': self.stop_event.is_set()
+        }
+
+        print(f"Сезон за {elapsed:.1f}с: {len(reports) - len(season['failed'])}/{len(reports)} эпизодов, "
+              f"параллельность x{season['parallelism']:.1f}")
+        for engine, stats in season['queue'].items():
+            print(f"  {engine}: {stats['requests']} запросов, пик {stats['peak']}, "
+                  f"ожидание очереди {stats['waited']:.1f}с")
+        return season
@@ -0,0 +1,315 @@
+# processors/speech_synthesizer.py - пакетный синтез речи для всех реплик эпизода
+import json
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+
+class SynthesisJob:
+    """Одна реплика для синтеза"""
+
+    __slots__ = ('index', 'cue_id', 'character', 'text', 'engine', 'character_data',
+                 'output_path', 'fingerprint', 'pool')
+
+    def __init__(self, index, cue_id, character, text, engine, character_data, output_path, fingerprint=None):
+        self.index = index
+        self.cue_id = cue_id
+        self.character = character
+        self.text = text
+        self.engine = engine
+        self.character_data = character_data
+        self.output_path = output_path
+        # Отпечаток результата (TTSManager.request_key): при смене текста или
+        # любого параметра голоса движка реплика синтезируется заново
+        self.fingerprint = fingerprint
+        self.pool = engine  # Пул потоков: движок или (движок, API ключ)
+
+
+class SpeechSynthesizer:
+    """Пакетный синтез всех реплик с ограниченным пулом потоков на каждый движок
+
+    Готовые файлы сразу пишутся в output_dir, а состояние каждой реплики
+    сохраняется в манифест, поэтому прерванный прогон можно продолжить:
+    уже синтезированные реплики пропускаются, упавшие повторяются.
+    """
+
+    MANIFEST_NAME = "synthesis_manifest.json"
+    MANIFEST_FLUSH_EVERY = 10  # Сохранять манифест каждые N завершенных реплик
+    RESULT_POLL_INTERVAL = 1.0  # Как часто проверять, живы ли потоки пулов, пока нет результатов
+
+    def __init__(self, tts_manager, profile, output_dir, concurrency=None, credit_scheduler=None):
+        self.tts_manager = tts_manager
+        self.profile = profile
+        self.output_dir = Path(output_dir)
+        self.concurrency = concurrency or {}
+        self.credit_scheduler = credit_scheduler  # CreditScheduler для нескольких ключей ElevenLabs
+        self.manifest_path = self.output_dir / self.MANIFEST_NAME
+        self.manifest = {"cues": {}}
+        self._lock = threading.Lock()
+
+    def get_concurrency(self, engine):
+        """Максимум одновременных запросов к движку"""
+        if engine in self.concurrency:
+            return self.concurrency[engine]
+        settings = self.tts_manager.settings
+        configured = settings.get(f"synthesis.concurrency.{engine}")
+        if configured:
+            return configured
+        # Не настроено - столько, сколько движок держит сам
+        capabilities = self.tts_manager.get_capabilities(engine)
+        if capabilities:
+            return capabilities.max_concurrency
+        return settings.get("synthesis.default_concurrency", 2)
+
+    def build_jobs(self, cues):
+        """Подготовить задания по репликам (CueTable или список словарей parse_srt)"""
+        jobs = []
+        skipped = []
+
+        for index, cue in enumerate(cues):
+            character = cue['character']
+            text = cue['text'].strip()
+            character_data = self.profile.get_character(character) if self.profile else None
+
+            if not text:
+                skipped.append((index, "пустой текст"))
+                continue
+            if not character_data or not character_data.get('tts_engine'):
+                skipped.append((index, f"персонаж '{character}' не настроен"))
+                continue
+
+            output_path = self.output_dir / f"{index:05d}_{cue['id']}.mp3"
+            engine = character_data['tts_engine']
+            jobs.append(SynthesisJob(index, cue['id'], character, text, engine, character_data, output_path,
+                                     self.tts_manager.request_key(engine, text, character_data)))
+
+        return jobs, skipped
+
+    def synthesize_all(self, cues, progress_callback=None, stop_event=None):
+        """Синтезировать все реплики эпизода
+
+        progress_callback(done, total, result) вызывается после каждой реплики.
+        stop_event (threading.Event) прерывает прогон; начатые реплики
+        дописываются, остальные остаются на следующий запуск.
+        Возвращает отчет с результатами и пропускной способностью.
+        """
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.load_manifest()
+
+        jobs, skipped = self.build_jobs(cues)
+        pending = [job for job in jobs if not self._is_done(job)]
+        already_done = len(jobs) - len(pending)
+
+        print(f"Синтез: {len(jobs)} реплик, готово ранее: {already_done}, "
+              f"к синтезу: {len(pending)}, пропущено: {len(skipped)}")
+
+        results = []
+
+        # Реплики без кредитов не запускаем: ключ не должен кончиться посреди эпизода
+        unassigned = self._schedule_keys(pending)
+        if unassigned:
+            unassigned_ids = {id(job) for job in unassigned}
+            pending = [job for job in pending if id(job) not in unassigned_ids]
+        for job in unassigned:
+            result = {'index': job.index, 'status': 'failed', 'error': 'не хватает кредитов ни на одном ключе',
+                      'chars': 0, 'time': 0.0}
+            results.append(result)
+            self._record(job, result)
+
+        pools = {}
+        for job in pending:
+            pools.setdefault(job.pool, []).append(job)
+
+        cache_snapshot = self.tts_manager.get_cache_report()
+        started = time.perf_counter()
+
+        # Каждый пул - своя пачка TTSManager.synthesize_batch в отдельном потоке,
+        # результаты всех пачек собираются в одну очередь
+        finished = queue.Queue()
+        cancel = threading.Event()
+        threads = [threading.Thread(target=self._run_pool, args=(pool_jobs, cancel, finished),
+                                    name=f"tts-{pool_jobs[0].engine}", daemon=True)
+                   for pool_jobs in pools.values()]
+        try:
+            for thread in threads:
+                thread.start()
+
+            reported = set()
+            done_count = 0
+            while done_count < len(pending):
+                try:
+                    job, result = finished.get(timeout=self.RESULT_POLL_INTERVAL)
+                except queue.Empty:
+                    if any(thread.is_alive() for thread in threads) or not finished.empty():
+                        continue
+                    # Все пулы завершились, не вернув часть реплик - не ждем их вечно
+                    for job in pending:
+                        if id(job) not in reported:
+                            finished.put((job, {'index': job.index, 'status': 'failed',
+                                                'error': 'пул синтеза завершился без результата',
+                                                'chars': 0, 'time': 0.0}))
+                    continue
+
+                reported.add(id(job))
+                done_count += 1
+                results.append(result)
+                self._record(job, result, flush=done_count % self.MANIFEST_FLUSH_EVERY == 0)
+
+                if progress_callback:
+                    progress_callback(done_count, len(pending), result)
+
+                if stop_event is not None and stop_event.is_set():
+                    cancel.set()
+        finally:
+            cancel.set()
+            for thread in threads:
+                thread.join()
+            self.save_manifest()
+            self._invalidate_credits(pools)
+
+        elapsed = time.perf_counter() - started
+        report = self._make_report(results, skipped, already_done, elapsed)
+        # Попадания и промахи кеша идут и в счетчики tts.cache.* сводки прогона
+        report['cache'] = self.tts_manager.get_cache_report(cache_snapshot)
+        return report
+
+    def _schedule_keys(self, jobs):
+        """Распределить реплики ElevenLabs по API ключам; вернуть нераспределенные
+
+        У каждого ключа свой пул потоков, поэтому пропускная способность
+        растет с числом ключей (лимит synthesis.concurrency - на ключ).
+        """
+        if not self.credit_scheduler:
+            return []
+
+        scheduled = [job for job in jobs if job.engine == self.credit_scheduler.ENGINE_NAME]
+        if not scheduled:
+            return []
+
+        plan = self.credit_scheduler.assign(scheduled)
+        for job in scheduled:
+            api_key = plan['assignments'].get(id(job))
+            if api_key:
+                job.character_data = dict(job.character_data, api_key=api_key)
+                job.pool = (job.engine, api_key)
+        return plan['unassigned']
+
+    def _invalidate_credits(self, pools):
+        """После синтеза локальные остатки ключей неточны - следующая проверка спросит API"""
+        if not self.credit_scheduler:
+            return
+        for pool in pools:
+            if isinstance(pool, tuple):
+                self.credit_scheduler.credit_cache.invalidate(pool[1])
+
+    def _run_pool(self, jobs, cancel, finished):
+        """Синтез реплик одного пула пачкой TTSManager; результаты - в очередь finished"""
+        by_index = {job.index: job for job in jobs}
+        requests = [{'index': job.index, 'text': job.text, 'character_data': job.character_data,
+                     'output_path': str(job.output_path)} for job in jobs]
+        try:
+            for result in self.tts_manager.synthesize_batch(jobs[0].engine, requests,
+                                                            max_workers=self.get_concurrency(jobs[0].engine),
+                                                            stop_event=cancel):
+                job = by_index.pop(result['index'])
+                finished.put((job, self._make_result(job, result)))
+            # Пачка закончилась раньше (например, при отмене) - недошедшие реплики не потеряны
+            for job in by_index.values():
+                if cancel.is_set():
+                    result = {'index': job.index, 'status': 'cancelled', 'chars': 0}
+                else:
+                    result = {'index': job.index, 'status': 'failed', 'error': 'нет результата от движка',
+                              'chars': 0, 'time': 0.0}
+                finished.put((job, result))
+        except Exception as e:
+            # Движок недоступен или пачка прервана - оставшиеся реплики неудачны
+            for job in by_index.values():
+                finished.put((job, {'index': job.index, 'status': 'failed', 'error': str(e),
+                                    'chars': 0, 'time': 0.0}))
+
+    def _make_result(self, job, result):
+        """Результат реплики для манифеста и отчета из результата пачки"""
+        if result['cancelled']:
+            return {'index': job.index, 'status': 'cancelled', 'chars': 0}
+        if not result['success']:
+            return {'index': job.index, 'status': 'failed', 'error': result['error'],
+                    'chars': 0, 'time': result['time']}
+        return {
+            'index': job.index,
+            'status': 'done',
+            'file': str(job.output_path),
+            'chars': len(job.text),
+            'cached': result['cached'],
+            'time': result['time']
+        }
+
+    def _is_done(self, job):
+        """Реплика уже синтезирована тем же голосом и файл на месте"""
+        entry = self.manifest["cues"].get(str(job.index))
+        return (entry is not None
+                and entry.get('status') == 'done'
+                and job.fingerprint is not None
+                and entry.get('fingerprint') == job.fingerprint
+                and job.output_path.exists())
+
+    def _record(self, job, result, flush=False):
+        """Записать результат реплики в манифест"""
+        if result['status'] == 'cancelled':
+            return
+
+        with self._lock:
+            self.manifest["cues"][str(job.index)] = {
+                'id': job.cue_id,
+                'character': job.character,
+                'status': result['status'],
+                'file': job.output_path.name,
+                'fingerprint': job.fingerprint,
+                'error': result.get('error', '')
+            }
+        if flush:
+            self.save_manifest()
+
+    def load_manifest(self):
+        """Загрузить манифест прошлого прогона"""
+        if self.manifest_path.exists():
+            try:
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    self.manifest = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Манифест синтеза поврежден, начинаем заново: {e}")
+                self.manifest = {"cues": {}}
+        return self.manifest
+
+    def save_manifest(self):
+        """Атомарно сохранить манифест"""
+        with self._lock:
+            temp_path = self.manifest_path.with_suffix('.tmp')
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.manifest, f, indent=2, ensure_ascii=False)
+            os.replace(temp_path, self.manifest_path)
+
+    def _make_report(self, results, skipped, already_done, elapsed):
+        """Итоговый отчет прогона"""
+        done = [r for r in results if r['status'] == 'done']
+        failed = [r for r in results if r['status'] == 'failed']
+        cancelled = [r for r in results if r['status'] == 'cancelled']
+        chars = sum(r['chars'] for r in done)
+
+        report = {
+            'synthesized': len(done),
+            'failed': len(failed),
+            'cancelled': len(cancelled),
+            'already_done': already_done,
+            'skipped': len(skipped),
+            'chars': chars,
+            'elapsed': elapsed,
+            'cues_per_second': len(done) / elapsed if elapsed > 0 else 0,
+            'chars_per_second': chars / elapsed if elapsed > 0 else 0,
+            'errors': {r['index']: r['error'] for r in failed}
+        }
+
+        print(f"Синтез завершен за {elapsed:.1f}с: {len(done)} готово, {len(failed)} ошибок, "
+              f"{report['cues_per_second']:.2f} реплик/с, {report['chars_per_second']:.0f} симв/с")
+        return report
@@ -1,80 +1,171 @@
 # processors/subtitle_analyzer.py - анализ субтитров, извлечение персонажей, статистика реплик
-import re
-from collections import defaultdict
+import io
+import os
+from collections import namedtuple
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 
+from utils.instrumentation import timed
+
+from .cue_table import CueTable, CueRows
+
+
+class SubtitleCue(namedtuple('SubtitleCue', 'id character start_time end_time text line_number')):
+    """Компактная запись реплики: кортеж вместо словаря на каждую строку"""
+    __slots__ = ()
+
+    @property
+    def duration(self):
+        return self.end_time - self.start_time
+
+    def to_dict(self):
+        """Словарь в прежнем формате parse_srt"""
+        return {
+            'id': self.id,
+            'character': self.character,
+            'start_time': self.start_time,
+            'end_time': self.end_time,
+            'text': self.text,
+            'duration': self.duration
+        }
+
+
+# Некорректный блок субтитров: номер первой строки блока и причина
+SrtParseError = namedtuple('SrtParseError', 'line_number message')
+
+
 class SubtitleAnalyzer:
     def __init__(self):
         self.polish_male_endings = ['ski', 'cki', 'dzki', 'owski', 'ewski', 'yk', 'ek', 'osz']
         self.polish_female_endings = ['ska', 'cka', 'dzka', 'owska', 'ewska', 'a']
+        self.parse_errors = []  # Ошибки последнего разбора
+        
+    def iter_srt(self, source, on_error=None):
+        """Потоковый разбор .srt: путь или файловый объект, по одной реплике за раз
         
+        Файл читается построчно, в памяти держится только текущий блок.
+        Некорректные блоки не пропускаются молча: они попадают в
+        self.parse_errors (и в on_error, если передан) с номером строки.
+        """
+        self.parse_errors = []
+        
+        with self._open_srt(source) as stream:
+            block = []
+            block_start = 0
+            
+            for line_number, raw_line in enumerate(stream, 1):
+                line = raw_line.strip()
+                if line_number == 1:
+                    line = line.lstrip('\ufeff')  # BOM в начале файла
+                
+                if line:
+                    if not block:
+                        block_start = line_number
+                    block.append(line)
+                elif block:
+                    cue = self._parse_block(block, block_start, on_error)
+                    if cue is not None:
+                        yield cue
+                    block = []
+            
+            if block:
+                cue = self._parse_block(block, block_start, on_error)
+                if cue is not None:
+                    yield cue
+    
+    @timed("srt.parse")
     def parse_srt(self, srt_content):
         """Парсинг .srt файла с правильным форматом"""
-        # Разбиваем на блоки по пустым строкам
-        blocks = re.split(r'\n\s*\n', srt_content.strip())
+        return [cue.to_dict() for cue in self.iter_srt(io.StringIO(srt_content))]
+    
+    @timed("srt.parse")
+    def parse_srt_file(self, file_path):
+        """Парсинг .srt файла с диска без чтения его целиком в память"""
+        return [cue.to_dict() for cue in self.iter_srt(file_path)]
+    
+    @timed("srt.parse")
+    def load_cue_table(self, source):
+        """Загрузить субтитры (путь или файловый объект) в компактную CueTable"""
+        return CueTable.from_cues(self.iter_srt(source))
+    
+    @contextmanager
+    def _open_srt(self, source):
+        """Открыть источник субтитров (путь или файловый объект)"""
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, 'r', encoding='utf-8-sig') as stream:
+                yield stream
+            return
         
-        subtitles = []
-        for block in blocks:
-            lines = [line.strip() for line in block.split('\n') if line.strip()]
-            
-            if len(lines) >= 4:  # Минимум 4 строки: номер, имя, время, текст
-                try:
-                    # Строка 1: номер
-                    subtitle_id = int(lines[0])
-                    
-                    # Строка 2: имя персонажа
-                    character = lines[1]
-                    
-                    # Строка 3: временной код
-                    time_line = lines[2]
-                    if '-->' in time_line:
-                        time_parts = time_line.split(' --> ')
-                        start_time = self._parse_time(time_parts[0])
-                        end_time = self._parse_time(time_parts[1])
-                    else:
-                        continue  # Пропускаем некорректные блоки
-                    
-                    # Строка 4+: текст реплики (может быть многострочной)
-                    text_lines = lines[3:]
-                    text = '\n'.join(text_lines)
-                    
-                    subtitles.append({
-                        'id': subtitle_id,
-                        'character': character,
-                        'start_time': start_time,
-                        'end_time': end_time,
-                        'text': text,  # Тут теперь хранится только текст реплики
-                        'duration': end_time - start_time
-                    })
-                    
-                except (ValueError, IndexError):
-                    continue  # Пропускаем некорректные блоки
+        # Чужой файловый объект не закрываем
+        if isinstance(source, io.TextIOBase):
+            yield source
+            return
         
-        return subtitles
+        # Двоичный поток читается через обертку; закрытие обертки (в том числе
+        # сборщиком мусора) закрыло бы и поток, поэтому она отсоединяется
+        wrapper = io.TextIOWrapper(source, encoding='utf-8-sig')
+        try:
+            yield wrapper
+        finally:
+            wrapper.detach()
     
+    def _parse_block(self, lines, line_number, on_error=None):
+        """Разбор одного блока: номер, имя, время, текст"""
+        # Минимум 4 строки: номер, имя, время, текст
+        if len(lines) < 4:
+            return self._report_error(line_number, f"неполный блок ({len(lines)} строк)", on_error)
+        
+        try:
+            subtitle_id = int(lines[0])
+        except ValueError:
+            return self._report_error(line_number, f"некорректный номер: {lines[0][:30]!r}", on_error)
+        
+        # Строка 3: временной код
+        time_line = lines[2]
+        if '-->' not in time_line:
+            return self._report_error(line_number + 2, f"нет временного кода: {time_line[:30]!r}", on_error)
+        
+        try:
+            time_parts = time_line.split(' --> ')
+            start_time = self._parse_time(time_parts[0])
+            end_time = self._parse_time(time_parts[1])
+        except (ValueError, IndexError):
+            return self._report_error(line_number + 2, f"некорректный временной код: {time_line[:30]!r}", on_error)
+        
+        # Строка 4+: текст реплики (может быть многострочной)
+        return SubtitleCue(subtitle_id, lines[1], start_time, end_time, '\n'.join(lines[3:]), line_number)
+    
+    def _report_error(self, line_number, message, on_error=None):
+        """Запомнить некорректный блок"""
+        error = SrtParseError(line_number, message)
+        self.parse_errors.append(error)
+        if on_error:
+            on_error(error)
+        return None
+    
+    @timed("characters.analyze")
     def analyze_characters(self, subtitles):
-        """Анализ персонажей из субтитров"""
-        characters = defaultdict(lambda: {
-            'name': '',
-            'total_lines': 0,
-            'total_duration': 0,
-            'gender': 'unknown',
-            'lines': []
-        })
+        """Анализ персонажей из субтитров
         
-        for sub in subtitles:
-            char_name = sub['character']
-            characters[char_name]['name'] = char_name
-            characters[char_name]['total_lines'] += 1
-            characters[char_name]['total_duration'] += sub['duration']
-            characters[char_name]['gender'] = self._detect_gender(char_name)
-            characters[char_name]['lines'].append({
-                'text': sub['text'],
-                'duration': sub['duration'],
-                'start_time': sub['start_time']
-            })
+        Реплики персонажа не копируются: 'lines' - представление CueRows
+        по индексам таблицы.
+        """
+        if not isinstance(subtitles, CueTable):
+            subtitles = CueTable.from_records(subtitles)
+        
+        characters = {}
+        for character_id, indices in subtitles.group_by_character().items():
+            char_name = subtitles.characters[character_id]
+            lines = CueRows(subtitles, indices)
+            characters[char_name] = {
+                'name': char_name,
+                'total_lines': len(lines),
+                'total_duration': lines.total_duration(),
+                'gender': self._detect_gender(char_name),
+                'lines': lines
+            }
         
-        return dict(characters)
+        return characters
     
     def _detect_gender(self, name):
         """Определение пола по польскому имени"""
@@ -0,0 +1,201 @@
+# processors/time_stretch.py - подгонка длины реплик под окно субтитра: WSOLA на NumPy в пуле процессов
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from .audio_io import DEFAULT_SAMPLE_RATE, create_wav_memmap, decode_audio
+
+
+def wsola(samples, ratio, frame_size=1024, tolerance=256):
+    """Изменение темпа без изменения высоты тона (WSOLA)
+
+    ratio > 1 ускоряет речь: длина результата = len(samples) / ratio.
+    Кадры окна Ханна с перекрытием 50% берутся из исходного сигнала с
+    шагом hop * ratio, а положение каждого кадра уточняется в пределах
+    tolerance отсчетов по максимуму корреляции с естественным продолжением
+    предыдущего кадра - так стыки кадров не дают фазовых искажений.
+    samples - [n] или [n, channels] float32.
+    """
+    samples = np.asarray(samples, dtype=np.float32)
+    mono_input = samples.ndim == 1
+    if mono_input:
+        samples = samples[:, None]
+
+    output_length = int(round(len(samples) / ratio))
+    if ratio == 1.0:
+        return samples[:, 0] if mono_input else samples
+    if len(samples) < frame_size * 2:
+        # Слишком короткий клип для кадров WSOLA: линейная интерполяция
+        positions = np.linspace(0, len(samples) - 1, output_length)
+        result = np.stack([np.interp(positions, np.arange(len(samples)), channel)
+                           for channel in samples.T], axis=1).astype(np.float32)
+        return result[:, 0] if mono_input else result
+
+    synthesis_hop = frame_size // 2
+    analysis_hop = synthesis_hop * ratio
+    window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(frame_size) / frame_size)).astype(np.float32)
+
+    # Запас по краям, чтобы поиск смещения не выходил за сигнал
+    padding = tolerance + frame_size
+    padded = np.pad(samples, ((padding, padding), (0, 0)))
+    search = padded.mean(axis=1)  # Корреляция считается по моно сумме каналов
+
+    frames = output_length // synthesis_hop + 1
+    output = np.zeros((frames * synthesis_hop + frame_size, samples.shape[1]), dtype=np.float32)
+
+    previous = padding
+    for k in range(frames):
+        nominal = padding + int(k * analysis_hop)
+        if k == 0:
+            position = nominal
+        else:
+            # Естественное продолжение предыдущего кадра и окно поиска вокруг номинальной позиции
+            template = search[previous + synthesis_hop:previous + synthesis_hop + frame_size]
+            low = nominal - tolerance
+            region = search[low:nominal + tolerance + frame_size]
+            position = low + int(np.argmax(np.correlate(region, template, mode='valid')))
+
+        start = k * synthesis_hop
+        output[start:start + frame_size] += padded[position:position + frame_size] * window[:, None]
+        previous = position
+
+    result = output[:output_length]
+    return result[:, 0] if mono_input else result
+
+
+def fit_clip(job):
+    """Подогнать одну реплику (выполняется в процессе пула)
+
+    job: {'index', 'path', 'slot', 'output_path', 'max_ratio', 'tolerance',
+    'sample_rate', 'channels', 'ffmpeg'}. Возвращает результат для отчета.
+    """
+    samples = decode_audio(job['path'], job['sample_rate'], job['channels'], job['ffmpeg'])
+    length = len(samples) / job['sample_rate']
+    result = {'index': job['index'], 'path': str(job['path']), 'length': length, 'slot': job['slot'],
+              'ratio': 1.0, 'status': 'unchanged'}
+
+    needed = length / job['slot'] if job['slot'] > 0 else float('inf')
+    if needed <= 1.0 + job['tolerance']:
+        return result
+
+    ratio = min(needed, job['max_ratio'])
+    stretched = wsola(samples, ratio)
+    if stretched.ndim == 1:
+        stretched = stretched[:, None]
+
+    track = create_wav_memmap(job['output_path'], len(stretched), stretched.shape[1], job['sample_rate'])
+    track[:] = stretched
+    if isinstance(track, np.memmap):
+        track.flush()
+    del track
+
+    fitted_length = len(stretched) / job['sample_rate']
+    result.update(path=str(job['output_path']), ratio=ratio, fitted_length=fitted_length,
+                  status='stretched' if needed <= job['max_ratio'] else 'unfit',
+                  overrun=max(fitted_length - job['slot'], 0.0))
+    return result
+
+
+class ClipFitter:
+    """Подгонка синтезированных реплик под длительность субтитров
+
+    Реплики, которые не длиннее окна субтитра (с допуском tolerance),
+    остаются как есть. Более длинные ускоряются WSOLA, но не сильнее
+    max_ratio; если и этого не хватает, реплика попадает в отчет как
+    не поместившаяся. Обработка идет в пуле процессов.
+    """
+
+    def __init__(self, output_dir, max_ratio=1.35, tolerance=0.05, use_gap=False, workers=None,
+                 sample_rate=DEFAULT_SAMPLE_RATE, channels=1, ffmpeg="ffmpeg"):
+        self.output_dir = Path(output_dir)
+        self.max_ratio = max_ratio
+        self.tolerance = tolerance
+        self.use_gap = use_gap  # Разрешить заходить в паузу до следующей реплики
+        self.workers = workers or os.cpu_count() or 1
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.ffmpeg = ffmpeg
+
+    @classmethod
+    def from_settings(cls, settings, output_dir, **kwargs):
+        """Подгонка с параметрами из настроек"""
+        options = {
+            'max_ratio': settings.get("time_stretch.max_ratio", 1.35),
+            'tolerance': settings.get("time_stretch.tolerance", 0.05),
+            'use_gap': settings.get("time_stretch.use_gap", False),
+            'workers': settings.get("time_stretch.workers", 0) or None,
+            'sample_rate': settings.get("mixer.sample_rate", DEFAULT_SAMPLE_RATE),
+            'ffmpeg': settings.get("ffmpeg.binary", "ffmpeg")
+        }
+        options.update(kwargs)
+        return cls(output_dir, **options)
+
+    def get_slots(self, cues):
+        """Длительность окна каждой реплики, секунды"""
+        starts = [cue['start_time'] for cue in cues]
+        slots = []
+        for index, cue in enumerate(cues):
+            slot = cue['end_time'] - cue['start_time']
+            if self.use_gap and index + 1 < len(starts) and starts[index + 1] > cue['end_time']:
+                slot = starts[index + 1] - cue['start_time']
+            slots.append(slot)
+        return slots
+
+    def fit(self, cues, clips, progress_callback=None):
+        """Подогнать реплики; clips - {индекс реплики: путь}
+
+        Возвращает (новые клипы {индекс: путь}, отчет). progress_callback(done, total).
+        """
+        started = time.perf_counter()
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        slots = self.get_slots(cues)
+
+        jobs = [{
+            'index': index,
+            'path': str(path),
+            'slot': slots[index],
+            'output_path': str(self.output_dir / f"{Path(path).stem}_fit.wav"),
+            'max_ratio': self.max_ratio,
+            'tolerance': self.tolerance,
+            'sample_rate': self.sample_rate,
+            'channels': self.channels,
+            'ffmpeg': self.ffmpeg
+        } for index, path in sorted(clips.items())]
+
+        results = []
+        # С одним процессом (или уже внутри процесса пула эпизодов) - без вложенного пула
+        if self.workers == 1:
+            mapped = map(fit_clip, jobs)
+            executor = None
+        else:
+            executor = ProcessPoolExecutor(max_workers=self.workers)
+            mapped = executor.map(fit_clip, jobs, chunksize=4)
+        try:
+            for done, result in enumerate(mapped, 1):
+                results.append(result)
+                if progress_callback:
+                    progress_callback(done, len(jobs))
+        finally:
+            if executor:
+                executor.shutdown()
+
+        fitted = {result['index']: result['path'] for result in results}
+        unfit = [{'index': r['index'], 'needed_ratio': r['length'] / r['slot'] if r['slot'] > 0 else None,
+                  'overrun': r['overrun']} for r in results if r['status'] == 'unfit']
+
+        report = {
+            'clips': len(results),
+            'stretched': sum(1 for r in results if r['status'] == 'stretched'),
+            'unchanged': sum(1 for r in results if r['status'] == 'unchanged'),
+            'unfit': unfit,
+            'elapsed': time.perf_counter() - started
+        }
+
+        print(f"Подгонка реплик за {report['elapsed']:.1f}с: ускорено {report['stretched']}, "
+              f"без изменений {report['unchanged']}, не помещаются {len(unfit)}")
+        for item in unfit:
+            print(f"  Реплика {item['index']}: не хватает {item['overrun']:.2f}с при ускорении x{self.max_ratio}")
+        return fitted, report
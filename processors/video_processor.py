@@ -0,0 +1,177 @@
+# processors/video_processor.py - работа с видео через ffmpeg: извлечение оригинального звука и мультиплексирование дубляжа без перекодирования видео
+import json
+import os
+import subprocess
+import time
+from pathlib import Path
+
+from .audio_io import DEFAULT_SAMPLE_RATE, read_wav_format
+
+
+class VideoProcessor:
+    """Обработка видео эпизода через ffmpeg
+
+    Видеопоток никогда не перекодируется (-c:v copy): дорожка дубляжа
+    добавляется как дополнительный аудиопоток, оригинал можно оставить.
+    Перекодирование видео (NVENC или x264, Settings["ffmpeg"]) включается
+    только если запрошены видеофильтры (например, вшитые субтитры).
+    """
+
+    def __init__(self, ffmpeg="ffmpeg", ffprobe=None, use_nvenc=True, fallback_x264=True,
+                 audio_codec="aac", audio_bitrate="192k"):
+        self.ffmpeg = ffmpeg
+        self.ffprobe = ffprobe or str(Path(ffmpeg).with_name(Path(ffmpeg).name.replace("ffmpeg", "ffprobe")))
+        self.use_nvenc = use_nvenc
+        self.fallback_x264 = fallback_x264
+        self.audio_codec = audio_codec
+        self.audio_bitrate = audio_bitrate
+
+    @classmethod
+    def from_settings(cls, settings, **kwargs):
+        """Процессор с параметрами из настроек"""
+        options = {
+            'ffmpeg': settings.get("ffmpeg.binary", "ffmpeg"),
+            'use_nvenc': settings.get("ffmpeg.use_nvenc", True),
+            'fallback_x264': settings.get("ffmpeg.fallback_x264", True),
+            'audio_codec': settings.get("ffmpeg.audio_codec", "aac"),
+            'audio_bitrate': settings.get("ffmpeg.audio_bitrate", "192k")
+        }
+        options.update(kwargs)
+        return cls(**options)
+
+    def probe(self, video_path):
+        """Длительность и потоки файла (ffprobe)"""
+        command = [self.ffprobe, "-v", "error", "-print_format", "json",
+                   "-show_format", "-show_streams", str(video_path)]
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+        if result.returncode != 0:
+            raise RuntimeError(f"ffprobe: {result.stderr.decode('utf-8', 'replace').strip()}")
+
+        data = json.loads(result.stdout)
+        streams = data.get('streams', [])
+        return {
+            'duration': float(data.get('format', {}).get('duration') or 0),
+            'video': [s for s in streams if s.get('codec_type') == 'video'],
+            'audio': [s for s in streams if s.get('codec_type') == 'audio'],
+            'subtitle': [s for s in streams if s.get('codec_type') == 'subtitle']
+        }
+
+    def extract_audio(self, video_path, output_path, sample_rate=DEFAULT_SAMPLE_RATE, channels=2,
+                      stream_index=0, duration=None, progress_callback=None):
+        """Извлечь оригинальный звук один раз в float32 WAV (вход для Ducker)
+
+        Если файл уже есть, новее видео и совпадает по частоте и каналам,
+        повторно не извлекается. ffmpeg пишет во временный .part файл,
+        который переименовывается только после успешного завершения:
+        прерванное извлечение не оставляет обрезанный "кеш".
+        """
+        output_path = Path(output_path)
+        if output_path.exists() and output_path.stat().st_mtime >= Path(video_path).stat().st_mtime \
+                and read_wav_format(output_path) == (sample_rate, channels):
+            print(f"Оригинальный звук уже извлечен: {output_path.name}")
+            return {'success': True, 'output': str(output_path), 'cached': True}
+
+        part_path = output_path.with_name(output_path.name + ".part")
+        command = [self.ffmpeg, "-y", "-i", str(video_path), "-map", f"0:a:{stream_index}", "-vn",
+                   "-acodec", "pcm_f32le", "-ar", str(sample_rate), "-ac", str(channels),
+                   "-f", "wav", str(part_path)]
+        try:
+            result = self._run(command, duration, progress_callback)
+            if result['success']:
+                os.replace(part_path, output_path)
+                result['output'] = str(output_path)
+        finally:
+            if part_path.exists():
+                part_path.unlink()
+        result['cached'] = False
+        return result
+
+    def mux(self, video_path, dub_audio_path, output_path, keep_original=True, language="pol",
+            title="Dubbing", video_filters=None, duration=None, progress_callback=None):
+        """Добавить дорожку дубляжа к видео
+
+        Без video_filters видео и исходные потоки копируются как есть
+        (-c copy), кодируется только дорожка дубляжа - секунды на эпизод.
+        Дубляж становится первой дорожкой по умолчанию; keep_original=False
+        убирает оригинальные дорожки.
+        """
+        command = [self.ffmpeg, "-y", "-i", str(video_path), "-i", str(dub_audio_path),
+                   "-map", "0:v", "-map", "1:a:0"]
+        if keep_original:
+            command += ["-map", "0:a?"]
+        command += ["-map", "0:s?", "-map", "0:t?"]
+
+        command += self._video_codec_args(video_filters)
+        command += ["-c:a", "copy", "-c:s", "copy",
+                    # Дорожка дубляжа (первая аудио) кодируется, остальные копируются
+                    "-c:a:0", self.audio_codec, "-b:a:0", self.audio_bitrate,
+                    "-metadata:s:a:0", f"language={language}", "-metadata:s:a:0", f"title={title}",
+                    "-disposition:a", "0", "-disposition:a:0", "default", str(output_path)]
+
+        return self._run(command, duration, progress_callback)
+
+    def _video_codec_args(self, video_filters):
+        """Копирование видео; кодек - только при фильтрах"""
+        if not video_filters:
+            return ["-c:v", "copy"]
+
+        args = ["-vf", video_filters]
+        if self.use_nvenc and self._has_encoder("h264_nvenc"):
+            return args + ["-c:v", "h264_nvenc", "-preset", "p5", "-cq", "21"]
+        if self.fallback_x264:
+            return args + ["-c:v", "libx264", "-preset", "medium", "-crf", "20"]
+        raise RuntimeError("Фильтры видео требуют перекодирования, но NVENC недоступен, а x264 отключен")
+
+    def _has_encoder(self, name):
+        """Есть ли кодировщик в сборке ffmpeg"""
+        result = subprocess.run([self.ffmpeg, "-hide_banner", "-encoders"],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+        return name in result.stdout.decode('utf-8', 'replace')
+
+    def _run(self, command, duration=None, progress_callback=None):
+        """Запустить ffmpeg с -progress и сообщать прогресс (0..1, скорость)"""
+        command = command[:1] + ["-hide_banner", "-v", "error", "-nostats", "-progress", "pipe:1"] + command[1:]
+        started = time.perf_counter()
+        try:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                       text=True, encoding='utf-8', errors='replace')
+        except OSError as e:
+            print(f"❌ Не удалось запустить ffmpeg: {e}")
+            return {'success': False, 'error': str(e), 'elapsed': 0.0}
+
+        # stderr читаем в конце; -v error оставляет там только ошибки
+        progress = {}
+        for line in process.stdout:
+            key, _, value = line.strip().partition('=')
+            progress[key] = value
+            if key != 'progress':
+                continue
+
+            seconds = self._progress_seconds(progress)
+            if progress_callback and seconds is not None:
+                fraction = min(seconds / duration, 1.0) if duration else None
+                progress_callback(fraction, seconds, progress.get('speed', '').strip())
+            if value == 'end':
+                break
+
+        stderr = process.stderr.read()
+        returncode = process.wait()
+        elapsed = time.perf_counter() - started
+
+        if returncode != 0:
+            error = stderr.strip().splitlines()[-1] if stderr.strip() else f"код {returncode}"
+            print(f"❌ ffmpeg: {error}")
+            return {'success': False, 'error': error, 'elapsed': elapsed}
+
+        output = command[-1]
+        print(f"✅ ffmpeg: {Path(output).name} за {elapsed:.1f}с")
+        return {'success': True, 'output': output, 'elapsed': elapsed}
+
+    @staticmethod
+    def _progress_seconds(progress):
+        """Текущая позиция из блока -progress (out_time_us, в старых сборках out_time_ms тоже в мкс)"""
+        for key in ('out_time_us', 'out_time_ms'):
+            value = progress.get(key, '')
+            if value.isdigit():
+                return int(value) / 1_000_000
+        return None
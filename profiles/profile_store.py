@@ -0,0 +1,190 @@
+# profiles/profile_store.py - хранилище профилей персонажей в SQLite: индекс по аниме и персонажам, транзакционные записи
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    id INTEGER PRIMARY KEY,
+    anime_name TEXT NOT NULL UNIQUE,
+    created_date TEXT,
+    last_modified TEXT,
+    version TEXT
+);
+CREATE TABLE IF NOT EXISTS characters (
+    profile_id INTEGER NOT NULL REFERENCES profiles(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    tts_engine TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (profile_id, name)
+);
+CREATE INDEX IF NOT EXISTS characters_engine ON characters(profile_id, tts_engine);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def default_data_dir():
+    """Папка данных приложения (src/data или data, если запуск из src)"""
+    current_dir = os.getcwd()
+    if current_dir.endswith('src'):
+        return Path(current_dir) / "data"
+    return Path(current_dir) / "src" / "data"
+
+
+class ProfileStore:
+    """Профили персонажей в одном файле SQLite
+
+    Профиль - строка в profiles, каждый персонаж - строка в characters с
+    настройками в JSON, поэтому список профилей и открытие профиля идут
+    по индексам, а сохранение пишет только измененных персонажей в одной
+    транзакции. Старые JSON профили из json_dir импортируются один раз
+    при первом открытии хранилища.
+    """
+
+    DB_NAME = "profiles.db"
+
+    def __init__(self, db_path, json_dir=None):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # Профили сохраняются и из фоновых задач GUI - одно соединение под блокировкой
+        self._connection = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA foreign_keys=ON")
+            self._connection.executescript(SCHEMA)
+
+        if json_dir is not None and not self._get_meta("json_imported"):
+            self.import_json_dir(json_dir)
+
+    def _get_meta(self, key):
+        with self._lock:
+            row = self._connection.execute("SELECT value FROM store_meta WHERE key = ?", (key,)).fetchone()
+        return row['value'] if row else None
+
+    def list_profiles(self):
+        """Названия всех профилей по алфавиту"""
+        with self._lock:
+            rows = self._connection.execute("SELECT anime_name FROM profiles ORDER BY anime_name").fetchall()
+        return [row['anime_name'] for row in rows]
+
+    def exists(self, anime_name):
+        with self._lock:
+            row = self._connection.execute("SELECT 1 FROM profiles WHERE anime_name = ?", (anime_name,)).fetchone()
+        return row is not None
+
+    def load(self, anime_name):
+        """Метаданные и персонажи профиля: (metadata, {имя: настройки}) или None"""
+        with self._lock:
+            profile = self._connection.execute(
+                "SELECT * FROM profiles WHERE anime_name = ?", (anime_name,)).fetchone()
+            if profile is None:
+                return None
+            rows = self._connection.execute(
+                "SELECT name, data FROM characters WHERE profile_id = ? ORDER BY rowid",
+                (profile['id'],)).fetchall()
+
+        metadata = {
+            "anime_name": profile['anime_name'],
+            "created_date": profile['created_date'],
+            "last_modified": profile['last_modified'],
+            "version": profile['version']
+        }
+        return metadata, {row['name']: json.loads(row['data']) for row in rows}
+
+    def get_character(self, anime_name, name):
+        """Настройки одного персонажа без загрузки профиля целиком"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT c.data FROM characters c JOIN profiles p ON p.id = c.profile_id "
+                "WHERE p.anime_name = ? AND c.name = ?", (anime_name, name)).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def save(self, metadata, characters, removed=(), replace=False):
+        """Записать метаданные и персонажей профиля одной транзакцией
+
+        characters - {имя: настройки} только измененных персонажей,
+        removed - имена удаленных. replace=True - полное сохранение:
+        characters содержит весь профиль, остальные персонажи в базе удаляются.
+        """
+        with self._lock, self._connection:
+            profile_id = self._upsert_profile(metadata)
+            if replace:
+                kept = set(characters)
+                rows = self._connection.execute(
+                    "SELECT name FROM characters WHERE profile_id = ?", (profile_id,)).fetchall()
+                removed = set(removed) | {row['name'] for row in rows if row['name'] not in kept}
+            self._connection.executemany(
+                "INSERT INTO characters (profile_id, name, tts_engine, data) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(profile_id, name) DO UPDATE SET tts_engine = excluded.tts_engine, data = excluded.data",
+                [(profile_id, name, data.get('tts_engine', ''), json.dumps(data, ensure_ascii=False))
+                 for name, data in characters.items()])
+            self._connection.executemany(
+                "DELETE FROM characters WHERE profile_id = ? AND name = ?",
+                [(profile_id, name) for name in removed])
+
+    def _upsert_profile(self, metadata):
+        self._connection.execute(
+            "INSERT INTO profiles (anime_name, created_date, last_modified, version) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(anime_name) DO UPDATE SET last_modified = excluded.last_modified, version = excluded.version",
+            (metadata['anime_name'], metadata.get('created_date'), metadata.get('last_modified'),
+             metadata.get('version', "1.0")))
+        return self._connection.execute(
+            "SELECT id FROM profiles WHERE anime_name = ?", (metadata['anime_name'],)).fetchone()['id']
+
+    def delete(self, anime_name):
+        """Удалить профиль вместе с персонажами"""
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM profiles WHERE anime_name = ?", (anime_name,))
+
+    def import_json_dir(self, json_dir):
+        """Однократный импорт старых JSON профилей (уже существующие в базе не трогаются)"""
+        json_dir = Path(json_dir)
+        imported = 0
+        for path in sorted(json_dir.glob("*.json")) if json_dir.exists() else []:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Профиль {path.name} не импортирован: {e}")
+                continue
+
+            metadata = dict(data.get("metadata") or {})
+            metadata.setdefault("anime_name", path.stem)
+            if self.exists(metadata["anime_name"]):
+                continue
+            self.save(metadata, data.get("characters", {}))
+            imported += 1
+
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO store_meta (key, value) VALUES ('json_imported', '1')")
+        if imported:
+            print(f"Импортировано JSON профилей в {self.db_path.name}: {imported}")
+        return imported
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+_default_stores = {}
+_default_lock = threading.Lock()
+
+
+def get_default_store(data_dir=None):
+    """Общее хранилище для папки данных (при первом открытии импортирует data/profiles/*.json)"""
+    data_dir = Path(data_dir) if data_dir else default_data_dir()
+    with _default_lock:
+        store = _default_stores.get(data_dir)
+        if store is None:
+            store = ProfileStore(data_dir / ProfileStore.DB_NAME, json_dir=data_dir / "profiles")
+            _default_stores[data_dir] = store
+        return store
@@ -0,0 +1,75 @@
+# test_audio_processing.py - тесты WSOLA и огибающей приглушения оригинала
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+from processors.ducking import Ducker, merge_intervals
+from processors.time_stretch import wsola
+
+RATE = 8000
+
+
+def sine(frequency, seconds, rate=RATE):
+    return np.sin(2 * np.pi * frequency * np.arange(int(seconds * rate)) / rate).astype(np.float32)
+
+
+def dominant_frequency(samples, rate=RATE):
+    spectrum = np.abs(np.fft.rfft(samples * np.hanning(len(samples))))
+    return np.argmax(spectrum) * rate / len(samples)
+
+
+def test_wsola_changes_length_but_keeps_pitch():
+    """Ускорение в 1.5 раза укорачивает клип, частота тона сохраняется"""
+    samples = sine(440, 1.0)
+    stretched = wsola(samples, 1.5, frame_size=256, tolerance=64)
+
+    assert stretched.dtype == np.float32
+    assert len(stretched) == round(len(samples) / 1.5)
+    assert abs(dominant_frequency(stretched) - 440) < 15
+    assert np.max(np.abs(stretched)) < 1.5
+
+
+def test_wsola_stereo_identity_and_short_clip():
+    """Стерео сохраняет каналы, ratio 1 не меняет сигнал, короткий клип интерполируется"""
+    stereo = np.stack([sine(300, 0.5), sine(500, 0.5)], axis=1)
+    slowed = wsola(stereo, 0.8, frame_size=256, tolerance=64)
+    assert slowed.shape == (round(len(stereo) / 0.8), 2)
+
+    assert np.array_equal(wsola(stereo, 1.0), stereo)
+
+    short = np.linspace(0, 1, 100, dtype=np.float32)
+    result = wsola(short, 2.0, frame_size=256)
+    assert len(result) == 50
+    assert result[0] == 0.0 and abs(result[-1] - 1.0) < 1e-6
+
+
+def test_merge_intervals_joins_short_pauses():
+    """Окна с паузой не длиннее merge_gap объединяются, порядок реплик не важен"""
+    cues = [{'start_time': 5.0, 'end_time': 6.0},
+            {'start_time': 1.0, 'end_time': 2.0},
+            {'start_time': 2.3, 'end_time': 3.0}]
+
+    assert merge_intervals(cues, merge_gap=0.5) == [(1.0, 3.0), (5.0, 6.0)]
+    assert merge_intervals(cues, merge_gap=0.1) == [(1.0, 2.0), (2.3, 3.0), (5.0, 6.0)]
+    assert merge_intervals([]) == []
+
+
+def test_ducker_envelope_ramps_around_cues():
+    """Полное приглушение внутри окна, линейные рампы attack/release, ноль вдали от реплик"""
+    ducker = Ducker(attack=0.5, release=1.0, sample_rate=100)
+    intervals = [(2.0, 3.0)]
+    ends = np.array([end for _, end in intervals])
+
+    duck = ducker.envelope(intervals, ends, 0, 600)
+
+    assert duck[:150].max() == 0.0          # до 1.5 с - без приглушения
+    assert abs(duck[175] - 0.5) < 1e-6      # середина attack
+    assert np.all(duck[200:301] == 1.0)     # внутри окна реплики
+    assert abs(duck[350] - 0.5) < 1e-6      # середина release
+    assert duck[400:].max() == 0.0
+
+    # Блок, начинающийся внутри рампы, считается так же, как часть целой огибающей
+    assert np.allclose(ducker.envelope(intervals, ends, 250, 200), duck[250:450])
+    assert not ducker.envelope([], np.array([]), 0, 10).any()
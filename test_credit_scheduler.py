@@ -0,0 +1,128 @@
+# test_credit_scheduler.py - тесты кеша кредитов и распределения реплик по ключам ElevenLabs
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+from config.settings import Settings
+from tts_engines.elevenlabs.credit_scheduler import CreditCache, CreditScheduler
+
+
+class CreditsSource:
+    """Ответы /user/subscription по ключам с подсчетом запросов"""
+
+    def __init__(self, credits):
+        self.credits = credits
+        self.calls = []
+
+    def get_credits_info(self, api_key):
+        self.calls.append(api_key)
+        if api_key not in self.credits:
+            return {'error': "401 Unauthorized"}
+        return {'credits_available': self.credits[api_key], 'credits_used': 0}
+
+
+class Job:
+    def __init__(self, text, character_data):
+        self.text = text
+        self.character_data = character_data
+
+
+@pytest.fixture
+def settings(tmp_path, monkeypatch):
+    """Настройки в отдельной папке: config.json пишется в tmp_path/src/data"""
+    monkeypatch.chdir(tmp_path)
+    return Settings()
+
+
+def test_credit_cache_ttl_errors_and_usage():
+    """Ответ кешируется на ttl, ошибки не кешируются, расход уменьшает остаток локально"""
+    source = CreditsSource({'sk-a': 1000})
+    cache = CreditCache(source.get_credits_info, ttl=60)
+
+    assert cache.get('sk-a')['credits_available'] == 1000
+    cache.get('sk-a')
+    assert source.calls == ['sk-a']
+
+    cache.record_usage('sk-a', 300)
+    assert cache.get('sk-a')['credits_available'] == 700
+    assert cache.get('sk-a', force=True)['credits_available'] == 1000
+
+    assert 'error' in cache.get('sk-bad')
+    cache.get('sk-bad')
+    assert source.calls.count('sk-bad') == 2
+
+    cache.invalidate('sk-a')
+    cache.get('sk-a')
+    assert source.calls.count('sk-a') == 3
+
+
+def test_credit_cache_get_many_requests_each_key_once():
+    """Повторяющиеся и пустые ключи не дают лишних запросов"""
+    source = CreditsSource({'sk-a': 10, 'sk-b': 20})
+    cache = CreditCache(source.get_credits_info)
+
+    result = cache.get_many(['sk-a', 'sk-b', 'sk-a', '', None])
+    assert {key: info['credits_available'] for key, info in result.items()} == {'sk-a': 10, 'sk-b': 20}
+    assert sorted(source.calls) == ['sk-a', 'sk-b']
+
+
+def test_assign_spreads_jobs_by_remaining_credits(settings):
+    """Реплики расходятся по общим ключам пропорционально остатку, бюджет не превышается"""
+    settings.set("api_keys.elevenlabs_keys", [{'key': 'sk-small'}, {'key': 'sk-large'}])
+    scheduler = CreditScheduler(CreditsSource({'sk-small': 1000, 'sk-large': 3000}), settings)
+    jobs = [Job("a" * 100, {'voice_id': "v"}) for _ in range(20)]
+
+    plan = scheduler.assign(jobs)
+
+    assert not plan['unassigned']
+    assert len(plan['assignments']) == 20
+    small, large = plan['keys']['sk-small'], plan['keys']['sk-large']
+    assert small['jobs'] + large['jobs'] == 20
+    assert large['jobs'] == 3 * small['jobs']
+    assert all(info['reserved'] <= info['available'] for info in plan['keys'].values())
+
+
+def test_assign_reports_jobs_without_credits(settings):
+    """Реплики сверх остатка за вычетом резерва не назначаются; ключ с ошибкой пропускается"""
+    settings.set("api_keys.elevenlabs_keys", ['sk-a', 'sk-broken'])
+    settings.set("elevenlabs.credit_reserve", 100)
+    scheduler = CreditScheduler(CreditsSource({'sk-a': 350}), settings)
+    tokens = scheduler.estimate_tokens("b" * 100)
+    jobs = [Job("b" * 100, {}) for _ in range(5)]
+
+    plan = scheduler.assign(jobs)
+
+    assigned = (350 - 100) // tokens
+    assert len(plan['assignments']) == assigned
+    assert plan['unassigned'] == jobs[assigned:]
+    assert 'sk-broken' not in plan['keys']
+
+
+def test_candidate_keys_spread_and_profile_opt_out(settings):
+    """Свой ключ первым; общие ключи по умолчанию добавляются, персонаж может отказаться"""
+    scheduler = CreditScheduler(CreditsSource({}), settings)
+    global_keys = ['sk-own', 'sk-shared']
+
+    assert scheduler.candidate_keys({'api_key': 'sk-own'}, global_keys) == ['sk-own', 'sk-shared']
+    assert scheduler.candidate_keys({'api_key': 'sk-own', 'spread_across_keys': False},
+                                    global_keys) == ['sk-own']
+    # Без своего ключа персонажу остаются только общие
+    assert scheduler.candidate_keys({'spread_across_keys': False}, global_keys) == global_keys
+
+    settings.set("elevenlabs.spread_across_keys", False)
+    assert scheduler.candidate_keys({'api_key': 'sk-own'}, global_keys) == ['sk-own']
+    assert scheduler.candidate_keys({'api_key': 'sk-own', 'spread_across_keys': True},
+                                    global_keys) == ['sk-own', 'sk-shared']
+
+
+def test_own_key_job_stays_on_its_account(settings):
+    """Персонаж с отказом от общих ключей не попадает на чужой аккаунт даже при его большем остатке"""
+    settings.set("api_keys.elevenlabs_keys", ['sk-shared'])
+    scheduler = CreditScheduler(CreditsSource({'sk-own': 500, 'sk-shared': 100000}), settings)
+    jobs = [Job("c" * 50, {'api_key': 'sk-own', 'spread_across_keys': False}) for _ in range(3)]
+
+    plan = scheduler.assign(jobs)
+
+    assert set(plan['assignments'].values()) == {'sk-own'}
@@ -0,0 +1,126 @@
+# test_parsers.py - тесты разбора субтитров, CueTable, поиска говорящего и разбиения текста
+import io
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from processors.cue_table import CueTable
+from processors.subtitle_analyzer import SubtitleAnalyzer
+from utils.text_chunker import split_text
+from utils.text_counter import SpeakerMatcher
+
+SRT = "\ufeff" + """1
+Agata
+00:00:01,000 --> 00:00:02,500
+Cześć!
+
+2
+Marek
+00:00:03,000 --> 00:00:05,000
+Pierwsza linia
+druga linia
+
+3
+Agata
+bez kodu czasu
+Tekst
+
+4
+Agata
+00:01:00,000 --> 00:01:01,250
+Ostatnia"""
+
+
+def test_iter_srt_parses_blocks_and_reports_errors():
+    """Корректные блоки разбираются, некорректный попадает в parse_errors с номером строки"""
+    analyzer = SubtitleAnalyzer()
+    errors = []
+    cues = list(analyzer.iter_srt(io.StringIO(SRT), on_error=errors.append))
+
+    assert [cue.id for cue in cues] == [1, 2, 4]
+    assert cues[0].character == "Agata"
+    assert cues[0].start_time == 1.0 and cues[0].end_time == 2.5
+    assert cues[1].text == "Pierwsza linia\ndruga linia"
+    assert cues[2].start_time == 60.0 and abs(cues[2].duration - 1.25) < 1e-9
+
+    assert len(analyzer.parse_errors) == 1
+    assert errors == analyzer.parse_errors
+    assert analyzer.parse_errors[0].line_number == 14
+
+
+def test_iter_srt_reads_binary_stream_and_file(tmp_path):
+    """Путь и двоичный поток дают одинаковый результат, чужой поток не закрывается"""
+    path = tmp_path / "episode.srt"
+    path.write_text(SRT, encoding='utf-8')
+    analyzer = SubtitleAnalyzer()
+
+    from_file = analyzer.parse_srt_file(path)
+    stream = io.BytesIO(SRT.encode('utf-8'))
+    from_stream = [cue.to_dict() for cue in analyzer.iter_srt(stream)]
+
+    assert from_file == from_stream
+    assert not stream.closed
+
+
+def test_cue_table_columns_and_groups():
+    """CueTable хранит колонки и группирует реплики по персонажам"""
+    table = SubtitleAnalyzer().load_cue_table(io.StringIO(SRT))
+
+    assert len(table) == 3
+    assert table.characters == ["Agata", "Marek"]
+    assert table[1].to_dict() == {'id': 2, 'character': "Marek", 'start_time': 3.0,
+                                  'end_time': 5.0, 'text': "Pierwsza linia\ndruga linia", 'duration': 2.0}
+    assert table[-1]['id'] == 4
+
+    agata = table.rows_for("Agata")
+    assert agata.texts() == ["Cześć!", "Ostatnia"]
+    assert abs(agata.total_duration() - 2.75) < 1e-9
+    assert len(table.rows_for("Nikt")) == 0
+
+
+def test_cue_table_from_records_matches_from_cues():
+    """Таблица из словарей parse_srt совпадает с таблицей из SubtitleCue"""
+    analyzer = SubtitleAnalyzer()
+    from_records = CueTable.from_records(analyzer.parse_srt(SRT))
+    from_cues = analyzer.load_cue_table(io.StringIO(SRT))
+
+    assert [row.to_dict() for row in from_records] == [row.to_dict() for row in from_cues]
+
+    from_records.append(5, "Zofia", 70.0, 71.0, "Nowa")
+    assert from_records.character_id("Zofia") == 2
+    assert from_records.rows_for("Zofia")[0]['text'] == "Nowa"
+
+
+def test_speaker_matcher_variants_and_order():
+    """Имя с двоеточием или тире в любом регистре; при нескольких совпадениях - первый персонаж"""
+    matcher = SpeakerMatcher(["Ann", "Anna", "Rudo"])
+
+    assert matcher.match("Rudo: hej") == "Rudo"
+    assert matcher.match("RUDO: hej") == "Rudo"
+    assert matcher.match("rudo - hej") == "Rudo"
+    assert matcher.match("Anna: hej") == "Anna"
+    assert matcher.match("Ann: hej") == "Ann"
+    assert matcher.match("Hej, Rudo:") is None
+    assert SpeakerMatcher([]).match("Rudo: hej") is None
+
+
+def test_split_text_respects_limit_and_sentences():
+    """Куски не длиннее лимита, режутся по предложениям, текст не теряется"""
+    text = "Pierwsze zdanie. Drugie zdanie jest trochę dłuższe! Trzecie? Czwarte."
+    chunks = split_text(text, 40)
+
+    assert all(len(chunk) <= 40 for chunk in chunks)
+    assert " ".join(chunks) == text
+    assert chunks[0] == "Pierwsze zdanie."
+
+
+def test_split_text_long_sentence_and_word():
+    """Длинное предложение режется по запятым, затем по словам; длинное слово - жестко"""
+    sentence = "raz, dwa, trzy, cztery, pięć, sześć, siedem, osiem"
+    chunks = split_text(sentence, 20)
+    assert all(len(chunk) <= 20 for chunk in chunks)
+    assert " ".join(chunks) == sentence
+
+    assert split_text("a" * 25, 10) == ["a" * 10, "a" * 10, "a" * 5]
+    assert split_text("  krótko  ", 100) == ["krótko"]
+    assert split_text("   ", 10) == []
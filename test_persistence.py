@@ -0,0 +1,128 @@
+# test_persistence.py - тесты дискового кеша синтеза и журнала использования TTS
+import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config.usage_ledger import UsageLedger, key_fingerprint
+from tts_engines.synthesis_cache import SynthesisCache
+
+
+def make_audio(tmp_path, name, size):
+    path = tmp_path / name
+    path.write_bytes(os.urandom(size))
+    return path
+
+
+def test_cache_key_depends_on_engine_params_and_text():
+    """Ключ не зависит от порядка параметров, но меняется от движка, голоса и текста"""
+    key = SynthesisCache.make_key("edge_tts", {'voice': "pl-PL-ZofiaNeural", 'rate': "+0%"}, "Cześć")
+
+    assert key == SynthesisCache.make_key("edge_tts", {'rate': "+0%", 'voice': "pl-PL-ZofiaNeural"}, "Cześć")
+    assert key != SynthesisCache.make_key("elevenlabs", {'voice': "pl-PL-ZofiaNeural", 'rate': "+0%"}, "Cześć")
+    assert key != SynthesisCache.make_key("edge_tts", {'voice': "pl-PL-MarekNeural", 'rate': "+0%"}, "Cześć")
+    assert key != SynthesisCache.make_key("edge_tts", {'voice': "pl-PL-ZofiaNeural", 'rate': "+0%"}, "Hej")
+
+
+def test_cache_put_fetch_and_reload(tmp_path):
+    """Файл из кеша совпадает с исходным и переживает новый экземпляр кеша"""
+    cache_dir = tmp_path / "cache"
+    source = make_audio(tmp_path, "clip.mp3", 100)
+    cache = SynthesisCache(cache_dir, 10_000)
+    key = SynthesisCache.make_key("edge_tts", {'voice': "v"}, "tekst")
+
+    assert cache.get(key) is None
+    cache.put(key, source)
+    output = tmp_path / "out" / "clip.mp3"
+    assert cache.fetch(key, output)
+    assert output.read_bytes() == source.read_bytes()
+    assert cache.get_stats()['hits'] == 1 and cache.get_stats()['misses'] == 1
+
+    reloaded = SynthesisCache(cache_dir, 10_000)
+    assert reloaded.get_stats()['entries'] == 1
+    assert reloaded.get_stats()['size_bytes'] == 100
+    assert reloaded.get(key) is not None
+    assert not list(cache_dir.glob("*/*.tmp"))
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    """При переполнении удаляется давно не использованная запись"""
+    cache = SynthesisCache(tmp_path / "cache", 250)
+    keys = [SynthesisCache.make_key("edge_tts", {}, str(i)) for i in range(3)]
+
+    cache.put(keys[0], make_audio(tmp_path, "a", 100))
+    cache.put(keys[1], make_audio(tmp_path, "b", 100))
+    assert cache.get(keys[0]) is not None  # keys[1] становится самым старым
+    cache.put(keys[2], make_audio(tmp_path, "c", 100))
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None and cache.get(keys[2]) is not None
+    stats = cache.get_stats()
+    assert stats['evicted'] == 1 and stats['size_bytes'] == 200
+
+
+def test_cache_report_since_snapshot(tmp_path):
+    """get_report считает попадания только после снимка"""
+    cache = SynthesisCache(tmp_path / "cache", 10_000)
+    key = SynthesisCache.make_key("edge_tts", {}, "x")
+    cache.put(key, make_audio(tmp_path, "x", 10))
+    cache.get(key)
+
+    snapshot = cache.get_stats()
+    cache.get(key)
+    cache.get("missing")
+    report = cache.get_report(snapshot)
+    assert report['hits'] == 1 and report['misses'] == 1 and report['hit_rate'] == 0.5
+
+
+def test_ledger_totals_survive_restart(tmp_path):
+    """Итоги дня восстанавливаются из файла новым экземпляром журнала"""
+    ledger = UsageLedger(tmp_path, flush_records=100, flush_interval=3600)
+    ledger.record("elevenlabs", 120, api_key="sk-one")
+    ledger.record("elevenlabs", 30, api_key="sk-two")
+    ledger.record("edge_tts", 50)
+
+    # До записи пачки итоги уже видны, но файла еще нет
+    assert ledger.get_usage("elevenlabs") == 150
+    assert ledger.get_usage("elevenlabs", api_key="sk-one") == 120
+    assert not ledger._file_path.exists()
+
+    ledger.flush()
+    records = [json.loads(line) for line in ledger._file_path.read_text(encoding='utf-8').splitlines()]
+    assert len(records) == 3
+    assert "sk-one" not in ledger._file_path.read_text(encoding='utf-8')
+    assert records[0]['key'] == key_fingerprint("sk-one")
+
+    reopened = UsageLedger(tmp_path, flush_records=100, flush_interval=3600)
+    assert reopened.summary() == {'edge_tts': 50, 'elevenlabs': 150}
+    assert reopened.get_usage("elevenlabs", api_key="sk-two") == 30
+
+
+def test_ledger_flushes_in_batches_and_compacts(tmp_path):
+    """Пачка пишется по flush_records, сжатие сохраняет итоги по ключам"""
+    ledger = UsageLedger(tmp_path, flush_records=5, flush_interval=3600, compact_after=8)
+    for _ in range(4):
+        ledger.record("elevenlabs", 10, api_key="sk-one")
+    assert not ledger._file_path.exists()
+    ledger.record("elevenlabs", 10, api_key="sk-two")
+    assert len(ledger._file_path.read_text(encoding='utf-8').splitlines()) == 5
+
+    for _ in range(5):
+        ledger.record("elevenlabs", 10, api_key="sk-one")
+
+    # 10 строк > compact_after: файл сжат до строки на (движок, ключ)
+    lines = ledger._file_path.read_text(encoding='utf-8').splitlines()
+    assert len(lines) == 2
+    assert all(json.loads(line)['compacted'] for line in lines)
+    assert ledger.get_usage("elevenlabs", api_key="sk-one") == 90
+    assert UsageLedger(tmp_path).get_usage("elevenlabs") == 100
+
+
+def test_ledger_sees_records_of_another_instance(tmp_path):
+    """Записи другого процесса подхватываются при записи своей пачки"""
+    first = UsageLedger(tmp_path, flush_records=1)
+    second = UsageLedger(tmp_path, flush_records=1)
+
+    first.record("edge_tts", 40)
+    second.record("edge_tts", 2)
+    assert second.get_usage("edge_tts") == 42
@@ -1,8 +1,146 @@
 # tts_engines/base_tts.py - базовый класс для всех TTS движков, общий интерфейс
+import subprocess
+import threading
+import time
 from abc import ABC, abstractmethod
-from pathlib import Path
+from contextlib import nullcontext
+
+
+class EngineCapabilities:
+    """Что умеет движок: по этим данным TTSManager и синтез планируют работу"""
+
+    __slots__ = ('max_concurrency', 'max_text_length', 'streaming', 'output_formats', 'requires_api_key',
+                 'native_batch')
+
+    def __init__(self, max_concurrency=2, max_text_length=None, streaming=False, output_formats=('mp3',),
+                 requires_api_key=False, native_batch=False):
+        self.max_concurrency = max_concurrency      # Одновременных запросов (на ключ, если он нужен)
+        self.max_text_length = max_text_length      # Символов на запрос; длиннее - TTSManager режет на куски
+        self.streaming = streaming                  # Пишет ответ в файл по мере получения
+        self.output_formats = tuple(output_formats)
+        self.requires_api_key = requires_api_key    # Голоса и синтез зависят от API ключа персонажа
+        self.native_batch = native_batch            # Своя synthesize_batch вместо пула потоков TTSManager
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+# Воспроизведение общее для всех движков: pygame импортируется и микшер
+# инициализируется при первом воспроизведении, а не при запуске приложения
+_audio_lock = threading.Lock()
+_pygame = None
+_pygame_available = None
+
+
+def _init_audio():
+    global _pygame, _pygame_available
+    if _pygame_available is None:
+        with _audio_lock:
+            if _pygame_available is None:
+                try:
+                    import pygame
+                    pygame.mixer.init()
+                    _pygame = pygame
+                    _pygame_available = True
+                except Exception as e:
+                    print(f"pygame недоступен: {e}")
+                    _pygame_available = False
+    return _pygame_available
+
+
+class AudioStreamPlayer:
+    """Воспроизведение mp3 по мере загрузки
+    
+    Куски ответа (feed) идут в ffmpeg, декодированный PCM блоками по
+    BLOCK_SECONDS ставится в очередь канала pygame - звук начинается с
+    первых кусков, а не после загрузки всего файла.
+    """
+    
+    BLOCK_SECONDS = 0.5
+    
+    def __init__(self, pygame, ffmpeg="ffmpeg"):
+        frequency, size, channels = pygame.mixer.get_init()
+        if size != -16:
+            raise ValueError(f"микшер pygame в формате {size}, нужен 16 бит")
+        self._pygame = pygame
+        self._frame_bytes = channels * 2
+        self._block_bytes = int(frequency * self.BLOCK_SECONDS) * self._frame_bytes
+        self._process = subprocess.Popen(
+            [ffmpeg, "-v", "error", "-i", "pipe:0", "-f", "s16le", "-acodec", "pcm_s16le",
+             "-ar", str(frequency), "-ac", str(channels), "pipe:1"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        self._channel = None
+        self._stopped = False
+        self._reader = threading.Thread(target=self._play_blocks, name="audio-stream", daemon=True)
+        self._reader.start()
+    
+    def feed(self, data):
+        """Очередной кусок mp3 (ffmpeg упал - кусок пропускается)"""
+        try:
+            self._process.stdin.write(data)
+        except (BrokenPipeError, OSError, ValueError):
+            pass
+    
+    def _play_blocks(self):
+        while not self._stopped:
+            data = self._process.stdout.read(self._block_bytes)
+            data = data[:len(data) - len(data) % self._frame_bytes]
+            if not data:
+                break
+            sound = self._pygame.mixer.Sound(buffer=data)
+            if self._channel is None:
+                self._channel = self._pygame.mixer.find_channel(True)
+                self._channel.play(sound)
+                continue
+            # В очереди канала помещается один звук - ждем, пока предыдущий начнет играть
+            while self._channel.get_queue() is not None and not self._stopped:
+                self._pygame.time.wait(10)
+            self._channel.queue(sound)
+    
+    def _close_input(self):
+        try:
+            self._process.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+    
+    def finish(self):
+        """Загрузка закончена: доиграть до конца; True, если что-то прозвучало"""
+        self._close_input()
+        self._reader.join()
+        self._process.wait()
+        if self._channel is None:
+            return False
+        while self._channel.get_busy():
+            self._pygame.time.wait(100)
+        return True
+    
+    def abort(self):
+        """Загрузка оборвалась: остановить ffmpeg и звук"""
+        self._stopped = True
+        self._process.kill()
+        self._close_input()
+        self._reader.join()
+        self._process.wait()
+        if self._channel is not None:
+            self._channel.stop()
+
 
 class BaseTTS(ABC):
+    """Общий контракт движков
+    
+    synthesize(text, character_data, output_path) пишет файл и возвращает
+    путь, при ошибке - исключение; вызывается из многих потоков сразу.
+    Пачки запросов планирует TTSManager.synthesize_batch - пулом на
+    capabilities.max_concurrency, каждый запрос через кеш и request_gate;
+    движок с capabilities.native_batch получает промахи кеша одной пачкой
+    в свою synthesize_batch.
+    Текст длиннее capabilities.max_text_length TTSManager режет на куски,
+    синтезирует их отдельными запросами параллельно и склеивает join_chunks.
+    """
+    
+    capabilities = EngineCapabilities()
+    SAMPLE_RATE = 44100  # Частота, в которой склеиваются куски длинной реплики
+    
     def __init__(self, name, settings):
         self.name = name
         self.settings = settings
@@ -10,18 +148,18 @@ class BaseTTS(ABC):
         self.is_available = False
         
     @abstractmethod
-    def get_voices(self):
+    def get_voices(self, api_key=None):
         """Получить список доступных голосов"""
         pass
     
     @abstractmethod
-    def synthesize(self, text, voice, output_path):
+    def synthesize(self, text, character_data, output_path):
         """Синтез речи"""
         pass
     
     @abstractmethod
-    def test_voice(self, voice, test_text="Test voice"):
-        """Тест голоса"""
+    def test_voice(self, character_data, test_text="Test voice", output_path=None):
+        """Тест голоса: синтез и воспроизведение; с output_path файл остается там (для кеша)"""
         pass
     
     def check_availability(self):
@@ -36,7 +174,7 @@ class BaseTTS(ABC):
     
     def get_daily_usage(self):
         """Получить использование за день"""
-        return self.settings.get(f"tts_limits.{self.name}.used_today", 0)
+        return self.settings.get_tts_usage(self.name)
     
     def get_daily_limit(self):
         """Получить дневной лимит"""
@@ -54,13 +192,102 @@ class BaseTTS(ABC):
         daily_usage = self.get_daily_usage()
         return (daily_usage + text_length) <= daily_limit
     
-    def update_usage(self, text_length):
+    def update_usage(self, text_length, api_key=None):
         """Обновление статистики использования"""
-        self.settings.update_tts_usage(self.name, text_length)
+        self.settings.update_tts_usage(self.name, text_length, api_key)
+    
+    def get_cache_params(self, character_data):
+        """Параметры голоса, от которых зависит результат синтеза (для ключа кеша)"""
+        return {
+            'voice': character_data.get('voice', ''),
+            'voice_id': character_data.get('voice_id', '')
+        }
+    
+    def open_audio_stream(self):
+        """Плеер для воспроизведения по мере загрузки или None (нет pygame или ffmpeg)"""
+        if not _init_audio():
+            return None
+        try:
+            return AudioStreamPlayer(_pygame, self.settings.get("ffmpeg.binary", "ffmpeg"))
+        except (OSError, ValueError) as e:
+            print(f"Потоковое воспроизведение недоступно: {e}")
+            return None
+    
+    def play_audio_file(self, path):
+        """Воспроизведение готового аудио файла (например, из кеша синтеза)"""
+        if not _init_audio():
+            return {
+                'success': False,
+                'error': 'pygame недоступен для воспроизведения'
+            }
+            
+        try:
+            _pygame.mixer.music.load(str(path))
+            _pygame.mixer.music.play()
+            
+            # Ждем завершения воспроизведения
+            while _pygame.mixer.music.get_busy():
+                _pygame.time.wait(100)
+                
+            _pygame.mixer.music.unload()
+            success = True
+        except Exception as e:
+            print(f"Ошибка воспроизведения: {e}")
+            success = False
+            
+        return {
+            'success': success,
+            'message': 'Голос воспроизведен' if success else 'Ошибка воспроизведения'
+        }
     
     def clean_text(self, text):
         """Очистка текста от проблемных символов"""
         # Удаляем инструкции, коды, паузы для Edge-TTS
         cleaned = text.replace('<break', '').replace('SSML', '')
         cleaned = cleaned.replace('time=', '').replace('strength=', '')
-        return cleaned.strip()
\ No newline at end of file
+        return cleaned.strip()
+    
+    def synthesize_batch(self, requests, request_context=None, stop_event=None):
+        """Синтез пачки запросов; итератор результатов по мере готовности
+        
+        requests - словари {'text', 'character_data', 'output_path'[, 'index']},
+        уже без попаданий в кеш и не длиннее max_text_length (это разбирает
+        TTSManager). request_context(character_data) - контекстный менеджер
+        вокруг каждого обращения к сервису (request_gate). Результаты:
+        {'index', 'output_path', 'success', 'error', 'cancelled', 'time'}.
+        По умолчанию запросы идут по очереди через synthesize.
+        """
+        for request in requests:
+            result = self._batch_result(request)
+            if stop_event is not None and stop_event.is_set():
+                result['cancelled'] = True
+                yield result
+                continue
+            
+            started = time.perf_counter()
+            try:
+                with request_context(request['character_data']) if request_context else nullcontext():
+                    self.synthesize(request['text'], request['character_data'], result['output_path'])
+                result['success'] = True
+            except Exception as e:
+                result['error'] = str(e)
+            result['time'] = time.perf_counter() - started
+            yield result
+    
+    @staticmethod
+    def _batch_result(request):
+        """Незаполненный результат запроса пачки"""
+        return {'index': request.get('index'), 'output_path': str(request['output_path']),
+                'success': False, 'error': '', 'cancelled': False, 'time': 0.0}
+    
+    def join_chunks(self, paths, output_path):
+        """Склеить синтезированные куски длинной реплики в один файл без щелчков"""
+        from processors.audio_io import join_audio_files
+        
+        join_audio_files(paths, output_path, self.SAMPLE_RATE,
+                         crossfade_ms=self.settings.get("synthesis.crossfade_ms", 10),
+                         ffmpeg=self.settings.get("ffmpeg.binary", "ffmpeg"))
+    
+    def close(self):
+        """Освободить ресурсы движка (соединения, фоновые потоки) при выходе"""
+        pass
@@ -3,83 +3,272 @@ import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent.parent))
 
-from tts_engines.base.base_tts import BaseTTS
+from tts_engines.base_tts import BaseTTS, EngineCapabilities
+from utils.instrumentation import observe
 import asyncio
 import os
+import queue
+import re
+import tempfile
+import threading
+import time
+from contextlib import asynccontextmanager
+
+
+class AsyncLoopThread:
+    """Один долгоживущий цикл asyncio в отдельном потоке
+    
+    Синхронный код из любых потоков отправляет в него корутины через
+    run_coroutine_threadsafe; глобальный цикл вызывающего потока не трогается.
+    """
+    
+    def __init__(self, name="edge-tts-loop"):
+        self.name = name
+        self.loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+    
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self.loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self.loop.run_forever, name=self.name, daemon=True)
+                self._thread.start()
+        return self.loop
+    
+    def submit(self, coro):
+        """Запустить корутину в цикле; возвращает concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_started())
+    
+    def run(self, coro, timeout=None):
+        """Выполнить корутину и дождаться результата (нельзя вызывать из самого цикла)"""
+        return self.submit(coro).result(timeout)
+    
+    def stop(self, timeout=5):
+        """Остановить цикл и дождаться потока (нельзя вызывать из самого цикла)
+        
+        Следующий submit запустит новый цикл.
+        """
+        with self._lock:
+            loop, thread = self.loop, self._thread
+            self.loop = None
+            self._thread = None
+        if loop is None:
+            return
+        loop.call_soon_threadsafe(loop.stop)
+        if thread is not None:
+            thread.join(timeout)
+        if not loop.is_running():
+            loop.close()
+
+
+# Общий цикл для всех экземпляров движка: соединения и задачи живут в одном потоке
+_loop_thread = AsyncLoopThread()
+
 
 class EdgeTTSEngine(BaseTTS):
-    """TTS движок для Microsoft Edge-TTS"""
+    """TTS движок для Microsoft Edge-TTS
+    
+    Вся работа с edge_tts идет в одном долгоживущем цикле asyncio
+    (_loop_thread), не больше max_concurrency сессий Communicate
+    одновременно. Пачки TTSManager (capabilities.native_batch) целиком
+    уходят в synthesize_many - одна задача цикла на всю пачку;
+    synthesize - потокобезопасная синхронная обертка для одиночных
+    запросов из любых потоков.
+    Реплики длиннее max_chunk_chars TTSManager режет по предложениям и
+    синтезирует кусками параллельно, каждый кусок - отдельным запросом.
+    """
     
-    def __init__(self):
-        super().__init__("edge_tts")
+    SAMPLE_RATE = 24000  # Частота mp3, которые отдает Edge-TTS
+    DEFAULT_VOICE = "pl-PL-MarekNeural"
+    
+    def __init__(self, settings, max_concurrency=None, max_chunk_chars=1000, crossfade_ms=None, ffmpeg=None):
+        super().__init__("edge_tts", settings)
         self.available_voices = [
             "pl-PL-MarekNeural",    # Мужской польский
             "pl-PL-ZofiaNeural",   # Женский польский
             "en-US-AriaNeural",    # Женский английский
             "en-US-GuyNeural",     # Мужской английский
         ]
+        self.max_concurrency = max_concurrency or settings.get("synthesis.concurrency.edge_tts", 8)
+        self.max_chunk_chars = max_chunk_chars
+        self.crossfade_ms = crossfade_ms if crossfade_ms is not None else settings.get("synthesis.crossfade_ms", 10)
+        self.ffmpeg = ffmpeg or settings.get("ffmpeg.binary", "ffmpeg")
+        self.capabilities = EngineCapabilities(max_concurrency=self.max_concurrency, max_text_length=max_chunk_chars,
+                                               output_formats=('mp3',), native_batch=True)
+        self._semaphore = None  # Создается внутри цикла
+        self._semaphore_loop = None
     
-    def synthesize(self, text: str, voice: str, output_path: str, **kwargs) -> bool:
-        """Синтез речи через Edge-TTS"""
+    def synthesize(self, text, character_data, output_path):
+        """Синтез речи через Edge-TTS (можно вызывать из любого потока)"""
         try:
-            # Импортируем edge-tts
             import edge_tts
-            
-            # Очищаем текст
-            clean_text = self.clean_text(text)
-            if not clean_text:
-                print("❌ Пустой текст после очистки")
-                return False
-            
-            # Запускаем синтез
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-            try:
-                loop.run_until_complete(self._synthesize_async(clean_text, voice, output_path))
-                print(f"✅ Edge-TTS аудио сохранено: {output_path}")
-                return True
-            finally:
-                loop.close()
-                
         except ImportError:
-            print("❌ edge-tts не установлен. Установите: pip install edge-tts")
-            return False
+            raise RuntimeError("edge-tts не установлен. Установите: pip install edge-tts")
+        
+        clean_text = self.clean_text(text)
+        if not clean_text:
+            raise ValueError("Пустой текст после очистки")
+        
+        # Запускаем синтез в общем цикле
+        voice = character_data.get('voice') or self.DEFAULT_VOICE
+        _loop_thread.run(self._synthesize_async(clean_text, voice, str(output_path)))
+        self.update_usage(len(clean_text))
+        return str(output_path)
+    
+    def synthesize_batch(self, requests, request_context=None, stop_event=None):
+        """Пачка одной synthesize_many в общем цикле; результаты по мере готовности"""
+        try:
+            import edge_tts
+        except ImportError:
+            raise RuntimeError("edge-tts не установлен. Установите: pip install edge-tts")
+        
+        requests = list(requests)
+        finished = queue.Queue()
+        future = _loop_thread.submit(self.synthesize_many(requests, request_context, stop_event,
+                                                          on_result=finished.put))
+        remaining = len(requests)
+        while remaining:
+            try:
+                result = finished.get(timeout=0.5)
+            except queue.Empty:
+                if future.done():
+                    future.result()  # Ошибка самой пачки пробрасывается
+                continue
+            remaining -= 1
+            yield result
+    
+    async def synthesize_many(self, requests, request_context=None, stop_event=None, on_result=None) -> list:
+        """Параллельный синтез реплик в цикле: не больше max_concurrency сессий сразу
+        
+        requests - словари {'text', 'character_data', 'output_path'[, 'index']}.
+        request_context(character_data) - блокирующий контекстный менеджер
+        (request_gate) вокруг каждого запроса; он захватывается в пуле
+        потоков, цикл не останавливается. Результаты в порядке запросов:
+        {'index', 'output_path', 'success', 'error', 'cancelled', 'time'};
+        on_result(result) вызывается по готовности каждого.
+        """
+        async def run(request):
+            result = await self._synthesize_request_async(request, request_context, stop_event)
+            if on_result:
+                on_result(result)
+            return result
+        
+        return await asyncio.gather(*(run(request) for request in requests))
+    
+    async def _synthesize_request_async(self, request, request_context, stop_event) -> dict:
+        """Один запрос пачки: ошибки возвращаются, а не пробрасываются"""
+        result = self._batch_result(request)
+        if stop_event is not None and stop_event.is_set():
+            result['cancelled'] = True
+            return result
+        
+        clean_text = self.clean_text(request['text'])
+        if not clean_text:
+            result['error'] = 'Пустой текст после очистки'
+            return result
+        
+        voice = request['character_data'].get('voice') or self.DEFAULT_VOICE
+        started = time.perf_counter()
+        try:
+            async with self._request_slot(request_context, request['character_data']):
+                # Остановка во время ожидания слота - запрос не начинается
+                if stop_event is not None and stop_event.is_set():
+                    result['cancelled'] = True
+                    return result
+                started = time.perf_counter()
+                await self._synthesize_async(clean_text, voice, result['output_path'])
+            self.update_usage(len(clean_text))
+            result['success'] = True
         except Exception as e:
-            print(f"❌ Ошибка Edge-TTS синтеза: {e}")
-            return False
+            result['error'] = str(e)
+        result['time'] = time.perf_counter() - started
+        return result
+    
+    @asynccontextmanager
+    async def _request_slot(self, request_context, character_data):
+        """Вход в request_context в пуле потоков (шлюз блокирует), выход - сразу"""
+        if request_context is None:
+            yield
+            return
+        context = request_context(character_data)
+        await asyncio.get_running_loop().run_in_executor(None, context.__enter__)
+        try:
+            yield
+        finally:
+            context.__exit__(None, None, None)
     
     async def _synthesize_async(self, text: str, voice: str, output_path: str):
-        """Асинхронный синтез речи"""
+        """Асинхронный синтез речи (не больше max_concurrency сессий одновременно)"""
+        import edge_tts
+        
+        # Семафор привязан к циклу: после перезапуска _loop_thread создается заново
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        
+        async with self._semaphore:
+            communicate = edge_tts.Communicate(text, voice)
+            # Как communicate.save, но с замером времени до первого аудио
+            started = time.perf_counter()
+            first_chunk = True
+            with open(output_path, "wb") as f:
+                async for chunk in communicate.stream():
+                    if chunk["type"] != "audio":
+                        continue
+                    if first_chunk:
+                        observe("tts.edge_tts.ttfb", time.perf_counter() - started)
+                        first_chunk = False
+                    f.write(chunk["data"])
+    
+    def join_chunks(self, paths, output_path):
+        """Склейка кусков в частоте Edge-TTS с кроссфейдом движка"""
+        from processors.audio_io import join_audio_files
+        
+        join_audio_files(paths, output_path, self.SAMPLE_RATE, self.crossfade_ms, self.ffmpeg)
+    
+    def close(self):
+        """Остановить общий цикл asyncio (при выходе; следующий синтез запустит новый)"""
+        _loop_thread.stop()
+    
+    @staticmethod
+    def fetch_voice_list(etag=None) -> dict:
+        """Полный список голосов Microsoft для каталога (VoiceCatalog)
+        
+        Сервис не поддерживает ETag, поэтому каталог обновляет список по TTL.
+        """
         import edge_tts
         
-        communicate = edge_tts.Communicate(text, voice)
-        await communicate.save(output_path)
+        voices = _loop_thread.run(edge_tts.list_voices())
+        return {
+            'voices': [{
+                'id': voice.get('ShortName', ''),
+                'name': voice.get('ShortName', ''),
+                'display_name': voice.get('FriendlyName', ''),
+                'gender': voice.get('Gender', '').lower(),
+                'language': voice.get('Locale', ''),
+                'category': (voice.get('VoiceTag', {}).get('ContentCategories') or ['General'])[0]
+            } for voice in voices],
+            'etag': None
+        }
     
-    def get_available_voices(self, **kwargs) -> list:
+    def get_voices(self, api_key=None):
         """Получить список доступных голосов Edge-TTS"""
         try:
-            import edge_tts
-            
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-            try:
-                voices = loop.run_until_complete(edge_tts.list_voices())
-                # Фильтруем польские и английские голоса
-                filtered_voices = []
-                for voice in voices:
-                    locale = voice.get('Locale', '')
-                    if locale.startswith('pl-') or locale.startswith('en-'):
-                        filtered_voices.append({
-                            'name': voice.get('ShortName', ''),
-                            'display_name': voice.get('FriendlyName', ''),
-                            'gender': voice.get('Gender', ''),
-                            'locale': locale
-                        })
-                return filtered_voices
-            finally:
-                loop.close()
+            voices = self.fetch_voice_list()['voices']
+            # Фильтруем польские и английские голоса
+            filtered_voices = []
+            for voice in voices:
+                locale = voice['language']
+                if locale.startswith('pl-') or locale.startswith('en-'):
+                    filtered_voices.append({
+                        'name': voice['name'],
+                        'display_name': voice['display_name'],
+                        'gender': voice['gender'].capitalize(),
+                        'locale': locale
+                    })
+            return filtered_voices
                 
         except ImportError:
             print("❌ edge-tts не установлен")
@@ -88,28 +277,37 @@ class EdgeTTSEngine(BaseTTS):
             print(f"❌ Ошибка получения голосов Edge-TTS: {e}")
             return [{'name': voice, 'display_name': voice} for voice in self.available_voices]
     
-    def test_voice(self, text: str, voice: str, **kwargs) -> str:
-        """Тестирование голоса Edge-TTS"""
-        # Создаем временный файл
-        temp_file = self.get_temp_filename("edge_test")
-        
-        # Синтезируем речь
-        if self.synthesize(text, voice, temp_file, **kwargs):
-            return temp_file
+    def test_voice(self, character_data, test_text="Test voice", output_path=None):
+        """Тестирование голоса Edge-TTS: синтез во временный файл (или output_path) и воспроизведение"""
+        if output_path is None:
+            fd, temp_path = tempfile.mkstemp(suffix='.mp3')
+            os.close(fd)
         else:
-            return ""
+            temp_path = str(output_path)
+        try:
+            self.synthesize(test_text, character_data, temp_path)
+            return self.play_audio_file(temp_path)
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f'Ошибка теста: {str(e)}'
+            }
+        finally:
+            if output_path is None:
+                os.unlink(temp_path)
+    
+    def check_availability(self):
+        """Движок доступен, если установлен edge-tts (без сетевого запроса)"""
+        try:
+            import edge_tts
+            self.is_available = True
+        except ImportError:
+            self.is_available = False
+        return self.is_available
     
     def clean_text(self, text: str) -> str:
         """Специальная очистка текста для Edge-TTS"""
-        # Базовая очистка
-        clean_text = super().clean_text(text)
-        
-        # Убираем SSML теги если есть
-        import re
-        clean_text = re.sub(r'<[^>]*>', '', clean_text)
-        
-        # Ограничиваем длину (Edge-TTS имеет лимиты)
-        if len(clean_text) > 500:
-            clean_text = clean_text[:497] + "..."
-            
-        return clean_text
+        # Убираем HTML и SSML теги (длинный текст не обрезается - он синтезируется кусками)
+        clean_text = re.sub(r'<[^>]*>', '', text)
+        # Убираем лишние пробелы
+        return re.sub(r'\s+', ' ', clean_text).strip()
@@ -0,0 +1,222 @@
+# tts_engines/elevenlabs/credit_scheduler.py - распределение реплик по API ключам ElevenLabs по остатку кредитов
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.text_counter import TextCounter, count_billable_chars
+
+_text_counter = TextCounter()
+
+
+def estimate_tokens(text):
+    """Оценка кредитов на реплику (как в TextCounter)"""
+    return count_billable_chars(_text_counter.clean_text(text))
+
+
+class CreditCache:
+    """Кеш информации о кредитах по API ключу с ограниченным временем жизни
+
+    Между обновлениями остаток ключа уменьшается локально по токенам
+    синтезированных реплик (record_usage), поэтому повторные проверки
+    не ходят в /user/subscription, пока запись не устарела.
+    """
+
+    def __init__(self, fetch_credits, ttl=60):
+        self.fetch_credits = fetch_credits  # callable(api_key) -> dict как ElevenLabsAPI.get_credits_info
+        self.ttl = ttl
+        self._entries = {}  # api_key -> (время получения, credits_info)
+        self._lock = threading.Lock()
+
+    def get(self, api_key, force=False):
+        """Информация о кредитах ключа (из кеша, если не устарела)"""
+        with self._lock:
+            entry = self._entries.get(api_key)
+        if entry and not force and time.monotonic() - entry[0] < self.ttl:
+            return entry[1]
+
+        credits_info = self.fetch_credits(api_key)
+        # Ошибки не кешируем: следующий запрос повторит проверку
+        if credits_info and 'error' not in credits_info:
+            with self._lock:
+                self._entries[api_key] = (time.monotonic(), credits_info)
+        return credits_info
+
+    def get_many(self, api_keys, force=False, max_workers=8):
+        """Кредиты нескольких ключей: каждый уникальный ключ - один запрос, запросы параллельно
+
+        Возвращает {api_key: credits_info}.
+        """
+        unique_keys = list(dict.fromkeys(key for key in api_keys if key))
+        if not unique_keys:
+            return {}
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(unique_keys)),
+                                thread_name_prefix="credits") as executor:
+            results = executor.map(lambda key: self.get(key, force), unique_keys)
+            return dict(zip(unique_keys, results))
+
+    def record_usage(self, api_key, tokens):
+        """Учесть потраченные кредиты в закешированной записи (до следующего обновления)"""
+        with self._lock:
+            entry = self._entries.get(api_key)
+            if entry is None:
+                return
+            fetched_at, credits_info = entry
+            credits_info = dict(credits_info,
+                                credits_available=max(credits_info['credits_available'] - tokens, 0),
+                                credits_used=credits_info.get('credits_used', 0) + tokens)
+            self._entries[api_key] = (fetched_at, credits_info)
+
+    def invalidate(self, api_key=None):
+        """Сбросить кеш ключа (или всех ключей)"""
+        with self._lock:
+            if api_key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(api_key, None)
+
+
+class CreditScheduler:
+    """Планировщик реплик ElevenLabs по нескольким API ключам
+
+    Берет все ключи (api_keys.elevenlabs_keys из настроек и ключи
+    персонажей профиля), узнает их остаток кредитов и заранее
+    резервирует под каждую реплику ключ, где хватит кредитов, выравнивая
+    загрузку ключей. Так каждый ключ работает своим пулом потоков, а
+    ни один ключ не заканчивается посреди эпизода: реплики, которым
+    кредитов не хватило, известны до начала синтеза.
+    """
+
+    ENGINE_NAME = 'elevenlabs'  # Название движка в профилях персонажей
+
+    def __init__(self, engine, settings, credit_cache=None):
+        self.engine = engine
+        self.settings = settings
+        # Общий кеш движка: его же обновляет синтез и проверка ключей в окне настройки
+        self.credit_cache = (credit_cache or getattr(engine, 'credit_cache', None)
+                             or CreditCache(engine.get_credits_info, settings.get("elevenlabs.credits_ttl", 60)))
+
+    @classmethod
+    def for_profile(cls, tts_manager, profile):
+        """Планировщик для прогона профиля или None
+        
+        None, если ни один персонаж профиля не озвучивается ElevenLabs
+        (движок тогда даже не создается) или движок недоступен.
+        """
+        if profile is None or not profile.get_characters_by_engine(cls.ENGINE_NAME):
+            return None
+        engine = tts_manager.get_engine(cls.ENGINE_NAME)
+        if not engine:
+            return None
+        return cls(engine, tts_manager.settings)
+
+    def get_global_keys(self):
+        """Общие ключи ElevenLabs из настроек"""
+        keys = []
+        for entry in self.settings.get("api_keys.elevenlabs_keys", []) or []:
+            key = entry.get('key', '') if isinstance(entry, dict) else entry
+            if key and key not in keys:
+                keys.append(key)
+        return keys
+
+    def estimate_tokens(self, text):
+        """Оценка кредитов на реплику (как в TextCounter)"""
+        return estimate_tokens(text)
+
+    def candidate_keys(self, character_data, global_keys):
+        """Ключи, которыми можно озвучить персонажа
+
+        Собственный ключ персонажа идет первым. Общие ключи добавляются,
+        если у персонажа нет своего ключа или включено
+        elevenlabs.spread_across_keys. Персонаж с клонированным или
+        приватным голосом (на чужих аккаунтах он отдает 404) отключается
+        полем spread_across_keys=False в профиле - оно важнее настройки.
+        """
+        keys = []
+        own_key = (character_data.get('api_key') or '').strip()
+        if own_key:
+            keys.append(own_key)
+        spread = character_data.get('spread_across_keys')
+        if spread is None:
+            spread = self.settings.get("elevenlabs.spread_across_keys", True)
+        if spread or not own_key:
+            for key in global_keys:
+                if key not in keys:
+                    keys.append(key)
+        return keys
+
+    def get_available_credits(self, keys):
+        """Остаток кредитов по ключам; ключи с ошибкой пропускаются"""
+        available = {}
+        for key, credits_info in self.credit_cache.get_many(keys).items():
+            if credits_info and 'error' not in credits_info:
+                available[key] = credits_info['credits_available']
+            else:
+                error = credits_info.get('error') if credits_info else 'нет ответа'
+                print(f"Ключ ...{key[-6:]} недоступен: {error}")
+        return available
+
+    def assign(self, jobs):
+        """Назначить ключ каждой реплике
+
+        jobs - объекты с атрибутами text и character_data.
+        Возвращает план: {'assignments': {id(job): key}, 'keys': {...},
+        'unassigned': [job, ...]}.
+        """
+        global_keys = self.get_global_keys()
+        candidates = [self.candidate_keys(job.character_data, global_keys) for job in jobs]
+
+        all_keys = []
+        for keys in candidates:
+            for key in keys:
+                if key not in all_keys:
+                    all_keys.append(key)
+
+        available = self.get_available_credits(all_keys)
+        reserve = self.settings.get("elevenlabs.credit_reserve", 0)
+        reserved = {key: 0 for key in available}
+        job_counts = {key: 0 for key in available}
+
+        assignments = {}
+        unassigned = []
+
+        for job, keys in zip(jobs, candidates):
+            tokens = self.estimate_tokens(job.text)
+            best_key = None
+            best_load = None
+
+            for key in keys:
+                if key not in available:
+                    continue
+                budget = available[key] - reserve
+                if reserved[key] + tokens > budget:
+                    continue
+                # Доля уже зарезервированного бюджета: реплики расходятся по ключам
+                # пропорционально их остатку
+                load = (reserved[key] + tokens) / budget if budget > 0 else 0
+                if best_load is None or load < best_load:
+                    best_key = key
+                    best_load = load
+
+            if best_key is None:
+                unassigned.append(job)
+                continue
+
+            reserved[best_key] += tokens
+            job_counts[best_key] += 1
+            assignments[id(job)] = best_key
+
+        plan = {
+            'assignments': assignments,
+            'keys': {key: {'available': available[key],
+                           'reserved': reserved[key],
+                           'jobs': job_counts[key]} for key in available},
+            'unassigned': unassigned
+        }
+
+        for key, info in plan['keys'].items():
+            print(f"Ключ ...{key[-6:]}: {info['jobs']} реплик, {info['reserved']}/{info['available']} кредитов")
+        if unassigned:
+            print(f"⚠ Не хватает кредитов на {len(unassigned)} реплик")
+
+        return plan
@@ -1,23 +1,113 @@
 # tts_engines/elevenlabs/elevenlabs_api.py - работа с ElevenLabs API
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+
 import requests
 import json
+from requests.adapters import HTTPAdapter
+
+from utils.text_counter import count_billable_chars
+
+# Общие HTTP сессии по API ключу: соединения переиспользуются (keep-alive)
+# всеми объектами ElevenLabsAPI с тем же ключом
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(api_key, pool_size=8):
+    """Сессия с пулом соединений для API ключа"""
+    with _sessions_lock:
+        session = _sessions.get(api_key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[api_key] = session
+        return session
+
+
+def close_sessions():
+    """Закрыть все сессии (при выходе из приложения)"""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
 
 class ElevenLabsAPI:
     """Класс для работы с ElevenLabs API"""
     
-    def __init__(self, api_key):
+    DEFAULT_BASE_URL = "https://api.elevenlabs.io/v1"
+    DEFAULT_MODEL_ID = "eleven_monolingual_v1"
+    DEFAULT_VOICE_SETTINGS = {
+        "stability": 0.5,
+        "similarity_boost": 0.5
+    }
+    
+    # Повторы запросов при перегрузке и сбоях сервера
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    
+    def __init__(self, api_key, pool_size=8, max_retries=4, backoff_base=0.5, backoff_max=30.0, base_url=None):
         self.api_key = api_key
-        self.base_url = "https://api.elevenlabs.io/v1"
+        self.base_url = base_url or self.DEFAULT_BASE_URL
         self.headers = {
             "Accept": "application/json",
             "xi-api-key": self.api_key
         }
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.session = get_session(api_key, pool_size)
+    
+    def _request(self, method, url, **kwargs):
+        """HTTP запрос через общую сессию с повторами и экспоненциальной задержкой
+        
+        429 и 5xx повторяются до max_retries раз; если сервер прислал
+        Retry-After, ждем столько, сколько он просит.
+        """
+        kwargs.setdefault('headers', self.headers)
+        
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(self._retry_delay(attempt))
+                continue
+            
+            if response.status_code not in self.RETRY_STATUSES or attempt >= self.max_retries:
+                return response
+            
+            delay = self._retry_delay(attempt, response.headers.get('Retry-After'))
+            response.close()
+            time.sleep(delay)
+    
+    def _retry_delay(self, attempt, retry_after=None):
+        """Задержка перед повтором: Retry-After или экспонента с джиттером"""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                try:
+                    delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                    return min(max(delay, 0), self.backoff_max)
+                except (TypeError, ValueError):
+                    pass
+        
+        # Full jitter: случайная задержка до base * 2^attempt
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
     
     def get_credits_info(self):
         """Получить информацию о кредитах"""
         try:
             url = f"{self.base_url}/user/subscription"
-            response = requests.get(url, headers=self.headers, timeout=10)
+            response = self._request("GET", url, timeout=10)
             
             if response.status_code == 200:
                 data = response.json()
@@ -58,7 +148,7 @@ class ElevenLabsAPI:
         
         # Приблизительная оценка (может отличаться от реальной)
         # Обычно учитываются только текстовые символы
-        text_chars = len(''.join(c for c in text if c.isalnum() or c.isspace()))
+        text_chars = count_billable_chars(text)
         
         return {
             'character_count': text_chars,
@@ -66,53 +156,54 @@ class ElevenLabsAPI:
             'original_length': char_count
         }
     
+    def list_voices(self, etag=None):
+        """Список голосов с условным запросом
+        
+        Если передан etag прошлого ответа и список не изменился, сервер
+        отвечает 304 - тогда voices = None. Возвращает {'voices', 'etag'}.
+        """
+        url = f"{self.base_url}/voices"
+        headers = dict(self.headers)
+        if etag:
+            headers['If-None-Match'] = etag
+        
+        response = self._request("GET", url, headers=headers, timeout=10)
+        if response.status_code == 304:
+            return {'voices': None, 'etag': etag}
+        response.raise_for_status()
+        
+        voices = []
+        for voice in response.json().get('voices', []):
+            voices.append({
+                'voice_id': voice.get('voice_id'),
+                'name': voice.get('name'),
+                'category': voice.get('category', 'generated'),
+                'labels': voice.get('labels', {}),
+                'preview_url': voice.get('preview_url')
+            })
+        
+        return {'voices': voices, 'etag': response.headers.get('ETag')}
+    
     def get_available_voices(self):
         """Получить список доступных голосов"""
         try:
-            url = f"{self.base_url}/voices"
-            response = requests.get(url, headers=self.headers, timeout=10)
-            
-            if response.status_code == 200:
-                data = response.json()
-                voices = []
-                
-                for voice in data.get('voices', []):
-                    voices.append({
-                        'voice_id': voice.get('voice_id'),
-                        'name': voice.get('name'),
-                        'category': voice.get('category', 'generated'),
-                        'labels': voice.get('labels', {}),
-                        'preview_url': voice.get('preview_url')
-                    })
-                
-                return voices
-            else:
-                return []
-                
+            return self.list_voices()['voices']
         except Exception as e:
             print(f"Ошибка получения голосов: {e}")
             return []
     
-    def test_voice(self, voice_id, text="Hello, this is a test."):
+    def test_voice(self, voice_id, text="Hello, this is a test.", model_id=None, voice_settings=None):
         """Тестовая генерация голоса"""
         try:
             url = f"{self.base_url}/text-to-speech/{voice_id}"
             
             data = {
                 "text": text,
-                "model_id": "eleven_monolingual_v1",
-                "voice_settings": {
-                    "stability": 0.5,
-                    "similarity_boost": 0.5
-                }
+                "model_id": model_id or self.DEFAULT_MODEL_ID,
+                "voice_settings": voice_settings or self.DEFAULT_VOICE_SETTINGS
             }
             
-            response = requests.post(
-                url, 
-                json=data, 
-                headers=self.headers,
-                timeout=30
-            )
+            response = self._request("POST", url, json=data, timeout=30)
             
             if response.status_code == 200:
                 return {
@@ -130,4 +221,70 @@ class ElevenLabsAPI:
             return {
                 'success': False,
                 'error': f'Ошибка: {str(e)[:30]}'
-            }
\ No newline at end of file
+            }
+    
+    def stream_to_file(self, voice_id, text, output_path, model_id=None, voice_settings=None, chunk_size=16384,
+                       on_chunk=None):
+        """Потоковый синтез: куски аудио пишутся на диск по мере получения
+        
+        В памяти держится только текущий кусок. Файл пишется рядом как
+        .part и переименовывается после полной загрузки, поэтому оборванная
+        загрузка не оставляет битый output_path. on_chunk(bytes) получает
+        каждый записанный кусок (воспроизведение до конца загрузки).
+        Возвращает время до первого байта (ttfb) и общее время.
+        """
+        url = f"{self.base_url}/text-to-speech/{voice_id}/stream"
+        data = {
+            "text": text,
+            "model_id": model_id or self.DEFAULT_MODEL_ID,
+            "voice_settings": voice_settings or self.DEFAULT_VOICE_SETTINGS
+        }
+        
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        part_path = output_path.with_name(output_path.name + ".part")
+        
+        started = time.perf_counter()
+        ttfb = None
+        bytes_written = 0
+        
+        try:
+            response = self._request("POST", url, json=data, timeout=30, stream=True)
+            
+            with response:
+                if response.status_code != 200:
+                    return {
+                        'success': False,
+                        'error': f'HTTP {response.status_code}'
+                    }
+                
+                with open(part_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        if not chunk:
+                            continue
+                        if ttfb is None:
+                            ttfb = time.perf_counter() - started
+                        f.write(chunk)
+                        bytes_written += len(chunk)
+                        if on_chunk:
+                            on_chunk(chunk)
+                
+                os.replace(part_path, output_path)
+                
+                return {
+                    'success': True,
+                    'path': str(output_path),
+                    'bytes': bytes_written,
+                    'ttfb': ttfb if ttfb is not None else 0.0,
+                    'total_time': time.perf_counter() - started,
+                    'content_type': response.headers.get('content-type', 'audio/mpeg')
+                }
+                
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f'Ошибка: {str(e)[:30]}'
+            }
+        finally:
+            if part_path.exists():
+                part_path.unlink()
@@ -1,23 +1,39 @@
 # tts_engines/elevenlabs/elevenlabs_engine.py - ElevenLabs TTS движок
 import os
 import tempfile
-from pathlib import Path
-import pygame
-from ..base_tts import BaseTTS
-from .elevenlabs_api import ElevenLabsAPI
+import threading
+from utils.instrumentation import observe
+from ..base_tts import BaseTTS, EngineCapabilities
+from .elevenlabs_api import ElevenLabsAPI, close_sessions
+from .credit_scheduler import CreditCache, estimate_tokens
 
 class ElevenLabsEngine(BaseTTS):
     """ElevenLabs TTS движок"""
     
     def __init__(self, settings):
         super().__init__("ElevenLabs", settings)
-        
-        # Инициализация pygame для воспроизведения
-        try:
-            pygame.mixer.init()
-            self._pygame_available = True
-        except:
-            self._pygame_available = False
+        # Параллельность - на API ключ; длинные реплики TTSManager синтезирует кусками
+        self.capabilities = EngineCapabilities(
+            max_concurrency=4, max_text_length=settings.get("elevenlabs.max_chunk_chars", 2500),
+            streaming=True, output_formats=('mp3',), requires_api_key=True)
+        self._apis = {}  # Клиенты API по ключу (общие сессии с пулом соединений)
+        self._apis_lock = threading.Lock()
+        self.credit_cache = CreditCache(self.get_credits_info, settings.get("elevenlabs.credits_ttl", 60))
+    
+    def get_api(self, api_key):
+        """Клиент API для ключа (создается один раз)"""
+        with self._apis_lock:
+            api = self._apis.get(api_key)
+            if api is None:
+                api = ElevenLabsAPI(
+                    api_key,
+                    pool_size=self.settings.get("elevenlabs.pool_size", 8),
+                    max_retries=self.settings.get("elevenlabs.max_retries", 4),
+                    backoff_base=self.settings.get("elevenlabs.backoff_base", 0.5),
+                    backoff_max=self.settings.get("elevenlabs.backoff_max", 30.0)
+                )
+                self._apis[api_key] = api
+            return api
     
     def get_voices(self, api_key=None):
         """Получить список голосов (требует API ключ)"""
@@ -25,19 +41,11 @@ class ElevenLabsEngine(BaseTTS):
             return []
         
         try:
-            api = ElevenLabsAPI(api_key)
+            api = self.get_api(api_key)
             voices = api.get_available_voices()
             
             # Форматируем голоса для GUI
-            formatted_voices = []
-            for voice in voices:
-                formatted_voices.append({
-                    'id': voice['voice_id'],
-                    'name': voice['name'],
-                    'category': voice.get('category', 'generated'),
-                    'language': 'en',  # ElevenLabs в основном английский
-                    'gender': self._guess_gender(voice.get('labels', {}))
-                })
+            formatted_voices = [self._format_voice(voice) for voice in voices]
             
             self.available_voices = formatted_voices
             return formatted_voices
@@ -46,6 +54,26 @@ class ElevenLabsEngine(BaseTTS):
             print(f"Ошибка получения голосов ElevenLabs: {e}")
             return []
     
+    def fetch_voice_list(self, api_key, etag=None):
+        """Список голосов для каталога (VoiceCatalog): условный запрос по ETag"""
+        result = self.get_api(api_key).list_voices(etag)
+        voices = result['voices']
+        return {
+            'voices': None if voices is None else [self._format_voice(voice) for voice in voices],
+            'etag': result['etag']
+        }
+    
+    def _format_voice(self, voice):
+        """Голос API в формате GUI"""
+        labels = voice.get('labels') or {}
+        return {
+            'id': voice['voice_id'],
+            'name': voice['name'],
+            'category': voice.get('category', 'generated'),
+            'language': labels.get('language', 'en') if isinstance(labels, dict) else 'en',  # ElevenLabs в основном английский
+            'gender': self._guess_gender(labels)
+        }
+    
     def _guess_gender(self, labels):
         """Попытка определить пол по меткам"""
         if not isinstance(labels, dict):
@@ -71,34 +99,29 @@ class ElevenLabsEngine(BaseTTS):
             raise ValueError("Требуются API ключ и Voice ID персонажа")
         
         try:
-            api = ElevenLabsAPI(api_key)
+            api = self.get_api(api_key)
             
             # Очищаем текст
             clean_text = self.clean_text(text)
             
-            # Генерируем речь
-            result = api.test_voice(voice_id, clean_text)
-            
-            if result['success']:
-                # Сохраняем аудио
-                output_path = Path(output_path)
-                output_path.parent.mkdir(parents=True, exist_ok=True)
-                
-                with open(output_path, 'wb') as f:
-                    f.write(result['audio_data'])
-                
-                # Обновляем статистику использования
-                self.update_usage(len(clean_text))
-                
-                return str(output_path)
-            else:
+            # Генерируем речь потоком прямо в файл
+            result = api.stream_to_file(voice_id, clean_text, output_path,
+                                        character_data.get('model_id'), character_data.get('voice_settings'))
+            if not result['success']:
                 raise Exception(f"Ошибка синтеза: {result['error']}")
+            self._record_timing(result)
+            
+            # Обновляем статистику использования и остаток ключа в кеше кредитов
+            self.update_usage(len(clean_text), api_key)
+            self.credit_cache.record_usage(api_key, estimate_tokens(text))
+            
+            return str(output_path)
                 
         except Exception as e:
             raise Exception(f"ElevenLabs синтез ошибка: {str(e)}")
     
-    def test_voice(self, character_data, test_text="Hello, this is a test voice."):
-        """Тест голоса персонажа"""
+    def test_voice(self, character_data, test_text="Hello, this is a test voice.", output_path=None):
+        """Тест голоса персонажа: звук начинает играть с первых загруженных кусков"""
         api_key = character_data.get('api_key')
         voice_id = character_data.get('voice_id')
         
@@ -109,32 +132,42 @@ class ElevenLabsEngine(BaseTTS):
             }
         
         try:
-            api = ElevenLabsAPI(api_key)
+            api = self.get_api(api_key)
             
             # Очищаем текст
             clean_text = self.clean_text(test_text)
             
-            # Генерируем тестовый звук
-            result = api.test_voice(voice_id, clean_text)
-            
-            if result['success']:
-                # Воспроизводим через pygame
-                if self._pygame_available:
-                    success = self._play_audio_data(result['audio_data'])
+            # Генерируем тестовый звук потоком в файл и сразу в плеер
+            if output_path is None:
+                fd, temp_path = tempfile.mkstemp(suffix='.mp3')
+                os.close(fd)
+            else:
+                temp_path = str(output_path)
+            player = self.open_audio_stream()
+            try:
+                result = api.stream_to_file(voice_id, clean_text, temp_path,
+                                            character_data.get('model_id'), character_data.get('voice_settings'),
+                                            on_chunk=player.feed if player else None)
+                
+                if not result['success']:
+                    if player:
+                        player.abort()
                     return {
-                        'success': success,
-                        'message': 'Голос воспроизведен' if success else 'Ошибка воспроизведения'
+                        'success': False,
+                        'error': result['error']
                     }
-                else:
+                
+                self._record_timing(result)
+                if player and player.finish():
                     return {
-                        'success': False,
-                        'error': 'pygame недоступен для воспроизведения'
+                        'success': True,
+                        'message': 'Голос воспроизведен'
                     }
-            else:
-                return {
-                    'success': False,
-                    'error': result['error']
-                }
+                # Без потокового плеера - воспроизводим готовый файл
+                return self.play_audio_file(temp_path)
+            finally:
+                if output_path is None:
+                    os.unlink(temp_path)
                 
         except Exception as e:
             return {
@@ -142,30 +175,12 @@ class ElevenLabsEngine(BaseTTS):
                 'error': f'Ошибка теста: {str(e)}'
             }
     
-    def _play_audio_data(self, audio_data):
-        """Воспроизведение аудио данных через pygame"""
-        try:
-            # Создаем временный файл
-            with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as temp_file:
-                temp_file.write(audio_data)
-                temp_path = temp_file.name
-            
-            # Воспроизводим
-            pygame.mixer.music.load(temp_path)
-            pygame.mixer.music.play()
-            
-            # Ждем завершения воспроизведения
-            while pygame.mixer.music.get_busy():
-                pygame.time.wait(100)
-            
-            # Удаляем временный файл
-            os.unlink(temp_path)
-            
-            return True
-            
-        except Exception as e:
-            print(f"Ошибка воспроизведения: {e}")
-            return False
+    def _record_timing(self, result):
+        """Время до первого байта потокового запроса в отчет прогона
+        
+        Время и размер всего запроса учитывает TTSManager (record_tts_request).
+        """
+        observe("tts.elevenlabs.ttfb", result['ttfb'])
     
     def check_availability(self):
         """Проверка доступности движка"""
@@ -180,11 +195,25 @@ class ElevenLabsEngine(BaseTTS):
             return {'error': 'API ключ не указан'}
         
         try:
-            api = ElevenLabsAPI(api_key)
+            api = self.get_api(api_key)
             return api.get_credits_info()
         except Exception as e:
             return {'error': f'Ошибка: {str(e)}'}
     
+    def close(self):
+        """Закрыть общие HTTP сессии ключей"""
+        with self._apis_lock:
+            self._apis.clear()
+        close_sessions()
+    
+    def get_cache_params(self, character_data):
+        """Параметры ElevenLabs, влияющие на результат синтеза"""
+        return {
+            'voice_id': character_data.get('voice_id', ''),
+            'model_id': character_data.get('model_id') or ElevenLabsAPI.DEFAULT_MODEL_ID,
+            'voice_settings': character_data.get('voice_settings') or ElevenLabsAPI.DEFAULT_VOICE_SETTINGS
+        }
+    
     def estimate_cost(self, text):
         """Оценка стоимости озвучки"""
         # ElevenLabs считает символы
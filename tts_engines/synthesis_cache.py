@@ -0,0 +1,168 @@
+# tts_engines/synthesis_cache.py - дисковый кеш синтезированных реплик с вытеснением LRU
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class SynthesisCache:
+    """Кеш аудио по содержимому запроса
+
+    Ключ - хеш имени движка, параметров голоса (voice/voice_id, model_id,
+    voice_settings) и очищенного текста. Файлы пишутся атомарно, общий
+    размер ограничен: при переполнении удаляются давно не использованные.
+    """
+
+    def __init__(self, cache_dir, max_size_bytes):
+        self.cache_dir = Path(cache_dir)
+        self.max_size_bytes = max_size_bytes
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._entries = OrderedDict()  # ключ -> размер, от старых к новым
+        self.total_size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        """Восстановить порядок LRU по времени последнего использования файлов"""
+        files = []
+        for path in self.cache_dir.glob("*/*.audio"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, path.stem, stat.st_size))
+
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self.total_size += size
+
+    @staticmethod
+    def make_key(engine_name, params, text):
+        """Ключ кеша для запроса синтеза"""
+        data = json.dumps({'engine': engine_name, 'params': params, 'text': text},
+                          sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.audio"
+
+    @contextmanager
+    def key_lock(self, key):
+        """Блокировка ключа: одинаковые реплики в параллельных потоках синтезируются один раз"""
+        with self._lock:
+            lock, users = self._key_locks.get(key, (None, 0))
+            if lock is None:
+                lock = threading.Lock()
+            self._key_locks[key] = (lock, users + 1)
+
+        try:
+            with lock:
+                yield
+        finally:
+            with self._lock:
+                lock, users = self._key_locks[key]
+                if users <= 1:
+                    del self._key_locks[key]
+                else:
+                    self._key_locks[key] = (lock, users - 1)
+
+    def get(self, key):
+        """Путь к закешированному файлу или None"""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+
+            path = self._path(key)
+            if not path.exists():
+                self.total_size -= self._entries.pop(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def fetch(self, key, output_path):
+        """Скопировать закешированный файл в output_path; False если промах"""
+        cached_path = self.get(key)
+        if cached_path is None:
+            return False
+
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(cached_path, output_path)
+        return True
+
+    def put(self, key, source_path):
+        """Положить файл в кеш (атомарно) и при необходимости вытеснить старые"""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as dst, open(source_path, 'rb') as src:
+                shutil.copyfileobj(src, dst)
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+        size = path.stat().st_size
+        with self._lock:
+            if key in self._entries:
+                self.total_size -= self._entries.pop(key)
+            self._entries[key] = size
+            self.total_size += size
+            self._evict()
+        return path
+
+    def _evict(self):
+        """Удалить давно не использованные записи сверх лимита (под self._lock)"""
+        while self.total_size > self.max_size_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self.total_size -= size
+            self.evicted += 1
+            try:
+                os.unlink(self._path(key))
+            except OSError:
+                pass
+
+    def get_stats(self):
+        """Счетчики попаданий и размер кеша"""
+        with self._lock:
+            requests_total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / requests_total if requests_total else 0,
+                'evicted': self.evicted,
+                'entries': len(self._entries),
+                'size_bytes': self.total_size
+            }
+
+    def get_report(self, since=None):
+        """Попадания и промахи за прогон (разница со снимком get_stats())"""
+        stats = self.get_stats()
+        if since:
+            for counter in ('hits', 'misses', 'evicted'):
+                stats[counter] -= since[counter]
+            requests_total = stats['hits'] + stats['misses']
+            stats['hit_rate'] = stats['hits'] / requests_total if requests_total else 0
+        return stats
@@ -1,38 +1,146 @@
 # tts_engines/tts_manager.py - менеджер всех TTS движков
-from .elevenlabs.elevenlabs_engine import ElevenLabsEngine
+import importlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from contextlib import nullcontext
+from pathlib import Path
+
+from utils.instrumentation import get_instrumentation
+from utils.text_chunker import split_text
+
+from .synthesis_cache import SynthesisCache
+from .voice_catalog import VoiceCatalog
 
 class TTSManager:
     """Менеджер всех TTS движков"""
     
+    # Названия движков в профилях персонажей -> имена зарегистрированных движков
+    ENGINE_ALIASES = {
+        'elevenlabs': 'ElevenLabs',
+        'edge_tts': 'Edge-TTS'
+    }
+    
+    # Зарегистрированные движки: имя -> (модуль, класс). Модуль импортируется,
+    # а движок создается только при первом обращении к нему
+    ENGINE_REGISTRY = {
+        'ElevenLabs': ('tts_engines.elevenlabs.elevenlabs_engine', 'ElevenLabsEngine'),
+        'Edge-TTS': ('tts_engines.edge_tts.edge_tts_engine', 'EdgeTTSEngine'),
+    }
+    
     def __init__(self, settings):
         self.settings = settings
-        self.engines = {}
+        self.engines = {}  # Уже созданные движки
+        self._engines_lock = threading.Lock()
+        self.cache = self._init_cache()
+        self.voice_catalog = self._init_voice_catalog()
+        # Контекстный менеджер request_gate(engine_name, character_data) вокруг
+        # каждого реального запроса к движку (общие лимиты SeasonRunner)
+        self.request_gate = None
+        self._chunk_executor = None  # Общий пул для кусков длинных реплик
+    
+    def _data_dir(self):
+        """Папка данных приложения (рядом с config.json)"""
+        config_file = getattr(self.settings, 'config_file', None)
+        return Path(config_file).parent if config_file else Path("data")
+    
+    def _init_cache(self):
+        """Дисковый кеш синтеза (папка рядом с config.json, если не задана)"""
+        cache_dir = self.settings.get("cache.dir") or self._data_dir() / "tts_cache"
+        
+        max_size_mb = self.settings.get("cache.max_size_mb", 2048)
+        try:
+            return SynthesisCache(cache_dir, max_size_mb * 1024 * 1024)
+        except OSError as e:
+            print(f"Кеш синтеза недоступен: {e}")
+            return None
+    
+    def _init_voice_catalog(self):
+        """Каталог голосов: ElevenLabs (по API ключу) и Edge-TTS"""
+        catalog_dir = self.settings.get("voice_catalog.dir") or self._data_dir() / "voice_catalog"
+        catalog = VoiceCatalog(catalog_dir, self.settings.get("voice_catalog.ttl_hours", 24) * 3600)
+        
+        def fetch_elevenlabs(api_key, etag):
+            if not api_key:
+                raise ValueError("Для списка голосов ElevenLabs нужен API ключ")
+            engine = self.get_engine('elevenlabs')
+            if not engine:
+                raise RuntimeError("Движок ElevenLabs недоступен")
+            return engine.fetch_voice_list(api_key, etag)
+        catalog.register('elevenlabs', fetch_elevenlabs)
+        
+        def fetch_edge_tts(scope, etag):
+            from .edge_tts.edge_tts_engine import EdgeTTSEngine
+            return EdgeTTSEngine.fetch_voice_list(etag)
+        catalog.register('edge_tts', fetch_edge_tts)
+        return catalog
+    
+    def _cache_key(self, engine_name, engine, text, character_data):
+        """Ключ кеша: движок, параметры голоса и очищенный текст"""
+        return SynthesisCache.make_key(self.resolve_engine_name(engine_name),
+                                       engine.get_cache_params(character_data),
+                                       engine.clean_text(text))
+    
+    def request_key(self, engine_name, text, character_data):
+        """Отпечаток результата синтеза (тот же, что ключ кеша); None, если движка нет
         
-        # Инициализируем движки
-        self._init_engines()
+        Одинаковый отпечаток - одинаковый звук: манифест синтеза по нему
+        решает, нужно ли синтезировать реплику заново.
+        """
+        engine = self.get_engine(engine_name)
+        if not engine:
+            return None
+        return self._cache_key(engine_name, engine, text, character_data)
     
-    def _init_engines(self):
-        """Инициализация всех движков"""
+    def _create_engine(self, name):
+        """Импорт модуля и создание движка из реестра"""
+        module_name, class_name = self.ENGINE_REGISTRY[name]
         try:
-            # ElevenLabs движок
-            self.engines['ElevenLabs'] = ElevenLabsEngine(self.settings)
-            
-            # TODO: Добавить другие движки
-            # self.engines['Edge-TTS'] = EdgeTTSEngine(self.settings)
-            # self.engines['Google'] = GoogleTTSEngine(self.settings)
-            
+            engine_class = getattr(importlib.import_module(module_name), class_name)
+            return engine_class(self.settings)
         except Exception as e:
-            print(f"Ошибка инициализации TTS движков: {e}")
+            print(f"Ошибка инициализации TTS движка {name}: {e}")
+            return None
+    
+    def resolve_engine_name(self, engine_name):
+        """Имя движка в менеджере по названию из профиля"""
+        return self.ENGINE_ALIASES.get(engine_name, engine_name)
+    
+    def profile_engine_name(self, engine_name):
+        """Название движка в профилях и каталоге голосов ('ElevenLabs' -> 'elevenlabs')"""
+        name = self.resolve_engine_name(engine_name)
+        for alias, target in self.ENGINE_ALIASES.items():
+            if target == name:
+                return alias
+        return name.lower()
+    
+    def get_capabilities(self, engine_name):
+        """Возможности движка (EngineCapabilities) или None, если движка нет"""
+        engine = self.get_engine(engine_name)
+        return engine.capabilities if engine else None
     
     def get_engine(self, engine_name):
-        """Получить движок по имени"""
-        return self.engines.get(engine_name)
+        """Получить движок по имени (создается при первом обращении)"""
+        name = self.resolve_engine_name(engine_name)
+        engine = self.engines.get(name)
+        if engine is None and name in self.ENGINE_REGISTRY:
+            with self._engines_lock:
+                engine = self.engines.get(name)
+                if engine is None:
+                    engine = self._create_engine(name)
+                    if engine is not None:
+                        self.engines[name] = engine
+        return engine
     
     def get_available_engines(self):
         """Получить список доступных движков"""
         available = []
-        for name, engine in self.engines.items():
-            if engine.check_availability():
+        for name in self.ENGINE_REGISTRY:
+            engine = self.get_engine(name)
+            if engine and engine.check_availability():
                 available.append(name)
         return available
     
@@ -45,26 +153,290 @@ class TTSManager:
                 'error': f'Движок {engine_name} не найден'
             }
         
-        return engine.test_voice(character_data, test_text)
+        # Без кеша - тест напрямую через движок
+        if not self.cache:
+            return engine.test_voice(character_data, test_text)
+        
+        key = self._cache_key(engine_name, engine, test_text, character_data)
+        cached_path = self.cache.get(key)
+        if cached_path:
+            return engine.play_audio_file(cached_path)
+        
+        # Промах - тест через движок (он может играть звук еще во время загрузки),
+        # готовый файл остается для кеша
+        fd, temp_path = tempfile.mkstemp(suffix='.mp3')
+        os.close(fd)
+        try:
+            result = engine.test_voice(character_data, test_text, output_path=temp_path)
+            if result.get('success') and os.path.getsize(temp_path):
+                self.cache.put(key, temp_path)
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+        finally:
+            os.unlink(temp_path)
+        
+        return result
     
     def synthesize_speech(self, engine_name, text, character_data, output_path):
-        """Синтез речи через указанный движок"""
+        """Синтез речи через указанный движок (с кешем одинаковых запросов)"""
         engine = self.get_engine(engine_name)
         if not engine:
             raise Exception(f'Движок {engine_name} не найден')
         
-        return engine.synthesize(text, character_data, output_path)
+        self._synthesize_cached(engine_name, engine, text, character_data, output_path)
+        return str(output_path)
     
-    def get_voices_for_engine(self, engine_name, api_key=None):
-        """Получить голоса для движка"""
+    def _synthesize_cached(self, engine_name, engine, text, character_data, output_path):
+        """Синтез одного запроса через кеш; True - результат взят из кеша
+        
+        Ключ кеша заблокирован на время синтеза: одинаковый запрос из
+        другого потока дождется результата, а не пойдет в движок второй раз.
+        """
+        if not self.cache:
+            self._synthesize_text(engine_name, engine, text, character_data, output_path)
+            return False
+        
+        key = self._cache_key(engine_name, engine, text, character_data)
+        with self.cache.key_lock(key):
+            if self.cache.fetch(key, output_path):
+                get_instrumentation().count("tts.cache.hits")
+                return True
+            
+            get_instrumentation().count("tts.cache.misses")
+            self._synthesize_text(engine_name, engine, text, character_data, output_path)
+            self.cache.put(key, output_path)
+            return False
+    
+    @staticmethod
+    def _split_chunks(engine, text):
+        """Куски текста по лимиту движка (capabilities.max_text_length), по границам предложений"""
+        limit = engine.capabilities.max_text_length
+        if not limit or len(text) <= limit:
+            return [text]
+        return split_text(text, limit)
+    
+    def _get_chunk_executor(self):
+        with self._engines_lock:
+            if self._chunk_executor is None:
+                self._chunk_executor = ThreadPoolExecutor(
+                    max_workers=self.settings.get("synthesis.chunk_workers", 4), thread_name_prefix="tts-chunk")
+            return self._chunk_executor
+    
+    def _synthesize_text(self, engine_name, engine, text, character_data, output_path):
+        """Синтез реплики: длинная - кусками параллельно, каждый кусок отдельным запросом
+        
+        Куски идут через _call_engine (request_gate, лимит скорости, замеры)
+        в общем пуле synthesis.chunk_workers, поэтому длинная реплика
+        занимает свободные слоты пула ключа, а не обходит их. Ждущий поток
+        реплики слот не держит - вложенного захвата шлюза нет.
+        """
+        chunks = self._split_chunks(engine, text)
+        if len(chunks) <= 1:
+            return self._call_engine(engine_name, engine, text, character_data, output_path)
+        
+        suffix = engine.capabilities.output_formats[0]
+        with tempfile.TemporaryDirectory(prefix="tts_chunks_") as temp_dir:
+            paths = [os.path.join(temp_dir, f"{i:03d}.{suffix}") for i in range(len(chunks))]
+            executor = self._get_chunk_executor()
+            futures = [executor.submit(self._call_engine, engine_name, engine, chunk, character_data, path)
+                       for chunk, path in zip(chunks, paths)]
+            # Дожидаемся всех кусков до удаления папки, даже если один упал
+            wait(futures)
+            for future in futures:
+                future.result()
+            engine.join_chunks(paths, output_path)
+        
+        get_instrumentation().count("synthesis.chunks", len(chunks))
+        return str(output_path)
+    
+    def _call_engine(self, engine_name, engine, text, character_data, output_path):
+        """Обращение к движку (промах кеша) через request_gate, если он задан"""
+        name = self.profile_engine_name(engine_name)
+        if self.request_gate is None:
+            return self._measured_synthesize(name, engine, text, character_data, output_path)
+        with self.request_gate(name, character_data):
+            return self._measured_synthesize(name, engine, text, character_data, output_path)
+    
+    def _measured_synthesize(self, name, engine, text, character_data, output_path):
+        """engine.synthesize с замером времени, символов и размера результата (TTFB сообщают движки)"""
+        started = time.perf_counter()
+        success = False
+        try:
+            result = engine.synthesize(text, character_data, output_path)
+            success = True
+            return result
+        finally:
+            size = os.path.getsize(output_path) if success and os.path.exists(output_path) else None
+            get_instrumentation().record_tts_request(name, time.perf_counter() - started, len(text), size, success)
+    
+    def synthesize_batch(self, engine_name, requests, max_workers=None, stop_event=None):
+        """Синтез пачки запросов с наибольшей для движка пропускной способностью
+        
+        requests - словари {'text', 'character_data', 'output_path'[, 'index']}.
+        Запросы выполняются пулом на max_workers потоков (по умолчанию -
+        capabilities.max_concurrency движка), каждый - через кеш с
+        блокировкой ключа и _call_engine (request_gate и замеры), поэтому
+        одинаковые реплики синтезируются один раз. Движок с
+        capabilities.native_batch получает все промахи кеша (куски длинных
+        реплик - отдельными запросами) одной пачкой engine.synthesize_batch. Результаты {'index',
+        'output_path', 'success', 'error', 'cached', 'cancelled', 'time'}
+        отдаются по мере готовности; после stop_event оставшиеся запросы
+        возвращаются отмененными.
+        """
+        requests = list(requests)
         engine = self.get_engine(engine_name)
         if not engine:
-            return []
+            raise Exception(f'Движок {engine_name} не найден')
+        if not requests:
+            return
         
-        if engine_name == 'ElevenLabs':
-            return engine.get_voices(api_key)
-        else:
-            return engine.get_voices()
+        if engine.capabilities.native_batch:
+            yield from self._synthesize_native_batch(engine_name, engine, requests, stop_event)
+            return
+        
+        workers = min(len(requests), max_workers or engine.capabilities.max_concurrency)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"tts-{engine.name}") as executor:
+            futures = [executor.submit(self._synthesize_request, engine_name, engine, request, stop_event)
+                       for request in requests]
+            for future in as_completed(futures):
+                yield future.result()
+    
+    def _synthesize_native_batch(self, engine_name, engine, requests, stop_event=None):
+        """Пачка через engine.synthesize_batch: кеш, дубли и куски разбирает менеджер
+        
+        Одинаковые запросы пачки синтезируются один раз (ключ кеша), длинные
+        реплики уходят в движок кусками и склеиваются после последнего куска.
+        Каждое обращение к сервису проходит request_gate и учитывается в замерах.
+        """
+        name = self.profile_engine_name(engine_name)
+        instrumentation = get_instrumentation()
+        
+        groups = {}  # Ключ -> запросы с одинаковым результатом
+        for position, request in enumerate(requests):
+            key = self._cache_key(engine_name, engine, request['text'], request['character_data']) \
+                if self.cache else position
+            if self.cache and key not in groups and self.cache.fetch(key, request['output_path']):
+                instrumentation.count("tts.cache.hits")
+                result = self._new_result(request)
+                result.update(success=True, cached=True)
+                yield result
+                continue
+            groups.setdefault(key, []).append(request)
+        if not groups:
+            return
+        
+        def request_context(character_data):
+            return self.request_gate(name, character_data) if self.request_gate else nullcontext()
+        
+        with tempfile.TemporaryDirectory(prefix="tts_batch_") as temp_dir:
+            sub_requests = []
+            pending = {}  # Ключ -> {'paths', 'left', 'error', 'cancelled', 'time'}
+            for key, group in groups.items():
+                if self.cache:
+                    instrumentation.count("tts.cache.misses")
+                request = group[0]
+                chunks = self._split_chunks(engine, request['text'])
+                if len(chunks) == 1:
+                    paths = [str(request['output_path'])]
+                else:
+                    suffix = engine.capabilities.output_formats[0]
+                    paths = [os.path.join(temp_dir, f"{len(sub_requests) + i:05d}.{suffix}")
+                             for i in range(len(chunks))]
+                for chunk, path in zip(chunks, paths):
+                    sub_requests.append({'index': len(sub_requests), 'key': key, 'text': chunk,
+                                         'character_data': request['character_data'], 'output_path': path})
+                pending[key] = {'paths': paths, 'left': len(chunks), 'error': '', 'cancelled': False, 'time': 0.0}
+            
+            for sub_result in engine.synthesize_batch(sub_requests, request_context, stop_event):
+                sub_request = sub_requests[sub_result['index']]
+                state = pending[sub_request['key']]
+                state['left'] -= 1
+                state['time'] = max(state['time'], sub_result['time'])
+                if sub_result['cancelled']:
+                    state['cancelled'] = True
+                else:
+                    path = sub_result['output_path']
+                    size = os.path.getsize(path) if sub_result['success'] and os.path.exists(path) else None
+                    instrumentation.record_tts_request(name, sub_result['time'], len(sub_request['text']),
+                                                       size, sub_result['success'])
+                    if not sub_result['success'] and not state['error']:
+                        state['error'] = sub_result['error']
+                if state['left'] == 0:
+                    yield from self._finish_native_request(engine, sub_request['key'], groups[sub_request['key']],
+                                                           state)
+    
+    def _finish_native_request(self, engine, key, group, state):
+        """Склеить куски, положить в кеш и раздать результат одинаковым запросам пачки"""
+        output_path = str(group[0]['output_path'])
+        error = state['error']
+        if not error and not state['cancelled']:
+            try:
+                if len(state['paths']) > 1:
+                    engine.join_chunks(state['paths'], output_path)
+                    get_instrumentation().count("synthesis.chunks", len(state['paths']))
+                if self.cache:
+                    self.cache.put(key, output_path)
+                for request in group[1:]:
+                    Path(request['output_path']).parent.mkdir(parents=True, exist_ok=True)
+                    shutil.copyfile(output_path, request['output_path'])
+            except Exception as e:
+                error = str(e)
+        
+        for request in group:
+            result = self._new_result(request)
+            result['time'] = state['time']
+            if error:
+                result['error'] = error
+            elif state['cancelled']:
+                result['cancelled'] = True
+            else:
+                result['success'] = True
+            yield result
+    
+    @staticmethod
+    def _new_result(request):
+        """Незаполненный результат запроса пачки"""
+        return {'index': request.get('index'), 'output_path': str(request['output_path']),
+                'success': False, 'error': '', 'cached': False, 'cancelled': False, 'time': 0.0}
+    
+    def _synthesize_request(self, engine_name, engine, request, stop_event=None):
+        """Один запрос пачки: ошибка возвращается в результате, а не пробрасывается"""
+        result = self._new_result(request)
+        if stop_event is not None and stop_event.is_set():
+            result['cancelled'] = True
+            return result
+        
+        started = time.perf_counter()
+        try:
+            result['cached'] = self._synthesize_cached(engine_name, engine, request['text'],
+                                                       request['character_data'], str(request['output_path']))
+            result['success'] = True
+        except Exception as e:
+            result['error'] = str(e)
+        result['time'] = time.perf_counter() - started
+        return result
+    
+    def close(self):
+        """Освободить ресурсы созданных движков (при выходе из приложения)"""
+        with self._engines_lock:
+            engines = list(self.engines.values())
+            chunk_executor, self._chunk_executor = self._chunk_executor, None
+        if chunk_executor is not None:
+            chunk_executor.shutdown(wait=False)
+        for engine in engines:
+            try:
+                engine.close()
+            except Exception as e:
+                print(f"Ошибка закрытия TTS движка {engine.name}: {e}")
+    
+    def get_cache_report(self, since=None):
+        """Попадания и промахи кеша синтеза"""
+        if not self.cache:
+            return {}
+        return self.cache.get_report(since)
     
     def get_credits_info(self, engine_name, api_key):
         """Получить информацию о кредитах для движка"""
@@ -0,0 +1,184 @@
+# tts_engines/voice_catalog.py - дисковый каталог голосов TTS движков с фоновым обновлением и быстрым поиском
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+
+class VoiceIndex:
+    """Голоса одного движка с индексами по языку, полу и категории"""
+
+    def __init__(self, voices):
+        self.voices = voices
+        self.by_locale = {}
+        self.by_gender = {}
+        self.by_category = {}
+
+        for position, voice in enumerate(voices):
+            locale = (voice.get('language') or '').lower()
+            # Индексируем и полный код (pl-pl), и язык (pl)
+            for locale_key in {locale, locale.split('-')[0]}:
+                self.by_locale.setdefault(locale_key, []).append(position)
+            self.by_gender.setdefault((voice.get('gender') or 'unknown').lower(), []).append(position)
+            self.by_category.setdefault((voice.get('category') or '').lower(), []).append(position)
+
+    def find(self, locale=None, gender=None, category=None):
+        """Голоса, подходящие под все заданные фильтры"""
+        selected = None
+        for index, value in ((self.by_locale, locale), (self.by_gender, gender), (self.by_category, category)):
+            if value is None:
+                continue
+            positions = set(index.get(value.lower(), ()))
+            selected = positions if selected is None else selected & positions
+
+        if selected is None:
+            return list(self.voices)
+        return [self.voices[position] for position in sorted(selected)]
+
+
+class VoiceCatalog:
+    """Каталог голосов: списки движков хранятся на диске и в памяти
+
+    Чтение (get_voices, find) никогда не ходит в сеть: отдается сохраненный
+    список, а если он устарел (старше ttl) - в фоне запускается обновление.
+    Обновление условное: движок получает ETag прошлого ответа и может
+    ответить "не изменилось" (voices = None), тогда только продлевается срок.
+
+    Источник списка регистрируется функцией fetcher(scope, etag) ->
+    {'voices': [...] или None, 'etag': ...}. scope - например, API ключ
+    ElevenLabs: у разных аккаунтов разные голоса.
+    """
+
+    def __init__(self, cache_dir, ttl=24 * 3600):
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+        self._fetchers = {}
+        self._entries = {}  # (engine, scope) -> {'fetched_at', 'etag', 'voices'}
+        self._indexes = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def register(self, engine, fetcher):
+        """Зарегистрировать источник списка голосов движка"""
+        self._fetchers[engine] = fetcher
+
+    def __contains__(self, engine):
+        return engine in self._fetchers
+
+    def _path(self, engine, scope):
+        # API ключ не пишем в имя файла - только его хеш
+        suffix = f"_{hashlib.sha1(scope.encode('utf-8')).hexdigest()[:12]}" if scope else ""
+        return self.cache_dir / f"{engine}{suffix}.json"
+
+    def _load(self, engine, scope):
+        """Запись каталога из памяти или с диска (под self._lock)"""
+        key = (engine, scope)
+        if key not in self._entries:
+            entry = None
+            path = self._path(engine, scope)
+            if path.exists():
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        entry = json.load(f)
+                except (OSError, ValueError) as e:
+                    print(f"Каталог голосов {path.name} поврежден: {e}")
+            self._entries[key] = entry
+        return self._entries[key]
+
+    def _save(self, engine, scope, entry):
+        """Атомарно записать каталог движка на диск"""
+        path = self._path(engine, scope)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    def is_stale(self, engine, scope=None):
+        """Список отсутствует или старше ttl"""
+        with self._lock:
+            entry = self._load(engine, scope)
+        return entry is None or time.time() - entry.get('fetched_at', 0) >= self.ttl
+
+    def get_voices(self, engine, scope=None, refresh_stale=True, on_refresh=None):
+        """Сохраненный список голосов (без сетевых запросов)
+
+        Если список устарел, он обновляется в фоне; on_refresh(engine, scope)
+        вызывается из фонового потока, когда новый список готов.
+        """
+        with self._lock:
+            entry = self._load(engine, scope)
+        if refresh_stale and self.is_stale(engine, scope):
+            self.refresh_in_background(engine, scope, on_refresh)
+        return list(entry['voices']) if entry else []
+
+    def find(self, engine, scope=None, locale=None, gender=None, category=None):
+        """Поиск по языку ("pl" или "pl-PL"), полу и категории"""
+        key = (engine, scope)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None:
+                entry = self._load(engine, scope)
+                index = VoiceIndex(entry['voices'] if entry else [])
+                self._indexes[key] = index
+        return index.find(locale, gender, category)
+
+    def refresh(self, engine, scope=None, force=False):
+        """Обновить список движка из источника; True если список изменился
+
+        Если сохраненного списка нет, а источник ответил "без изменений"
+        (voices=None), обновлять нечего - RuntimeError.
+        """
+        fetcher = self._fetchers.get(engine)
+        if fetcher is None:
+            return False
+
+        with self._lock:
+            entry = self._load(engine, scope)
+        etag = entry.get('etag') if entry and not force else None
+
+        result = fetcher(scope, etag)
+        changed = result['voices'] is not None
+        if changed:
+            entry = {'fetched_at': time.time(), 'etag': result.get('etag'), 'voices': result['voices']}
+        elif entry is None:
+            raise RuntimeError(f"источник голосов {engine} не вернул список, а сохраненного каталога нет")
+        else:
+            entry = dict(entry, fetched_at=time.time())
+
+        self._save(engine, scope, entry)
+        with self._lock:
+            self._entries[(engine, scope)] = entry
+            if changed:
+                self._indexes.pop((engine, scope), None)
+        return changed
+
+    def refresh_in_background(self, engine, scope=None, on_refresh=None):
+        """Обновить список в отдельном потоке (один поток на движок и scope)"""
+        key = (engine, scope)
+        with self._lock:
+            if key in self._refreshing or engine not in self._fetchers:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                changed = self.refresh(engine, scope)
+                if on_refresh:
+                    on_refresh(engine, scope)
+                print(f"Каталог голосов {engine}: {'обновлен' if changed else 'без изменений'}")
+            except Exception as e:
+                print(f"Не удалось обновить каталог голосов {engine}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, name=f"voices-{engine}", daemon=True).start()
@@ -0,0 +1,380 @@
+# utils/instrumentation.py - замеры этапов: время, память (RSS, tracemalloc), счетчики, запросы TTS; отчет прогона
+import functools
+import json
+import os
+import random
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MB = 1024 * 1024
+MAX_SAMPLES = 2000  # Значений гистограммы для перцентилей (дальше - случайная выборка)
+RSS_SAMPLE_INTERVAL = 0.05  # Период замера RSS открытых этапов, секунды
+
+
+def current_rss():
+    """Текущий RSS процесса, байты (None, если узнать нельзя)"""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def peak_rss():
+    """Пиковый RSS процесса с момента запуска, байты"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдает килобайты, macOS - байты
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+class _Histogram:
+    """Распределение значений: сумма, минимум, максимум и выборка для перцентилей"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.samples = []
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if len(self.samples) < MAX_SAMPLES:
+            self.samples.append(value)
+        else:
+            index = random.randrange(self.count)
+            if index < MAX_SAMPLES:
+                self.samples[index] = value
+
+    def merge(self, data):
+        if not data['count']:
+            return
+        self.count += data['count']
+        self.total += data['total']
+        self.min = data['min'] if self.min is None else min(self.min, data['min'])
+        self.max = data['max'] if self.max is None else max(self.max, data['max'])
+        self.samples = (self.samples + data['samples'])[:MAX_SAMPLES]
+
+    def percentile(self, fraction):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+    def snapshot(self):
+        return {'count': self.count, 'total': self.total, 'min': self.min, 'max': self.max,
+                'samples': list(self.samples)}
+
+    def summary(self):
+        return {'count': self.count, 'total': self.total, 'min': self.min, 'max': self.max,
+                'mean': self.total / self.count if self.count else None,
+                'p50': self.percentile(0.5), 'p95': self.percentile(0.95)}
+
+
+class Instrumentation:
+    """Замеры прогона: этапы, счетчики и гистограммы
+
+    stage(name) - контекстный менеджер (и timed(name) - декоратор): на
+    каждый этап копятся число вызовов, суммарное и максимальное время,
+    процессорное время потока, пик и прирост RSS за время этапа, а при
+    включенном tracemalloc - пик выделенной Python памяти. Пик RSS этапа
+    замеряет фоновый поток раз в RSS_SAMPLE_INTERVAL, пока этап открыт.
+    RSS и tracemalloc общие на процесс, поэтому пик этапа включает память
+    параллельно идущих этапов. Все методы потокобезопасны; данные
+    процессов пула переносятся через snapshot()/merge().
+    """
+
+    def __init__(self):
+        self._after_fork()
+        self.reset()
+
+    def _after_fork(self):
+        """Начальное состояние блокировки и замеров (и в дочернем процессе после fork)"""
+        self._lock = threading.Lock()
+        self._open_stages = []  # Открытые этапы: пики RSS и tracemalloc вложенных этапов
+        self._sampler = None
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.stages = {}
+            self.counters = {}
+            self.histograms = {}
+
+    # --- память ---
+
+    def start_tracemalloc(self, frames=1):
+        """Включить tracemalloc (замедляет выделения памяти - только для диагностики)"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    @property
+    def tracing(self):
+        return tracemalloc.is_tracing()
+
+    def _start_sampler(self):
+        """Фоновый замер RSS открытых этапов (под _lock; без /proc - не запускается)"""
+        if self._sampler is None and current_rss() is not None:
+            self._sampler = threading.Thread(target=self._sample_rss, name="instrumentation-rss", daemon=True)
+            self._sampler.start()
+
+    def _sample_rss(self):
+        while True:
+            time.sleep(RSS_SAMPLE_INTERVAL)
+            if not self._open_stages:
+                continue
+            rss = current_rss()
+            with self._lock:
+                for entry in self._open_stages:
+                    entry['rss_max'] = max(entry['rss_max'], rss)
+
+    def _fold_traced_peak(self):
+        """Перенести текущий пик tracemalloc в открытые этапы и сбросить его (под _lock)"""
+        peak = tracemalloc.get_traced_memory()[1]
+        for entry in self._open_stages:
+            entry['traced_peak'] = max(entry['traced_peak'], peak)
+        tracemalloc.reset_peak()
+
+    # --- этапы ---
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def timed(self, name):
+        """Декоратор: каждый вызов функции - этап name"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _enter_stage(self, name):
+        rss = current_rss()
+        entry = {'name': name, 'traced_peak': 0, 'rss': rss, 'rss_max': rss or 0,
+                 'cpu': time.thread_time(), 'started': time.perf_counter()}
+        with self._lock:
+            self._start_sampler()
+            if tracemalloc.is_tracing():
+                self._fold_traced_peak()
+                entry['traced_start'] = tracemalloc.get_traced_memory()[0]
+            self._open_stages.append(entry)
+        return entry
+
+    def _exit_stage(self, entry, failed):
+        elapsed = time.perf_counter() - entry['started']
+        cpu = time.thread_time() - entry['cpu']
+        rss = current_rss()
+
+        with self._lock:
+            self._open_stages.remove(entry)
+            rss_peak = max(entry['rss_max'], rss) if rss is not None else None
+            traced_peak = None
+            if 'traced_start' in entry:
+                self._fold_traced_peak()
+                traced_peak = max(entry['traced_peak'] - entry['traced_start'], 0)
+
+            stats = self.stages.get(entry['name'])
+            if stats is None:
+                stats = self.stages[entry['name']] = {
+                    'count': 0, 'errors': 0, 'total': 0.0, 'max': 0.0, 'cpu': 0.0,
+                    'rss_peak': None, 'rss_growth': None, 'traced_peak': None}
+            stats['count'] += 1
+            stats['errors'] += 1 if failed else 0
+            stats['total'] += elapsed
+            stats['max'] = max(stats['max'], elapsed)
+            stats['cpu'] += cpu
+            if rss_peak is not None:
+                stats['rss_peak'] = max(stats['rss_peak'] or 0, rss_peak)
+            if rss is not None and entry['rss'] is not None:
+                stats['rss_growth'] = max(stats['rss_growth'] or 0, rss - entry['rss'])
+            if traced_peak is not None:
+                stats['traced_peak'] = max(stats['traced_peak'] or 0, traced_peak)
+
+    # --- счетчики и распределения ---
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = _Histogram()
+            histogram.add(value)
+
+    def record_tts_request(self, engine, seconds, chars, size=None, success=True):
+        """Один запрос к TTS движку (без попаданий в кеш)"""
+        prefix = f"tts.{engine}"
+        self.observe(f"{prefix}.seconds", seconds)
+        self.count(f"{prefix}.requests")
+        self.count(f"{prefix}.chars", chars)
+        if size is not None:
+            self.count(f"{prefix}.bytes", size)
+        if not success:
+            self.count(f"{prefix}.errors")
+
+    # --- отчет ---
+
+    def snapshot(self):
+        """Сырые данные для переноса между процессами (merge)"""
+        with self._lock:
+            return {'stages': {name: dict(stats) for name, stats in self.stages.items()},
+                    'counters': dict(self.counters),
+                    'histograms': {name: h.snapshot() for name, h in self.histograms.items()}}
+
+    def merge(self, snapshot):
+        """Добавить замеры другого процесса (этапы пула SeasonRunner)"""
+        with self._lock:
+            for name, data in snapshot['stages'].items():
+                stats = self.stages.get(name)
+                if stats is None:
+                    self.stages[name] = dict(data)
+                    continue
+                for key in ('count', 'errors', 'total', 'cpu'):
+                    stats[key] += data[key]
+                for key in ('max', 'rss_peak', 'rss_growth', 'traced_peak'):
+                    if data[key] is not None:
+                        stats[key] = max(stats[key] or 0, data[key])
+            for name, value in snapshot['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for name, data in snapshot['histograms'].items():
+                self.histograms.setdefault(name, _Histogram()).merge(data)
+
+    def report(self, **extra):
+        """Отчет прогона (словарь для JSON)"""
+        with self._lock:
+            report = {
+                'started': self.started,
+                'elapsed': time.time() - self.started,
+                'tracemalloc': tracemalloc.is_tracing(),
+                'rss_peak': peak_rss(),
+                'stages': {name: dict(stats) for name, stats in
+                           sorted(self.stages.items(), key=lambda item: -item[1]['total'])},
+                'counters': dict(sorted(self.counters.items())),
+                'histograms': {name: h.summary() for name, h in sorted(self.histograms.items())}
+            }
+        report.update(extra)
+        return report
+
+    def write_report(self, path, **extra):
+        """Записать отчет: path.json и сводку path.txt; возвращает отчет"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        report = self.report(**extra)
+        with open(path.with_suffix(".json"), 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False, default=str)
+        with open(path.with_suffix(".txt"), 'w', encoding='utf-8') as f:
+            f.write(format_summary(report))
+        return report
+
+
+class _Stage:
+    """Контекст одного этапа Instrumentation.stage"""
+
+    __slots__ = ('instrumentation', 'name', 'entry')
+
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+
+    def __enter__(self):
+        self.entry = self.instrumentation._enter_stage(self.name)
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.instrumentation._exit_stage(self.entry, exc_type is not None)
+        return False
+
+
+def _mb(value):
+    return f"{value / MB:8.1f}" if value is not None else "       -"
+
+
+def format_summary(report):
+    """Сводка отчета для человека: куда ушло время и память"""
+    lines = [f"=== ОТЧЕТ ПРОГОНА: {report['elapsed']:.1f}с, пиковый RSS {_mb(report['rss_peak']).strip()} МБ ==="]
+
+    lines.append("")
+    lines.append(f"{'Этап':32} {'вызовов':>8} {'всего, с':>10} {'макс, с':>9} {'CPU, с':>8} "
+                 f"{'RSS пик':>8} {'RSS +':>8} {'py пик':>8}")
+    for name, stats in report['stages'].items():
+        errors = f" ({stats['errors']} ошибок)" if stats['errors'] else ""
+        lines.append(f"{name:32} {stats['count']:8} {stats['total']:10.2f} {stats['max']:9.2f} {stats['cpu']:8.2f} "
+                     f"{_mb(stats['rss_peak'])} {_mb(stats['rss_growth'])} {_mb(stats['traced_peak'])}{errors}")
+    if not report['tracemalloc']:
+        lines.append("(py пик - только с tracemalloc)")
+
+    engines = sorted({name.split('.')[1] for name in report['counters'] if name.startswith("tts.")} - {"cache"})
+    if engines:
+        lines.append("")
+        lines.append("Запросы TTS (без попаданий в кеш):")
+        for engine in engines:
+            counters = report['counters']
+            seconds = report['histograms'].get(f"tts.{engine}.seconds", {})
+            ttfb = report['histograms'].get(f"tts.{engine}.ttfb", {})
+            line = (f"  {engine}: {counters.get(f'tts.{engine}.requests', 0)} запросов, "
+                    f"{counters.get(f'tts.{engine}.chars', 0)} симв, "
+                    f"{counters.get(f'tts.{engine}.bytes', 0) / MB:.1f} МБ, "
+                    f"ошибок {counters.get(f'tts.{engine}.errors', 0)}")
+            if seconds.get('count'):
+                line += f"; время p50 {seconds['p50']:.2f}с, p95 {seconds['p95']:.2f}с"
+            if ttfb.get('count'):
+                line += f"; TTFB p50 {ttfb['p50']:.2f}с, p95 {ttfb['p95']:.2f}с"
+            lines.append(line)
+
+    hits = report['counters'].get("tts.cache.hits", 0)
+    misses = report['counters'].get("tts.cache.misses", 0)
+    if hits or misses:
+        lines.append(f"Кеш синтеза: {hits} попаданий, {misses} промахов ({hits / (hits + misses):.0%})")
+
+    other = {name: value for name, value in report['counters'].items() if not name.startswith("tts.")}
+    if other:
+        lines.append("")
+        lines.append("Счетчики:")
+        for name, value in other.items():
+            lines.append(f"  {name}: {value}")
+    return "\n".join(lines) + "\n"
+
+
+# Замеры процесса: модули пишут сюда, отчет снимает тот, кто запускал прогон
+_instrumentation = Instrumentation()
+
+# Процесс пула, созданный fork во время замера, не должен унаследовать занятую
+# блокировку и этапы родителя (поток замера RSS в него не переходит)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_instrumentation._after_fork)
+
+
+def get_instrumentation():
+    return _instrumentation
+
+
+def stage(name):
+    return _instrumentation.stage(name)
+
+
+def timed(name):
+    return _instrumentation.timed(name)
+
+
+def count(name, value=1):
+    _instrumentation.count(name, value)
+
+
+def observe(name, value):
+    _instrumentation.observe(name, value)
@@ -0,0 +1,73 @@
+# utils/text_chunker.py - разбиение длинных реплик на куски по границам предложений для лимитов TTS
+import re
+
+# Конец предложения: знак препинания (и закрывающие кавычки/скобки), затем пробел
+SENTENCE_END_RE = re.compile(r'(?<=[.!?…])\s+|(?<=[.!?…]["»”\')\]])\s+')
+# Граница части предложения: запятая, точка с запятой, двоеточие, тире
+CLAUSE_END_RE = re.compile(r'(?<=[,;:])\s+|\s+(?=[—–-]\s)')
+
+
+def _split_keep(text, pattern):
+    """Разбить по границам, не теряя знаков препинания"""
+    return [part.strip() for part in pattern.split(text) if part and part.strip()]
+
+
+def _split_long(part, max_chars):
+    """Предложение длиннее лимита: по частям предложения, затем по словам, затем жестко"""
+    clauses = _split_keep(part, CLAUSE_END_RE)
+    if len(clauses) > 1:
+        return _pack(clauses, max_chars, _split_words)
+    return _split_words(part, max_chars)
+
+
+def _split_words(part, max_chars):
+    """Разбить по пробелам; слово длиннее лимита режется жестко"""
+    pieces = []
+    for word in part.split():
+        while len(word) > max_chars:
+            pieces.append(word[:max_chars])
+            word = word[max_chars:]
+        if word:
+            pieces.append(word)
+    return _pack(pieces, max_chars, None)
+
+
+def _pack(parts, max_chars, split_long):
+    """Собрать части в куски не длиннее max_chars, не разрывая части"""
+    chunks = []
+    current = ''
+    for part in parts:
+        if len(part) > max_chars and split_long:
+            pieces = split_long(part, max_chars)
+        else:
+            pieces = [part]
+
+        for piece in pieces:
+            candidate = f"{current} {piece}" if current else piece
+            if len(candidate) <= max_chars:
+                current = candidate
+            else:
+                if current:
+                    chunks.append(current)
+                current = piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def split_text(text, max_chars):
+    """Разбить текст на куски не длиннее max_chars
+
+    Куски режутся по концам предложений; слишком длинное предложение -
+    по запятым/точкам с запятой/тире, затем по словам. Соседние короткие
+    предложения объединяются, чтобы запросов к движку было как можно меньше.
+    Текст, помещающийся в лимит, возвращается одним куском.
+    """
+    text = text.strip()
+    if not text:
+        return []
+    if len(text) <= max_chars:
+        return [text]
+
+    sentences = _split_keep(text, SENTENCE_END_RE)
+    return _pack(sentences, max_chars, _split_long)
@@ -2,23 +2,94 @@
 import re
 from collections import defaultdict
 
+
+class _BillableChars(dict):
+    """Таблица для str.translate: оставляет буквы, цифры и пробелы, остальное удаляет
+    
+    Заполняется лениво по мере встречи символов, поэтому не требует
+    перебора всего Unicode.
+    """
+    
+    def __missing__(self, code):
+        char = chr(code)
+        value = code if (char.isalnum() or char.isspace()) else None
+        self[code] = value
+        return value
+
+
+BILLABLE_CHARS = _BillableChars()
+
+# Регулярные выражения clean_text компилируются один раз
+SPEAKER_COLON_RE = re.compile(r'^[^:]+:\s*')
+SPEAKER_DASH_RE = re.compile(r'^[^-]+-\s*')
+HTML_TAG_RE = re.compile(r'<[^>]+>')
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def count_billable_chars(text):
+    """Количество символов, которые тарифицирует ElevenLabs (буквы, цифры, пробелы)"""
+    return len(text.translate(BILLABLE_CHARS))
+
+
+class SpeakerMatcher:
+    """Поиск имени говорящего в начале реплики одним регулярным выражением
+    
+    Строится один раз для набора персонажей: имена экранируются и
+    объединяются в одну альтернативу, порядок альтернатив совпадает с
+    порядком персонажей, поэтому при нескольких совпадениях побеждает
+    первый персонаж, как и при поочередной проверке.
+    """
+    
+    def __init__(self, character_names):
+        self.character_names = list(character_names)
+        
+        alternatives = []
+        for character_name in self.character_names:
+            # Имя с двоеточием или с " -", а также варианты в верхнем/нижнем регистре
+            variants = []
+            for variant in (f"{character_name}:", f"{character_name} -",
+                            f"{character_name.upper()}:", f"{character_name.lower()}:"):
+                if variant not in variants:
+                    variants.append(variant)
+            alternatives.append('(' + '|'.join(re.escape(variant) for variant in variants) + ')')
+        
+        self.pattern = re.compile('(?:' + '|'.join(alternatives) + ')', re.IGNORECASE) if alternatives else None
+    
+    def match(self, text):
+        """Имя персонажа в начале текста или None"""
+        if self.pattern is None:
+            return None
+        
+        match = self.pattern.match(text)
+        if match:
+            return self.character_names[match.lastindex - 1]
+        return None
+
+
 class TextCounter:
     """Класс для подсчета количества токенов текста персонажей"""
     
     def __init__(self):
         self.character_texts = defaultdict(list)
         self.character_stats = defaultdict(dict)
+        self._speaker_matcher = None
     
     def analyze_subtitles(self, subtitle_data, characters_map):
         """Анализ субтитров и подсчет текста по персонажам"""
         self.character_texts.clear()
         self.character_stats.clear()
         
-        for subtitle in subtitle_data:
-            text = subtitle.get('text', '')
-            
+        # CueTable отдает колонку текстов напрямую, без объектов-строк на реплику
+        if hasattr(subtitle_data, 'texts'):
+            texts = subtitle_data.texts
+        else:
+            texts = (subtitle.get('text', '') for subtitle in subtitle_data)
+        
+        speaker_matcher = self.get_speaker_matcher(characters_map)
+        
+        for text in texts:
             # Определяем персонажа по тексту
-            character = self.identify_character(text, characters_map)
+            character = speaker_matcher.match(text) or "Unknown"
             if character:
                 clean_text = self.clean_text(text)
                 self.character_texts[character].append(clean_text)
@@ -34,36 +105,32 @@ class TextCounter:
         
         return self.character_stats
     
+    def get_speaker_matcher(self, characters_map):
+        """Матчер имен для набора персонажей (пересоздается только при смене набора)"""
+        character_names = list(characters_map)
+        if self._speaker_matcher is None or self._speaker_matcher.character_names != character_names:
+            self._speaker_matcher = SpeakerMatcher(character_names)
+        return self._speaker_matcher
+    
     def identify_character(self, text, characters_map):
         """Определение персонажа по тексту субтитров"""
-        # Проверяем есть ли имя персонажа в начале строки
-        for character_name in characters_map:
-            # Ищем имя в начале строки (с двоеточием или без)
-            patterns = [
-                f"^{character_name}:",
-                f"^{character_name} -",
-                f"^{character_name.upper()}:",
-                f"^{character_name.lower()}:"
-            ]
-            
-            for pattern in patterns:
-                if re.search(pattern, text, re.IGNORECASE):
-                    return character_name
+        # Ищем имя в начале строки (с двоеточием или без)
+        character_name = self.get_speaker_matcher(characters_map).match(text)
         
         # Если не найден точный персонаж, возвращаем "Unknown"
-        return "Unknown"
+        return character_name or "Unknown"
     
     def clean_text(self, text):
         """Очистка текста от служебных символов"""
         # Убираем имя персонажа в начале
-        text = re.sub(r'^[^:]+:\s*', '', text)
-        text = re.sub(r'^[^-]+-\s*', '', text)
+        text = SPEAKER_COLON_RE.sub('', text, count=1)
+        text = SPEAKER_DASH_RE.sub('', text, count=1)
         
         # Убираем HTML теги
-        text = re.sub(r'<[^>]+>', '', text)
+        text = HTML_TAG_RE.sub('', text)
         
         # Убираем лишние пробелы
-        text = re.sub(r'\s+', ' ', text).strip()
+        text = WHITESPACE_RE.sub(' ', text).strip()
         
         return text
     
@@ -78,14 +145,16 @@ class TextCounter:
                 'elevenlabs_tokens': 0
             }
         
-        total_chars = sum(len(text) for text in texts)
-        total_words = sum(len(text.split()) for text in texts)
         total_lines = len(texts)
+        total_chars = sum(map(len, texts))
+        
+        # Считаем по одной склеенной строке: разделитель-пробел не сливает слова,
+        # а в подсчете символов ElevenLabs его вклад (total_lines - 1) вычитается
+        joined = ' '.join(texts)
+        total_words = len(joined.split())
         
         # Для ElevenLabs считаем только буквенно-цифровые символы и пробелы
-        elevenlabs_chars = 0
-        for text in texts:
-            elevenlabs_chars += len(''.join(c for c in text if c.isalnum() or c.isspace()))
+        elevenlabs_chars = count_billable_chars(joined) - (total_lines - 1)
         
         return {
             'total_lines': total_lines,